@@ -1,96 +1,421 @@
 # main.py
 from typing import Any
 import re
-from fastapi import FastAPI, UploadFile, File, Request
-from pydantic import BaseModel
+from fastapi import FastAPI, UploadFile, File, Request, Response, Depends, Query
+from pydantic import BaseModel, Field
 from rdflib import Graph, Namespace, Literal ,URIRef
 from rdflib.namespace import RDF, RDFS, XSD
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
-import requests
-from owlrl import DeductiveClosure, OWLRL_Semantics
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
 from fastapi import HTTPException
+from contextlib import asynccontextmanager
+from persistence import GraphStore
+from fuseki_client import fuseki, fuseki_sync
+from coalescer import UpdateCoalescer
+from commits import PendingWrites
+from bulk_import import BulkImporter, guess_format
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from listing import ListingRegistry, ndjson_lines, csv_lines, decode_cursor, project
+from inference import InferenceEngine
+from caches import LRUCache, TTLCache, TaggedCache, normalize_question
+from inference import is_schema
+from changes import ChangeFeed
+from readmodel import ReadModel
+from statstore import StatStore, KINDS, to_epoch
+from rollups import Rollups
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import shutil
+import tempfile
+from collections import Counter
+import time
+from startup import Startup
+from sync import GraphSync
+from deletion import CascadeDeleter, parse_rules
+from templates import TemplateRegistry, IRI
+from planner import QueryPlanner
+from intents import IntentRouter
+from fastapi.responses import JSONResponse
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+_openai_client = None
+
+def openai_client():
+    """Client OpenAI créé à la première question (l'import du SDK ralentit le démarrage)."""
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        _openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _openai_client
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
 # ======================
 # 🔧 CONFIGURATION
 # ======================
 
-FUSEKI_BASE = "http://localhost:3030"
-FUSEKI_QUERY_URL = f"{FUSEKI_BASE}/smartcity/sparql"   # endpoint SPARQL (query)
-FUSEKI_UPDATE_URL = f"{FUSEKI_BASE}/smartcity/update" # endpoint SPARQL (update)
-FUSEKI_DATA_ENDPOINT = f"{FUSEKI_BASE}/smartcity/data" # endpoint data (GET/POST)
+# Endpoints Fuseki, pool HTTP et timeouts : voir fuseki_client.py
 
 EX = Namespace("http://www.semanticweb.org/chamb/ontologies/2025/8/untitled-ontology-9#")
 INFERRED_GRAPH_URI = "http://example.org/inferred"  # graph nommé où l'on push les triples inférés
 
-# Charger le graphe RDF local (si présent)
+SPARQL_PREFIXES = f"""
+PREFIX ex: <{EX}>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+"""
+
+def subclass_of(var: str, cls: str) -> str:
+    """
+    Hiérarchie de classes lue dans le graphe inféré (remplace `?var rdfs:subClassOf* cls`).
+    Tant que ce graphe est vide (Fuseki neuf ou réinitialisé, avant la première publication
+    des inférences), le chemin de propriétés prend le relais : les listes ne sont jamais vides.
+    """
+    return (
+        f"{{ GRAPH <{INFERRED_GRAPH_URI}> {{ ?{var} rdfs:subClassOf {cls} . }} }} UNION "
+        f"{{ ?{var} rdfs:subClassOf* {cls} . "
+        f"FILTER NOT EXISTS {{ GRAPH <{INFERRED_GRAPH_URI}> {{ ?_s ?_p ?_o }} }} }}"
+    )
+
+# Collections exposées en liste (JSON) et en export flux (NDJSON / CSV)
+listings = ListingRegistry(SPARQL_PREFIXES)
+LISTING_MAX_LIMIT = int(os.getenv("LISTING_MAX_LIMIT", 1000))  # taille max d'une page
+
+# Requêtes paramétrées des endpoints (voir templates.py) : validées au chargement,
+# valeurs échappées dans un bloc VALUES, latence mesurée par identifiant
+templates = TemplateRegistry(EX, SPARQL_PREFIXES)
+
+# Graphe RDF local : snapshot + journal d'écritures (voir persistence.py). Les workers
+# d'un même répertoire partagent le journal ; un seul (store.owner) compacte, publie
+# les inférences, écrit les colonnes de statistiques et interroge la synchro Fuseki.
 g = Graph()
-try:
-    g.parse("smartcity.rdf")
-except Exception:
-    # Pas de fichier local, démarrer avec un graphe vide
-    pass
 g.bind("ex", EX)
+store = GraphStore(
+    g,
+    snapshot_path="smartcity_updated.rdf",
+    journal_path="smartcity_updated.journal",
+    base_path="smartcity.rdf",
+    max_journal_bytes=int(os.getenv("JOURNAL_MAX_BYTES", 4 * 1024 * 1024)),
+    max_journal_age=float(os.getenv("JOURNAL_MAX_AGE", 60)),
+    fsync=os.getenv("JOURNAL_FSYNC", "0") == "1",
+)
+# Écritures Fuseki regroupées par lots (quelques ms ou N opérations)
+coalescer = UpdateCoalescer(
+    fuseki,
+    max_delay=float(os.getenv("UPDATE_BATCH_DELAY_MS", 5)) / 1000,
+    max_batch=int(os.getenv("UPDATE_BATCH_MAX", 100)),
+)
+
+# Écritures locales en attente de Fuseki (voir commits.py) : premier abonné du store
+pending_writes = PendingWrites()
+store.subscribe(pending_writes.on_change)
+
+def publish_async(update_query: str, label: str):
+    """Envoie (sans attendre) une mise à jour via le coalesceur ; un échec est signalé avec `label`."""
+    future = coalescer.enqueue_threadsafe(update_query)
+    future.add_done_callback(
+        lambda f: f.cancelled() or f.exception() is None
+        or print(f"⚠️ Échec de publication {label} : {f.exception()}")
+    )
+
+# Inférences OWL-RL matérialisées dans le graphe nommé INFERRED_GRAPH_URI (voir inference.py),
+# recalculées en entier au démarrage puis mises à jour à chaque écriture du graphe local
+reasoner = InferenceEngine(
+    store, fuseki_sync, INFERRED_GRAPH_URI,
+    publish=lambda q: publish_async(q, "des inférences"), leader=lambda: store.owner,
+)
+store.subscribe(reasoner.on_change)
+
+# Index en mémoire dérivés du graphe local (voir readmodel.py) : certaines lectures sont
+# servies sans requête Fuseki. READ_MODEL=0 pour tout relire depuis Fuseki.
+READ_MODEL = os.getenv("READ_MODEL", "1") == "1"
+read_model = ReadModel(g, EX, [
+    EX.donnéPar, EX.avoirTicket, EX.seTrouve, EX.effectue,
+    EX.description, EX.nom, EX.duree, EX.distance,
+])
+store.subscribe(read_model.on_change)
+
+# Valeurs des statistiques (taux, nombre, horodatage) stockées en colonnes NumPy projetées
+# sur disque (voir statstore.py) plutôt qu'en triples rdflib ; en mémoire pour les autres workers
+stat_store = StatStore(os.getenv("STAT_STORE_PATH", "stats_store") if store.owner else None, store, EX)
+store.subscribe(stat_store.on_change)
+
 # ======================
-# 🔁 SYNCHRONISATION FUSEKI → FICHIER LOCAL
+# 🔁 SYNCHRONISATION FUSEKI → GRAPHE LOCAL
 # ======================
+# Incrémentale (voir sync.py) : chaque processus publie les sujets qu'il écrit dans le
+# graphe nommé TXLOG_GRAPH_URI ; les autres ne relisent que ces sujets, toutes les
+# SYNC_INTERVAL secondes. Synchro complète (téléchargement en flux, borné par SYNC_TIMEOUT)
+# au premier démarrage, si la marque haute est trop ancienne ou après un import en masse.
+TXLOG_GRAPH_URI = "http://example.org/txlog"
+SYNC_ON_STARTUP = os.getenv("SYNC_ON_STARTUP", "1") == "1"
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", 5))
+SYNC_PRUNE_INTERVAL = 3600
+
+def sync_skip(t) -> bool:
+    """Triples que la synchro ne touche pas : ontologie de l'API, valeurs déjà dans les colonnes de stats."""
+    if t in ONTOLOGY:
+        return True
+    return t[1] in stat_store.absorbed and stat_store.raw(stat_store.local(t[0])) is not None
+
+graph_sync = GraphSync(
+    store, fuseki_sync, TXLOG_GRAPH_URI,
+    publish=lambda q: publish_async(q, "du journal des transactions"),
+    deferred=pending_writes.get,
+    state_path="smartcity_updated.sync.json",
+    download_path=os.getenv("SYNC_DOWNLOAD_PATH", "smartcity_fuseki.nt"),
+    skip=sync_skip,
+    download_timeout=float(os.getenv("SYNC_TIMEOUT", 60)),
+    overlap=float(os.getenv("SYNC_OVERLAP", 10)),
+    retention=float(os.getenv("TXLOG_RETENTION", 86400)),
+)
+store.subscribe(graph_sync.record)
+
+async def sync_loop():
+    await startup.wait()   # après le rattrapage du démarrage
+    last_prune = 0.0
+    while True:
+        await asyncio.sleep(SYNC_INTERVAL)
+        if not store.owner:
+            continue   # les deltas arrivent par le journal partagé
+        await run_in_threadpool(graph_sync.poll)
+        if time.monotonic() - last_prune >= SYNC_PRUNE_INTERVAL:
+            last_prune = time.monotonic()
+            graph_sync.prune()
+
+startup = Startup()
 
-def sync_from_fuseki_to_local():
+# ======================
+# 🧭 ROUTAGE DES LECTURES : GRAPHE LOCAL OU FUSEKI
+# ======================
+# Requêtes sélectives et ontologie sur le graphe local, parcours larges, agrégats et
+# graphe inféré sur Fuseki (voir planner.py). PLANNER_MODE=local|remote force une cible.
+def local_staleness() -> float:
     """
-    Télécharge tous les triples de Fuseki et les enregistre localement
-    dans smartcity_updated.rdf.
+    Retard du graphe local sur Fuseki (s), pour tout worker : ancienneté de la dernière
+    synchro réussie du nœud + retard de suivi du journal partagé. Infini tant que le
+    chargement n'est pas terminé ou si aucune synchro n'est connue.
     """
-    try:
-        print("🔄 Synchronisation Fuseki → smartcity_updated.rdf ...")
-        url = f"{FUSEKI_DATA_ENDPOINT}?graph=default"
-        response = requests.get(url, headers={"Accept": "application/rdf+xml"})
-        if response.status_code == 200 and response.text.strip():
-            with open("smartcity_updated.rdf", "w", encoding="utf-8") as f:
-                f.write(response.text)
-            print("✅ Synchronisation réussie : fichier local mis à jour.")
-        else:
-            print(f"⚠️ Aucun contenu RDF récupéré (code {response.status_code}).")
-    except Exception as e:
-        print(f"⚠️ Erreur de synchronisation Fuseki → local : {e}")
+    if not startup.ready:
+        return float("inf")
+    synced = graph_sync.synced_at()
+    if synced is None:
+        return float("inf")
+    return max(0.0, time.time() - synced) + store.follow_lag()
+
+planner = QueryPlanner(
+    store, fuseki.select,
+    remote_predicates=stat_store.absorbed,
+    staleness=local_staleness,
+    max_local_rows=int(os.getenv("PLANNER_MAX_LOCAL_ROWS", 2000)),
+    max_staleness=float(os.getenv("PLANNER_MAX_STALENESS", max(30.0, 3 * SYNC_INTERVAL))),
+    mode=os.getenv("PLANNER_MODE", "auto"),
+    slow_ms=float(os.getenv("PLANNER_SLOW_MS", 500)),
+)
 
-# Exécuter la synchro au démarrage
-sync_from_fuseki_to_local()
+def load_local_graph():
+    """Snapshot (cache binaire si possible) + journal, ontologie minimale, valeurs des statistiques."""
+    store.recover()
+    change_feed.resume(store.epoch, store.version)
+    load_ontology()
+    store.run_locked(lambda graph: stat_store.absorb())
+    store.start()   # compaction du journal en arrière-plan, une fois le journal rejoué
+
+def build_indexes():
+    read_model.rebuild()   # après le chargement de l'ontologie locale (sous-classes)
+    store.read(lambda graph: rollups.rebuild(set(graph.subjects(RDF.type, None))))
 
 # ======================
 # 🚀 APPLICATION FASTAPI
 # ======================
 
-app = FastAPI(title="SmartCity RDF API", version="3.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    coalescer.start()
+    # Chargement en tâche de fond : le serveur accepte les connexions immédiatement
+    # (503 + Retry-After jusqu'à ce que le graphe local et les index soient prêts).
+    # Le graphe inféré publié par le démarrage précédent reste dans Fuseki pendant son recalcul.
+    background = [
+        ("inférences", reasoner.refresh),
+        ("préchauffage des requêtes", lambda: templates.warm_up(fuseki_sync.select)),
+    ]
+    if SYNC_ON_STARTUP and store.owner:
+        background.append(("synchro Fuseki", graph_sync.catch_up))
+    startup.start(
+        blocking=[("graphe local", load_local_graph), ("index", build_indexes)],
+        background=background,
+    )
+    reconciler = asyncio.create_task(reconcile_loop())
+    syncer = asyncio.create_task(sync_loop()) if SYNC_INTERVAL > 0 else None
+    yield
+    reconciler.cancel()
+    if syncer is not None:
+        syncer.cancel()
+    await startup.wait()
+    await coalescer.stop()   # flush des écritures en attente
+    store.close()
+    stat_store.close()
+    await fuseki.aclose()
+    fuseki_sync.close()
+
+app = FastAPI(title="SmartCity RDF API", version="3.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # ton frontend React/Vite
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache"],
 )
+
+STARTUP_OPEN_PATHS = {"/health/live", "/health/ready", "/docs", "/openapi.json"}
+
+async def require_ready(request: Request, call_next):
+    """Tant que le graphe local n'est pas chargé, les autres routes répondent 503."""
+    if startup.ready or request.url.path in STARTUP_OPEN_PATHS:
+        return await call_next(request)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Démarrage en cours", **startup.status()},
+        headers={"Retry-After": "1"},
+    )
+
+# Après CORS (les 503 portent les en-têtes CORS), avant le cache des lectures
+app.user_middleware.append(Middleware(BaseHTTPMiddleware, dispatch=require_ready))
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    status = {**startup.status(), "pid": os.getpid(), "store_owner": store.owner}
+    if not status["ready"]:
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+    return status
+
+@app.get("/sync")
+async def get_sync_status():
+    """Marque haute, décalage (lag_s : temps depuis la dernière synchro réussie) et compteurs."""
+    return {"interval_s": SYNC_INTERVAL, **graph_sync.get_stats()}
+
+@app.post("/sync")
+async def run_sync(full: bool = False):
+    """Synchro immédiate : incrémentale, ou complète avec ?full=true."""
+    if not store.owner:
+        raise HTTPException(status_code=409, detail="Synchro réservée au worker propriétaire du store (voir /health/ready)")
+    return await run_in_threadpool(graph_sync.full if full else graph_sync.poll)
 # ======================
 # ⚙️ FONCTION UTILITAIRE
 # ======================
 
-def send_to_fuseki(update_query: str):
-    sparql = SPARQLWrapper(FUSEKI_UPDATE_URL)
-    sparql.setMethod(POST)
-    sparql.setQuery(update_query)
-    sparql.query()
+async def send_to_fuseki(update_query: str, versions: list[int] | None = None):
+    """
+    Envoie un SPARQL UPDATE via le coalesceur ; rend la main une fois le lot validé.
+    `versions` : écritures locales qu'il confirme (voir on_commit).
+    """
+    await coalescer.submit(update_query, versions)
+
+def bind_template(template, rows: list[dict]) -> str:
+    try:
+        return template.bind_rows(rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def run_select(template, **params) -> dict:
+    return await run_select_rows(template, [params])
+
+async def run_select_rows(template, rows: list[dict]) -> dict:
+    """Une seule requête pour plusieurs jeux de paramètres (une ligne VALUES chacun)."""
+    query = bind_template(template, rows)
+    with template.timed():
+        return await planner.select(query, route=template.id, template=template, rows=rows)
+
+async def run_ask(template, **params) -> bool:
+    query = bind_template(template, [params])
+    with template.timed():
+        return await fuseki.ask(query)
+
+async def run_update(template, rows: list[dict], triples: list | None = None):
+    """
+    Mise à jour paramétrée (une ligne VALUES par élément de `rows`) via le coalesceur,
+    précédée de l'écriture de `triples` dans le graphe local. Les paramètres sont liés
+    avant toute écriture : un identifiant invalide donne 400 sans rien écrire ni journaliser.
+    """
+    update = bind_template(template, rows)
+    if triples:
+        # Verrou d'écriture, journal et abonnés hors de la boucle d'événements
+        _, versions = await run_in_threadpool(pending_writes.local_write, store.add, triples)
+    else:
+        versions = None
+    with template.timed():
+        await send_to_fuseki(update, versions)
 
 def push_data_to_graph(turtle_data: bytes, graph_uri: str):
     """
     Pousse du TTL vers l'endpoint /data?graph=graph_uri
     """
-    url = f"{FUSEKI_DATA_ENDPOINT}?graph={graph_uri}"
-    headers = {"Content-Type": "text/turtle"}
-    r = requests.post(url, data=turtle_data, headers=headers)
-    r.raise_for_status()
-    return r
+    return fuseki_sync.post_data(turtle_data, content_type="text/turtle", graph=graph_uri)
+
+class Page:
+    """
+    Paramètres de pagination communs aux endpoints de liste :
+    ?limit=50&cursor=<X-Next-Cursor de la page précédente>&fields=id,nom
+    Sans `limit` ni `cursor`, la collection est renvoyée en entier (comportement historique).
+    """
+
+    def __init__(
+        self,
+        limit: int | None = Query(None, ge=1, le=LISTING_MAX_LIMIT),
+        cursor: str | None = None,
+        fields: str | None = None,
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+async def fetch_listing(listing, page: Page, response: Response) -> list[dict]:
+    """
+    Exécute la requête d'une collection. Avec `limit` / `cursor`, le tri, le filtre
+    keyset et la limite sont faits par Fuseki ; le curseur de la page suivante est
+    renvoyé dans l'en-tête X-Next-Cursor (absent sur la dernière page).
+    """
+    if page.limit is None and page.cursor is None:
+        results = await planner.select(listing.query(), route=listing.name)
+        rows = list(listing.rows(results["results"]["bindings"]))
+    else:
+        try:
+            after = decode_cursor(page.cursor) if page.cursor else None
+            query = listing.query(limit=page.limit or LISTING_MAX_LIMIT, after=after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        results = await planner.select(query, route=listing.name)
+        rows, next_cursor = listing.page(results["results"]["bindings"], page.limit or LISTING_MAX_LIMIT)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    return [project(r, page.fields) for r in rows]
+
+def term_binding(term) -> dict:
+    """Terme rdflib -> binding au format SPARQL JSON (mêmes fonctions `row` que pour Fuseki)."""
+    return {"type": "uri" if isinstance(term, URIRef) else "literal", "value": str(term)}
+
+def local_listing(listing, bindings, page: Page, response: Response) -> list[dict]:
+    """Équivalent de `fetch_listing` pour des bindings calculés par le modèle de lecture."""
+    if page.limit is None and page.cursor is None:
+        return [project(r, page.fields) for r in listing.rows(bindings)]
+    try:
+        after = decode_cursor(page.cursor) if page.cursor else None
+        bindings = listing.select(bindings, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows, next_cursor = listing.page(bindings, page.limit or LISTING_MAX_LIMIT)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [project(r, page.fields) for r in rows]
 
 # ======================
 # 📦 MODÈLES DE DONNÉES
@@ -130,61 +455,71 @@ class Event(BaseModel):
     id: str
     type: str   # ex: accident, embouteillage, radar
     infrastructure_id: str
+    horodatage: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # ======================
 # 🧠 DÉFINITION DES CLASSES RDF (ontologie minimale)
 # ======================
 
-# Hiérarchie Utilisateurs
-g.add((EX.Utilisateur, RDF.type, RDFS.Class))
-g.add((EX.Conducteur, RDF.type, RDFS.Class))
-g.add((EX.Piéton, RDF.type, RDFS.Class))
-g.add((EX.Voyageur, RDF.type, RDFS.Class))
-g.add((EX.Conducteur, RDFS.subClassOf, EX.Utilisateur))
-g.add((EX.Piéton, RDFS.subClassOf, EX.Utilisateur))
-g.add((EX.Voyageur, RDFS.subClassOf, EX.Utilisateur))
-
-# Transports
-g.add((EX.RéseauTransport, RDF.type, RDFS.Class))
-g.add((EX.Métro, RDF.type, RDFS.Class))
-g.add((EX.Bus, RDF.type, RDFS.Class))
-g.add((EX.Trottinette, RDF.type, RDFS.Class))
-g.add((EX.Voiture, RDF.type, RDFS.Class))
-g.add((EX.Vélo, RDF.type, RDFS.Class))
-g.add((EX.Métro, RDFS.subClassOf, EX.RéseauTransport))
-g.add((EX.Bus, RDFS.subClassOf, EX.RéseauTransport))
-g.add((EX.Trottinette, RDFS.subClassOf, EX.RéseauTransport))
-g.add((EX.Voiture, RDFS.subClassOf, EX.RéseauTransport))
-g.add((EX.Vélo, RDFS.subClassOf, EX.RéseauTransport))
-
-# Station et relations
-g.add((EX.stationsMetro, RDF.type, RDFS.Class))
-g.add((EX.disposeDe, RDF.type, RDF.Property))
-g.add((EX.disposeDe, RDFS.domain, EX.stationsMetro))
-g.add((EX.disposeDe, RDFS.range, EX.Métro))
-
-# Avis
-g.add((EX.Avis, RDF.type, RDFS.Class))
-g.add((EX.description, RDF.type, RDF.Property))
-g.add((EX.donnéPar, RDF.type, RDF.Property))
-g.add((EX.donnéPar, RDFS.domain, EX.Avis))
-g.add((EX.donnéPar, RDFS.range, EX.Utilisateur))
-
-# Statistique + Observation
-
-g.add((EX.observe, RDF.type, RDF.Property))
-g.add((EX.observe, RDFS.domain, EX.Utilisateur))
-
-# Event / Accident / Route / Infrastructure
-g.add((EX.Event, RDF.type, RDFS.Class))
-g.add((EX.accident, RDF.type, RDFS.Class))
-g.add((EX.Infrastructure, RDF.type, RDFS.Class))
-g.add((EX.route, RDF.type, RDFS.Class))
-g.add((EX.accident, RDFS.subClassOf, EX.Event))
-g.add((EX.route, RDFS.subClassOf, EX.Infrastructure))
-g.add((EX.seTrouve, RDF.type, RDF.Property))
-g.add((EX.seTrouve, RDFS.domain, EX.accident))
-g.add((EX.seTrouve, RDFS.range, EX.route))
+def minimal_ontology() -> list:
+    """Classes et propriétés déclarées par l'API, ajoutées au graphe local au démarrage."""
+    return [
+        # Hiérarchie Utilisateurs
+        (EX.Utilisateur, RDF.type, RDFS.Class),
+        (EX.Conducteur, RDF.type, RDFS.Class),
+        (EX.Piéton, RDF.type, RDFS.Class),
+        (EX.Voyageur, RDF.type, RDFS.Class),
+        (EX.Conducteur, RDFS.subClassOf, EX.Utilisateur),
+        (EX.Piéton, RDFS.subClassOf, EX.Utilisateur),
+        (EX.Voyageur, RDFS.subClassOf, EX.Utilisateur),
+
+        # Transports
+        (EX.RéseauTransport, RDF.type, RDFS.Class),
+        (EX.Métro, RDF.type, RDFS.Class),
+        (EX.Bus, RDF.type, RDFS.Class),
+        (EX.Trottinette, RDF.type, RDFS.Class),
+        (EX.Voiture, RDF.type, RDFS.Class),
+        (EX.Vélo, RDF.type, RDFS.Class),
+        (EX.Métro, RDFS.subClassOf, EX.RéseauTransport),
+        (EX.Bus, RDFS.subClassOf, EX.RéseauTransport),
+        (EX.Trottinette, RDFS.subClassOf, EX.RéseauTransport),
+        (EX.Voiture, RDFS.subClassOf, EX.RéseauTransport),
+        (EX.Vélo, RDFS.subClassOf, EX.RéseauTransport),
+
+        # Station et relations
+        (EX.stationsMetro, RDF.type, RDFS.Class),
+        (EX.disposeDe, RDF.type, RDF.Property),
+        (EX.disposeDe, RDFS.domain, EX.stationsMetro),
+        (EX.disposeDe, RDFS.range, EX.Métro),
+
+        # Avis
+        (EX.Avis, RDF.type, RDFS.Class),
+        (EX.description, RDF.type, RDF.Property),
+        (EX.donnéPar, RDF.type, RDF.Property),
+        (EX.donnéPar, RDFS.domain, EX.Avis),
+        (EX.donnéPar, RDFS.range, EX.Utilisateur),
+
+        # Statistique + Observation
+        (EX.observe, RDF.type, RDF.Property),
+        (EX.observe, RDFS.domain, EX.Utilisateur),
+
+        # Event / Accident / Route / Infrastructure
+        (EX.Event, RDF.type, RDFS.Class),
+        (EX.accident, RDF.type, RDFS.Class),
+        (EX.Infrastructure, RDF.type, RDFS.Class),
+        (EX.route, RDF.type, RDFS.Class),
+        (EX.accident, RDFS.subClassOf, EX.Event),
+        (EX.route, RDFS.subClassOf, EX.Infrastructure),
+        (EX.seTrouve, RDF.type, RDF.Property),
+        (EX.seTrouve, RDFS.domain, EX.accident),
+        (EX.seTrouve, RDFS.range, EX.route),
+    ]
+
+ONTOLOGY = set(minimal_ontology())
+
+def load_ontology():
+    # Non journalisée : rechargée à chaque démarrage
+    store.run_locked(lambda graph: graph.addN((s, p, o, graph) for s, p, o in ONTOLOGY))
 
 # Sauvegarde du graphe mis à jour localement (optionnel)
 #g.serialize("smartcity_updated.rdf", format="xml")
@@ -193,60 +528,54 @@ g.add((EX.seTrouve, RDFS.range, EX.route))
 # 👤 UTILISATEURS - ENDPOINTS
 # ======================
 
-@app.post("/add_user/")
-def add_user(user: Utilisateur):
-    classe_type = user.type_utilisateur.capitalize()
+def classe_utilisateur(type_utilisateur: str) -> str:
+    classe_type = type_utilisateur.capitalize()
     if classe_type not in ["Conducteur", "Piéton", "Voyageur"]:
         classe_type = "Utilisateur"
+    return classe_type
 
+def utilisateur_triples(user: Utilisateur) -> list:
     utilisateur_uri = EX[user.id]
-    g.add((utilisateur_uri, RDF.type, EX[classe_type]))
-    g.add((utilisateur_uri, EX.nom, Literal(user.nom, datatype=XSD.string)))
-    g.add((utilisateur_uri, EX.age, Literal(user.age, datatype=XSD.integer)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{user.id} a ex:{classe_type} ;
-                     ex:nom "{user.nom}"^^xsd:string ;
-                     ex:age "{user.age}"^^xsd:integer .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    return [
+        (utilisateur_uri, RDF.type, EX[classe_utilisateur(user.type_utilisateur)]),
+        (utilisateur_uri, EX.nom, Literal(user.nom, datatype=XSD.string)),
+        (utilisateur_uri, EX.age, Literal(user.age, datatype=XSD.integer)),
+    ]
+
+INSERT_USER = templates.update("add_user", """
+    INSERT { ?user a ?classe ; ex:nom ?nom ; ex:age ?age . } WHERE { }
+""", user=IRI, classe=IRI, nom=XSD.string, age=XSD.integer)
+
+@app.post("/add_user/")
+async def add_user(user: Utilisateur):
+    classe_type = classe_utilisateur(user.type_utilisateur)
+    await run_update(INSERT_USER, [{"user": user.id, "classe": classe_type, "nom": user.nom, "age": user.age}],
+                     triples=utilisateur_triples(user))
     return {"message": f"✅ {classe_type} '{user.nom}' ajouté."}
 
-@app.get("/users/")
-def get_all_users():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    SELECT DISTINCT ?id ?type ?nom ?age WHERE {{
+USERS = listings.register(
+    name="users",
+    variables=["id", "type", "nom", "age"],
+    where=f"""
         ?id a ?type .
         OPTIONAL {{ ?id ex:nom ?nom . }}
         OPTIONAL {{ ?id ex:age ?age . }}
-        ?type rdfs:subClassOf* ex:Utilisateur .
-    }}
-    """)
-    results = sparql.query().convert()
-
-    users = []
-    seen = set()
+        {subclass_of("type", "ex:Utilisateur")}
+    """,
+    key="id",
+    distinct=True,
+    unique=True,
+    row=lambda r: {
+        "id": r["id"]["value"].split("#")[-1],
+        "type": r["type"]["value"].split("#")[-1],
+        "nom": r["nom"]["value"] if "nom" in r else None,
+        "age": int(r["age"]["value"]) if "age" in r else None
+    },
+)
 
-    for r in results["results"]["bindings"]:
-        uid = r["id"]["value"]
-        if uid not in seen:
-            seen.add(uid)
-            users.append({
-                "id": uid.split("#")[-1],
-                "type": r["type"]["value"].split("#")[-1],
-                "nom": r["nom"]["value"] if "nom" in r else None,
-                "age": int(r["age"]["value"]) if "age" in r else None
-            })
-    return users
+@app.get("/users/")
+async def get_all_users(response: Response, page: Page = Depends()):
+    return await fetch_listing(USERS, page, response)
 
 # ======================
 # 🚇 MÉTRO / STATION - ENDPOINTS
@@ -259,164 +588,162 @@ class RéseauTransport(BaseModel):
     nom: str
     type_reseau: str  # "Métro", "Bus", "Trottinette", "Voiture", "Vélo"
 
+VALID_RESEAU_TYPES = ["Métro", "Bus", "Trottinette", "Voiture", "Vélo"]
+
+def reseau_triples(reseau: RéseauTransport) -> list:
+    type_clean = reseau.type_reseau.capitalize()
+    if type_clean not in VALID_RESEAU_TYPES:
+        raise ValueError(f"Type '{reseau.type_reseau}' invalide. Doit être un de {VALID_RESEAU_TYPES}")
+    reseau_uri = EX[reseau.id]
+    return [
+        (reseau_uri, RDF.type, EX[type_clean]),
+        (reseau_uri, EX.nom, Literal(reseau.nom, datatype=XSD.string)),
+    ]
+
+INSERT_RESEAU = templates.update("add_reseau_transport", """
+    INSERT { ?reseau a ?classe ; ex:nom ?nom . } WHERE { }
+""", reseau=IRI, classe=IRI, nom=XSD.string)
+
 @app.post("/add_reseau_transport/")
-def add_reseau_transport(reseau: RéseauTransport):
+async def add_reseau_transport(reseau: RéseauTransport):
     """
     Ajoute un réseau de transport générique : Métro, Bus, Trottinette, Voiture, ou Vélo.
     """
     type_clean = reseau.type_reseau.capitalize()
-    valid_types = ["Métro", "Bus", "Trottinette", "Voiture", "Vélo"]
+    valid_types = VALID_RESEAU_TYPES
 
     if type_clean not in valid_types:
         return {"error": f"❌ Type '{reseau.type_reseau}' invalide. Doit être un de {valid_types}"}
 
-    reseau_uri = EX[reseau.id]
-    g.add((reseau_uri, RDF.type, EX[type_clean]))
-    g.add((reseau_uri, EX.nom, Literal(reseau.nom, datatype=XSD.string)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{reseau.id} a ex:{type_clean} ;
-                       ex:nom "{reseau.nom}"^^xsd:string .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    await run_update(INSERT_RESEAU, [{"reseau": reseau.id, "classe": type_clean, "nom": reseau.nom}],
+                     triples=reseau_triples(reseau))
 
     return {"message": f"🚆 Réseau de type '{type_clean}' ajouté : '{reseau.nom}'."}
-@app.get("/reseaux_transport/")
-def get_all_reseaux_transport():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    SELECT ?id ?type ?nom WHERE {{
+RESEAUX_TRANSPORT = listings.register(
+    name="reseaux_transport",
+    variables=["id", "type", "nom"],
+    where=f"""
         ?id a ?type .
-        ?type rdfs:subClassOf* ex:RéseauTransport .
+        {subclass_of("type", "ex:RéseauTransport")}
         OPTIONAL {{ ?id ex:nom ?nom . }}
-    }}
-    """)
-    results = sparql.query().convert()
+    """,
+    key="id",
+    row=lambda r: {
+        "id": r["id"]["value"].split("#")[-1],
+        "type": r["type"]["value"].split("#")[-1],
+        "nom": r["nom"]["value"] if "nom" in r else None
+    },
+)
 
-    data = []
-    for r in results["results"]["bindings"]:
-        data.append({
-            "id": r["id"]["value"].split("#")[-1],
-            "type": r["type"]["value"].split("#")[-1],
-            "nom": r["nom"]["value"] if "nom" in r else None
-        })
-    return data
+@app.get("/reseaux_transport/")
+async def get_all_reseaux_transport(response: Response, page: Page = Depends()):
+    return await fetch_listing(RESEAUX_TRANSPORT, page, response)
 class DisposeDe(BaseModel):
     infrastructure_id: str
     reseau_id: str
   
+def dispose_de_triples(rel: DisposeDe) -> list:
+    return [(EX[rel.infrastructure_id], EX.disposeDe, EX[rel.reseau_id])]
+
+INSERT_DISPOSE_DE = templates.update("add_dispose_de", """
+    INSERT { ?infrastructure ex:disposeDe ?reseau . } WHERE { }
+""", infrastructure=IRI, reseau=IRI)
+
 @app.post("/add_dispose_de/")
-def add_dispose_de(rel: DisposeDe):
-    infra_uri = EX[rel.infrastructure_id]
-    reseau_uri = EX[rel.reseau_id]
-
-    # RDFLib local
-    g.add((infra_uri, EX.disposeDe, reseau_uri))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    # Envoi à Fuseki
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        ex:{rel.infrastructure_id} ex:disposeDe ex:{rel.reseau_id} .
-    }}
-    """
-    send_to_fuseki(insert_query)
+async def add_dispose_de(rel: DisposeDe):
+    # Graphe local RDFLib puis Fuseki
+    await run_update(INSERT_DISPOSE_DE, [{"infrastructure": rel.infrastructure_id, "reseau": rel.reseau_id}],
+                     triples=dispose_de_triples(rel))
 
     return {
         "message": f"🏗️ L'infrastructure '{rel.infrastructure_id}' dispose du réseau '{rel.reseau_id}'."
     }
-@app.get("/dispositions/")
-def get_dispositions():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?infra ?reseau
-    WHERE {{
+DISPOSITIONS = listings.register(
+    name="dispositions",
+    variables=["infra", "reseau"],
+    where="""
         ?infra ex:disposeDe ?reseau .
-    }}
-    """)
-    results = sparql.query().convert()
+    """,
+    key="infra",
+    row=lambda r: {
+        "infrastructure": r["infra"]["value"].split("#")[-1],
+        "reseau": r["reseau"]["value"].split("#")[-1]
+    },
+)
 
-    return [
-        {
-            "infrastructure": r["infra"]["value"].split("#")[-1],
-            "reseau": r["reseau"]["value"].split("#")[-1]
-        }
-        for r in results["results"]["bindings"]
-    ]
+@app.get("/dispositions/")
+async def get_dispositions(response: Response, page: Page = Depends()):
+    return await fetch_listing(DISPOSITIONS, page, response)
 
 
 # ======================
 # 📝 AVIS - ENDPOINTS
 # ======================
 
-@app.post("/add_avis/")
-def add_avis(avis: Avis):
+def avis_triples(avis: Avis) -> list:
     avis_uri = EX[avis.id]
-    utilisateur_uri = EX[avis.utilisateur_id]
-
-    g.add((avis_uri, RDF.type, EX.Avis))
-    g.add((avis_uri, EX.description, Literal(avis.description, datatype=XSD.string)))
-    g.add((avis_uri, EX.donnéPar, utilisateur_uri))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{avis.id} a ex:Avis ;
-                     ex:description "{avis.description}"^^xsd:string ;
-                     ex:donnéPar ex:{avis.utilisateur_id} .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    return [
+        (avis_uri, RDF.type, EX.Avis),
+        (avis_uri, EX.description, Literal(avis.description, datatype=XSD.string)),
+        (avis_uri, EX.donnéPar, EX[avis.utilisateur_id]),
+    ]
+
+INSERT_AVIS = templates.update("add_avis", """
+    INSERT { ?avis a ex:Avis ; ex:description ?description ; ex:donnéPar ?utilisateur . } WHERE { }
+""", avis=IRI, description=XSD.string, utilisateur=IRI)
+
+@app.post("/add_avis/")
+async def add_avis(avis: Avis):
+    await run_update(INSERT_AVIS, [
+        {"avis": avis.id, "description": avis.description, "utilisateur": avis.utilisateur_id},
+    ], triples=avis_triples(avis))
     return {"message": f"✅ Avis '{avis.id}' ajouté pour '{avis.utilisateur_id}'."}
-@app.get("/avis/")
-def get_avis():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?avis ?description ?utilisateur WHERE {{
+AVIS = listings.register(
+    name="avis",
+    variables=["avis", "description", "utilisateur"],
+    where="""
         ?avis a ex:Avis ;
               ex:donnéPar ?utilisateur ;
-              OPTIONAL {{ ?avis ex:description ?description . }}
-    }}
-    """)
-    results = sparql.query().convert()
+              OPTIONAL { ?avis ex:description ?description . }
+    """,
+    key="avis",
+    row=lambda r: {
+        "avis": r["avis"]["value"].split("#")[-1],
+        "description": r.get("description", {}).get("value", None),
+        "utilisateur": r["utilisateur"]["value"].split("#")[-1],
+    },
+)
 
-    return [
-        {
-            "avis": r["avis"]["value"].split("#")[-1],
-            "description": r.get("description", {}).get("value", None),
-            "utilisateur": r["utilisateur"]["value"].split("#")[-1],
-        }
-        for r in results["results"]["bindings"]
-    ]
+def avis_bindings():
+    for avis, utilisateur in read_model.pairs(EX.donnéPar):
+        if EX.Avis not in read_model.types(avis):
+            continue
+        for description in read_model.objects(avis, EX.description) or [None]:
+            b = {"avis": term_binding(avis), "utilisateur": term_binding(utilisateur)}
+            if description is not None:
+                b["description"] = term_binding(description)
+            yield b
 
+@app.get("/avis/")
+async def get_avis(response: Response, page: Page = Depends()):
+    if READ_MODEL:
+        return local_listing(AVIS, avis_bindings(), page, response)
+    return await fetch_listing(AVIS, page, response)
+
+
+AVIS_BY_USER = templates.query("avis_by_user", """
+    SELECT ?utilisateur ?avis WHERE { ?avis a ex:Avis ; ex:donnéPar ?utilisateur . }
+""", utilisateur=IRI)
 
 @app.get("/avis/{utilisateur_id}")
-def get_avis_by_user(utilisateur_id: str):
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?avis ?description WHERE {{
-        ?avis a ex:Avis ;
-              ex:donnéPar ex:{utilisateur_id} .
-    }}
-    """)
-    results = sparql.query().convert()
+async def get_avis_by_user(utilisateur_id: str):
+    if READ_MODEL:
+        return [
+            {"avis": avis.split("#")[-1]}
+            for avis in read_model.subjects(EX.donnéPar, EX[utilisateur_id])
+            if EX.Avis in read_model.types(avis)
+        ]
+    results = await run_select(AVIS_BY_USER, utilisateur=utilisateur_id)
 
     return [
         {
@@ -432,6 +759,7 @@ def get_avis_by_user(utilisateur_id: str):
 # 📊 STATISTIQUES DÉTAILLÉES : Pollution + Accident
 class statistique(BaseModel):
     id: str
+    horodatage: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class StatistiquePollution(statistique):
     tauxPollution: float
@@ -443,320 +771,382 @@ class Observation(BaseModel):
     utilisateur_id: str
     statistique_id: str
 
-@app.post("/add_statistique_pollution/")
-def add_statistique_pollution(stat: StatistiquePollution):
+def statistique_pollution_triples(stat: StatistiquePollution) -> list:
     stat_uri = URIRef(EX + stat.id)  # <- transformer en URIRef
-    g.add((stat_uri, RDF.type, EX.statistique))
-    g.add((stat_uri, RDF.type, EX.StatistiquePollution))
-    g.add((stat_uri, EX.tauxPollution, Literal(stat.tauxPollution, datatype=XSD.float)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{stat.id} a ex:statistique , ex:StatistiquePollution ;
-                     ex:tauxPollution "{stat.tauxPollution}"^^xsd:float .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    return [
+        (stat_uri, RDF.type, EX.statistique),
+        (stat_uri, RDF.type, EX.StatistiquePollution),
+        (stat_uri, EX.tauxPollution, Literal(stat.tauxPollution, datatype=XSD.float)),
+        (stat_uri, EX.horodatage, Literal(stat.horodatage, datatype=XSD.dateTime)),
+    ]
+
+def statistique_accident_triples(stat: statistiqueAccident) -> list:
+    stat_uri = URIRef(EX + stat.id)
+    return [
+        (stat_uri, RDF.type, EX.statistique),
+        (stat_uri, RDF.type, EX.statistiqueAccident),
+        (stat_uri, EX.nbreDaccident, Literal(stat.nbreDaccident, datatype=XSD.integer)),
+        (stat_uri, EX.horodatage, Literal(stat.horodatage, datatype=XSD.dateTime)),
+    ]
+
+def observation_triples(obs: Observation) -> list:
+    return [(URIRef(EX + obs.utilisateur_id), EX.observe, URIRef(EX + obs.statistique_id))]
+
+INSERT_POLLUTION = templates.update("add_statistique_pollution", """
+    INSERT {
+        ?stat a ex:statistique , ex:StatistiquePollution ;
+              ex:tauxPollution ?taux ;
+              ex:horodatage ?horodatage .
+    } WHERE { }
+""", stat=IRI, taux=XSD.float, horodatage=XSD.dateTime)
+
+@app.post("/add_statistique_pollution/")
+async def add_statistique_pollution(stat: StatistiquePollution):
+    await run_update(INSERT_POLLUTION, [
+        {"stat": stat.id, "taux": stat.tauxPollution, "horodatage": stat.horodatage},
+    ], triples=statistique_pollution_triples(stat))
     return {"message": f"✅ StatistiquePollution '{stat.id}' ajoutée avec taux {stat.tauxPollution}."}
 
+INSERT_ACCIDENT = templates.update("add_statistique_accident", """
+    INSERT {
+        ?stat a ex:statistique , ex:statistiqueAccident ;
+              ex:nbreDaccident ?nombre ;
+              ex:horodatage ?horodatage .
+    } WHERE { }
+""", stat=IRI, nombre=XSD.integer, horodatage=XSD.dateTime)
+
 @app.post("/add_statistique_accident/")
-def add_statistique_accident(stat: statistiqueAccident):
-    stat_uri = URIRef(EX + stat.id)  # <- transformer en URIRef
-    g.add((stat_uri, RDF.type, EX.statistique))
-    g.add((stat_uri, RDF.type, EX.statistiqueAccident))
-    g.add((stat_uri, EX.nbreDaccident, Literal(stat.nbreDaccident, datatype=XSD.integer)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{stat.id} a ex:statistique , ex:statistiqueAccident ;
-                     ex:nbreDaccident "{stat.nbreDaccident}"^^xsd:integer .
-    }}
-    """
-    send_to_fuseki(insert_query)
+async def add_statistique_accident(stat: statistiqueAccident):
+    await run_update(INSERT_ACCIDENT, [
+        {"stat": stat.id, "nombre": stat.nbreDaccident, "horodatage": stat.horodatage},
+    ], triples=statistique_accident_triples(stat))
     return {"message": f"✅ StatistiqueAccident '{stat.id}' ajoutée avec {stat.nbreDaccident} accidents."}
 
+INSERT_OBSERVATION = templates.update("add_observation", """
+    INSERT { ?utilisateur ex:observe ?stat . } WHERE { }
+""", utilisateur=IRI, stat=IRI)
+
 @app.post("/add_observation/")
-def add_observation(obs: Observation):
-    utilisateur_uri = URIRef(EX + obs.utilisateur_id)  # <- URIRef
-    stat_uri = URIRef(EX + obs.statistique_id)        # <- URIRef
-
-    g.add((utilisateur_uri, EX.observe, stat_uri))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        ex:{obs.utilisateur_id} ex:observe ex:{obs.statistique_id} .
-    }}
-    """
-    send_to_fuseki(insert_query)
+async def add_observation(obs: Observation):
+    await run_update(INSERT_OBSERVATION, [{"utilisateur": obs.utilisateur_id, "stat": obs.statistique_id}],
+                     triples=observation_triples(obs))
     return {"message": f"👁️ '{obs.utilisateur_id}' observe '{obs.statistique_id}'."}
 # =======================
 # Récupérer toutes les Statistiques
 # =======================
-@app.get("/statistiques/")
-def get_statistiques():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?stat ?taux ?nbre WHERE {{
+STATISTIQUES = listings.register(
+    name="statistiques",
+    variables=["stat", "taux", "nbre"],
+    where="""
         ?stat a ex:statistique .
-        OPTIONAL {{ ?stat a ex:StatistiquePollution ; ex:tauxPollution ?taux . }}
-        OPTIONAL {{ ?stat a ex:statistiqueAccident ; ex:nbreDaccident ?nbre . }}
-    }}
-    """)
-    results = sparql.query().convert()
+        OPTIONAL { ?stat a ex:StatistiquePollution ; ex:tauxPollution ?taux . }
+        OPTIONAL { ?stat a ex:statistiqueAccident ; ex:nbreDaccident ?nbre . }
+    """,
+    key="stat",
+    row=lambda r: {
+        "id": r["stat"]["value"].split("#")[-1],
+        "tauxPollution": float(r["taux"]["value"]) if "taux" in r else None,
+        "nbreDaccident": int(r["nbre"]["value"]) if "nbre" in r else None
+    },
+)
 
-    data = []
-    for r in results["results"]["bindings"]:
-        data.append({
-            "id": r["stat"]["value"].split("#")[-1],
-            "tauxPollution": float(r["taux"]["value"]) if "taux" in r else None,
-            "nbreDaccident": int(r["nbre"]["value"]) if "nbre" in r else None
-        })
-    return data
+def statistiques_bindings():
+    for stat in stat_store.records():
+        b = {"stat": term_binding(EX[stat["id"]])}
+        if stat["tauxPollution"] is not None:
+            b["taux"] = {"type": "literal", "value": str(stat["tauxPollution"])}
+        if stat["nbreDaccident"] is not None:
+            b["nbre"] = {"type": "literal", "value": str(stat["nbreDaccident"])}
+        yield b
+
+@app.get("/statistiques/")
+async def get_statistiques(response: Response, page: Page = Depends()):
+    if READ_MODEL:
+        return local_listing(STATISTIQUES, statistiques_bindings(), page, response)
+    return await fetch_listing(STATISTIQUES, page, response)
+
+@app.get("/statistiques/aggregate")
+async def aggregate_statistiques(
+    type: str = "pollution",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    window: float | None = Query(None, gt=0, description="Largeur des fenêtres en secondes"),
+    percentiles: str = "50,90,99",
+):
+    """
+    Agrégats (count / min / max / mean / percentiles) des taux de pollution ou des nombres
+    d'accidents, globalement ou par fenêtre de temps, calculés sur les colonnes NumPy.
+    Exemple : /statistiques/aggregate?type=pollution&window=3600&percentiles=50,95
+    """
+    if type not in KINDS:
+        raise HTTPException(status_code=400, detail=f"Type inconnu. Disponibles : {sorted(KINDS)}")
+    try:
+        qs = [float(q) for q in percentiles.split(",") if q.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Percentiles invalides.")
+    if any(not 0 <= q <= 100 for q in qs):
+        raise HTTPException(status_code=400, detail="Les percentiles doivent être entre 0 et 100.")
+    buckets = stat_store.aggregate(
+        KINDS[type],
+        start=start.timestamp() if start else None,
+        end=end.timestamp() if end else None,
+        window=window,
+        percentiles=qs,
+    )
+    for b in buckets:
+        for bound in ("start", "end"):
+            if bound in b:
+                b[bound] = datetime.fromtimestamp(b[bound], timezone.utc).isoformat()
+    return {"type": type, "window_s": window, "buckets": buckets}
+
+@app.get("/statistiques/rdf")
+async def get_statistiques_rdf(format: str = "turtle"):
+    """Vue RDF des statistiques : types lus dans le graphe local, valeurs générées depuis les colonnes."""
+    formats = {"turtle": "text/turtle", "nt": "application/n-triples", "xml": "application/rdf+xml"}
+    if format not in formats:
+        raise HTTPException(status_code=400, detail=f"Format inconnu. Disponibles : {sorted(formats)}")
+
+    def render() -> str:
+        view = Graph()
+        view.bind("ex", EX)
+        stat_types = stat_store.stat_classes()
+        for t in store.read(lambda graph: [t for c in stat_types for t in graph.triples((None, RDF.type, c))]):
+            view.add(t)
+        for t in stat_store.triples():
+            view.add(t)
+        return view.serialize(format=format)
+
+    return Response(content=await run_in_threadpool(render), media_type=formats[format])
+
+@app.get("/statistiques/store")
+async def get_stat_store_status():
+    return stat_store.stats()
 
 # =======================
 # Récupérer toutes les Observations
 # =======================
-@app.get("/observations/")
-def get_observations():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?utilisateur ?stat ?taux ?nbre WHERE {{
+OBSERVATIONS = listings.register(
+    name="observations",
+    variables=["utilisateur", "stat", "taux", "nbre"],
+    where="""
         ?utilisateur ex:observe ?stat .
-        OPTIONAL {{ ?stat ex:tauxPollution ?taux . }}
-        OPTIONAL {{ ?stat ex:nbreDaccident ?nbre . }}
-    }}
-    """)
-    results = sparql.query().convert()
+        OPTIONAL { ?stat ex:tauxPollution ?taux . }
+        OPTIONAL { ?stat ex:nbreDaccident ?nbre . }
+    """,
+    key="utilisateur",
+    row=lambda r: {
+        "utilisateur": r["utilisateur"]["value"].split("#")[-1],
+        "statistique": r["stat"]["value"].split("#")[-1],
+        "tauxPollution": float(r["taux"]["value"]) if "taux" in r else None,
+        "nbreDaccident": int(r["nbre"]["value"]) if "nbre" in r else None
+    },
+)
 
-    observations = []
-    for r in results["results"]["bindings"]:
-        observations.append({
-            "utilisateur": r["utilisateur"]["value"].split("#")[-1],
-            "statistique": r["stat"]["value"].split("#")[-1],
-            "tauxPollution": float(r["taux"]["value"]) if "taux" in r else None,
-            "nbreDaccident": int(r["nbre"]["value"]) if "nbre" in r else None
-        })
-    return observations
+@app.get("/observations/")
+async def get_observations(response: Response, page: Page = Depends()):
+    return await fetch_listing(OBSERVATIONS, page, response)
 
 # ======================
 # 🛣️ ROUTES / ACCIDENTS - ENDPOINTS
 # ======================
 # --- ENDPOINTS ---
-@app.post("/add_infrastructure/")
-def add_infrastructure(infra: Infrastructure):
+def infrastructure_triples(infra: Infrastructure) -> list:
     uri = EX[infra.id]
-    g.add((uri, RDF.type, EX[infra.type]))
-    g.add((uri, RDF.type, EX.Infrastructure))
-    g.add((uri, EX.nom, Literal(infra.nom, datatype=XSD.string)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{infra.id} a ex:{infra.type}, ex:Infrastructure ;
-                      ex:nom "{infra.nom}"^^xsd:string .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    return [
+        (uri, RDF.type, EX[infra.type]),
+        (uri, RDF.type, EX.Infrastructure),
+        (uri, EX.nom, Literal(infra.nom, datatype=XSD.string)),
+    ]
+
+INSERT_INFRASTRUCTURE = templates.update("add_infrastructure", """
+    INSERT { ?infra a ?classe , ex:Infrastructure ; ex:nom ?nom . } WHERE { }
+""", infra=IRI, classe=IRI, nom=XSD.string)
+
+@app.post("/add_infrastructure/")
+async def add_infrastructure(infra: Infrastructure):
+    await run_update(INSERT_INFRASTRUCTURE, [{"infra": infra.id, "classe": infra.type, "nom": infra.nom}],
+                     triples=infrastructure_triples(infra))
     return {"message": f"🏗️ Infrastructure '{infra.nom}' ({infra.type}) ajoutée avec succès."}
-@app.get("/get_infrastructures/")
-def get_infrastructures():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    SELECT DISTINCT ?id ?type ?nom WHERE {{
+INFRASTRUCTURES = listings.register(
+    name="infrastructures",
+    variables=["id", "type", "nom"],
+    where=f"""
         ?id rdf:type ?type ;
             ex:nom ?nom .
-        ?type rdfs:subClassOf* ex:Infrastructure .
+        {subclass_of("type", "ex:Infrastructure")}
         FILTER(?type != ex:Infrastructure)
-    }}
-    """)
-    results = sparql.query().convert()
+    """,
+    key="id",
+    distinct=True,
+    unique=True,
+    row=lambda r: {
+        "id": r["id"]["value"].split("#")[-1],
+        "type": r["type"]["value"].split("#")[-1],
+        "nom": r["nom"]["value"] if "nom" in r else None
+    },
+)
 
-    infrastructures = []
-    seen = set()
+@app.get("/get_infrastructures/")
+async def get_infrastructures(response: Response, page: Page = Depends()):
+    return await fetch_listing(INFRASTRUCTURES, page, response)
 
-    for r in results["results"]["bindings"]:
-        iid = r["id"]["value"]
-        if iid not in seen:
-            seen.add(iid)
-            infrastructures.append({
-                "id": iid.split("#")[-1],
-                "type": r["type"]["value"].split("#")[-1],
-                "nom": r["nom"]["value"] if "nom" in r else None
-            })
 
-    return infrastructures
 
+def event_triples(ev: Event) -> list:
+    event_uri = EX[ev.id]
+    return [
+        (event_uri, RDF.type, EX[ev.type]),
+        (event_uri, RDF.type, EX.Event),
+        (event_uri, EX.seTrouve, EX[ev.infrastructure_id]),
+        (event_uri, EX.horodatage, Literal(ev.horodatage, datatype=XSD.dateTime)),
+    ]
 
+INSERT_EVENT = templates.update("add_event", """
+    INSERT { ?event a ?classe , ex:Event ; ex:seTrouve ?infra ; ex:horodatage ?horodatage . } WHERE { }
+""", event=IRI, classe=IRI, infra=IRI, horodatage=XSD.dateTime)
 
 @app.post("/add_event/")
-def add_event(ev: Event):
-    event_uri = EX[ev.id]
-    infra_uri = EX[ev.infrastructure_id]
-    g.add((event_uri, RDF.type, EX[ev.type]))
-    g.add((event_uri, RDF.type, EX.Event))
-    g.add((event_uri, EX.seTrouve, infra_uri))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        ex:{ev.id} a ex:{ev.type}, ex:Event ;
-                    ex:seTrouve ex:{ev.infrastructure_id} .
-    }}
-    """
-    send_to_fuseki(insert_query)
+async def add_event(ev: Event):
+    await run_update(INSERT_EVENT, [
+        {"event": ev.id, "classe": ev.type, "infra": ev.infrastructure_id, "horodatage": ev.horodatage},
+    ], triples=event_triples(ev))
     return {"message": f"🚨 Événement '{ev.type}' ajouté et lié à '{ev.infrastructure_id}'."}
 
 
-@app.get("/events/")
-def get_events():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?event ?type ?infra ?nom WHERE {{
+EVENTS = listings.register(
+    name="events",
+    variables=["event", "type", "infra", "nom"],
+    where="""
         ?event a ?type ;
                ex:seTrouve ?infra .
-        OPTIONAL {{ ?infra ex:nom ?nom . }}
+        OPTIONAL { ?infra ex:nom ?nom . }
         FILTER (?type IN (ex:accident, ex:embouteillage, ex:radar))
-    }}
-    """)
-    results = sparql.query().convert()
+    """,
+    key="event",
+    row=lambda r: {
+        "event": r["event"]["value"].split("#")[-1],
+        "type": r["type"]["value"].split("#")[-1],
+        "infrastructure": r["infra"]["value"].split("#")[-1],
+        "nom_infra": r.get("nom", {}).get("value", "N/A")
+    },
+)
 
-    return [
-        {
-            "event": r["event"]["value"].split("#")[-1],
-            "type": r["type"]["value"].split("#")[-1],
-            "infrastructure": r["infra"]["value"].split("#")[-1],
-            "nom_infra": r.get("nom", {}).get("value", "N/A")
-        }
-        for r in results["results"]["bindings"]
-    ]
+EVENT_TYPES = {EX.accident, EX.embouteillage, EX.radar}
+
+def events_bindings():
+    for event, infra in read_model.pairs(EX.seTrouve):
+        for event_type in read_model.types(event) & EVENT_TYPES:
+            for nom in read_model.objects(infra, EX.nom) or [None]:
+                b = {"event": term_binding(event), "type": term_binding(event_type), "infra": term_binding(infra)}
+                if nom is not None:
+                    b["nom"] = term_binding(nom)
+                yield b
+
+@app.get("/events/")
+async def get_events(response: Response, page: Page = Depends()):
+    if READ_MODEL:
+        return local_listing(EVENTS, events_bindings(), page, response)
+    return await fetch_listing(EVENTS, page, response)
 # ======================
 class RechargeLink(BaseModel):
     reseau: str
     station: str
+
+def recharge_triples(link: RechargeLink) -> list:
+    return [(EX[link.reseau], EX.seRecharge, EX[link.station])]
+INSERT_RECHARGE = templates.update("add_se_recharge", """
+    INSERT { ?reseau ex:seRecharge ?station . } WHERE { }
+""", reseau=IRI, station=IRI)
+
 @app.post("/reseaux/seRecharge")
-def add_reseaux_recharge(link: RechargeLink):
+async def add_reseaux_recharge(link: RechargeLink):
     """
     Ajoute une relation RDF entre un réseau de transport et une station de recharge.
     """
-    reseau_uri = f"<{EX}{link.reseau}>"
-    station_uri = f"<{EX}{link.station}>"
-
-    update_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        {reseau_uri} ex:seRecharge {station_uri} .
-    }}
-    """
-
     try:
-        res = requests.post(FUSEKI_UPDATE_URL, data={"update": update_query})
-        if res.status_code not in [200, 204]:
-            raise Exception(res.text)
+        await run_update(INSERT_RECHARGE, [{"reseau": link.reseau, "station": link.station}],
+                         triples=recharge_triples(link))
         return {
             "message": "Relation ajoutée avec succès ✅",
             "relation": f"{link.reseau} seRecharge {link.station}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur Fuseki : {str(e)}")
-@app.get("/reseaux/seRecharge")
-def get_reseaux_recharge():
-    sparql_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-
-    SELECT ?reseau ?station
-    WHERE {{
+RESEAUX_RECHARGE = listings.register(
+    name="reseaux_recharge",
+    variables=["reseau", "station"],
+    where=f"""
       ?reseau a ?type .
-      ?type rdfs:subClassOf* ex:RéseauTransport .
+      {subclass_of("type", "ex:RéseauTransport")}
       ?reseau ex:seRecharge ?station .
       ?station a ?stype .
-      ?stype rdfs:subClassOf* ex:StationRecharge .
-    }}
-    """
-
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setQuery(sparql_query)
-    sparql.setReturnFormat(JSON)
+      {subclass_of("stype", "ex:StationRecharge")}
+    """,
+    key="reseau",
+    row=lambda r: {"reseau": r["reseau"]["value"], "station": r["station"]["value"]},
+)
 
+@app.get("/reseaux/seRecharge")
+async def get_reseaux_recharge(response: Response, page: Page = Depends()):
     try:
-        results = sparql.query().convert()
-        data = [
-            {"reseau": r["reseau"]["value"], "station": r["station"]["value"]}
-            for r in results["results"]["bindings"]
-        ]
+        data = await fetch_listing(RESEAUX_RECHARGE, page, response)
         return {"count": len(data), "data": data}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 class StationRecharge(BaseModel):
     id: str
+
+def station_recharge_triples(station: StationRecharge) -> list:
+    station_uri = EX[station.id]
+    return [
+        (station_uri, RDF.type, EX.StationRecharge),
+        (station_uri, RDF.type, EX.Energie),
+    ]
+INSERT_STATION_RECHARGE = templates.update("add_station_recharge", """
+    INSERT { ?station a ex:StationRecharge , ex:Energie . } WHERE { }
+""", station=IRI)
+
 @app.post("/add_station_recharge/")
-def add_station_recharge(station: StationRecharge):
+async def add_station_recharge(station: StationRecharge):
     """
     Ajoute une station de recharge (instance de StationRecharge et Energie)
     """
-    station_uri = EX[station.id]
-
-    # --- Ajout dans le graphe local RDFLib ---
-    g.add((station_uri, RDF.type, EX.StationRecharge))
-    g.add((station_uri, RDF.type, EX.Energie))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    # --- Requête SPARQL envoyée à Fuseki ---
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        ex:{station.id} a ex:StationRecharge , ex:Energie .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    # Graphe local RDFLib puis Fuseki
+    await run_update(INSERT_STATION_RECHARGE, [{"station": station.id}],
+                     triples=station_recharge_triples(station))
 
     return {"message": f"⚡ Station de recharge '{station.id}' ajoutée avec succès (type Energie)."}
-@app.get("/stations_recharge/")
-def get_stations_recharge():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?station  WHERE {{
+STATIONS_RECHARGE = listings.register(
+    name="stations_recharge",
+    variables=["station"],
+    where="""
         ?station a ex:StationRecharge .
-                
-    }}
-    """)
-    results = sparql.query().convert()
-    return [
-        {
-            "id": r["station"]["value"].split("#")[-1],
-           
-        }
-        for r in results["results"]["bindings"]
-    ]
+    """,
+    key="station",
+    row=lambda r: {"id": r["station"]["value"].split("#")[-1]},
+)
+
+@app.get("/stations_recharge/")
+async def get_stations_recharge(response: Response, page: Page = Depends()):
+    return await fetch_listing(STATIONS_RECHARGE, page, response)
 
 # ======================
 
 
+VOYAGEUR_EXISTS = templates.query("voyageur_exists", """
+    ASK { ?voyageur a ex:Voyageur . }
+""", voyageur=IRI)
+
+INSERT_TICKET = templates.update("add_ticket_voyageur", """
+    INSERT { ?ticket a ex:Ticket . ?voyageur ex:avoirTicket ?ticket . } WHERE { }
+""", voyageur=IRI, ticket=IRI)
+
 @app.post("/add_ticket_voyageur/")
-def add_ticket_voyageur(data: dict[str, str]):
+async def add_ticket_voyageur(data: dict[str, str]):
     """
     Ajoute un ticket à un voyageur.
     Exemple JSON :
@@ -775,56 +1165,33 @@ def add_ticket_voyageur(data: dict[str, str]):
     ticket_uri = EX[ticket_id]
 
     # Vérifier que le voyageur existe dans Fuseki et est de type ex:Voyageur
-    check_query = f"""
-    PREFIX ex: <{EX}>
-    ASK {{
-        ex:{voyageur_id} a ex:Voyageur .
-    }}
-    """
-
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setQuery(check_query)
-    sparql.setReturnFormat(JSON)
-    result = sparql.query().convert()
-
-    if not result.get("boolean"):
+    if not await run_ask(VOYAGEUR_EXISTS, voyageur=voyageur_id):
         return {"error": f"⚠️ L'utilisateur '{voyageur_id}' n'existe pas ou n'est pas un Voyageur."}
 
-    # Ajouter le ticket localement
-    g.add((ticket_uri, RDF.type, EX.Ticket))
-    g.add((voyageur_uri, EX.avoirTicket, ticket_uri))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    # Envoyer aussi dans Fuseki
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        ex:{ticket_id} a ex:Ticket .
-        ex:{voyageur_id} ex:avoirTicket ex:{ticket_id} .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    # Graphe local RDFLib puis Fuseki
+    await run_update(INSERT_TICKET, [{"voyageur": voyageur_id, "ticket": ticket_id}], triples=[
+        (ticket_uri, RDF.type, EX.Ticket),
+        (voyageur_uri, EX.avoirTicket, ticket_uri),
+    ])
 
     return {"message": f"🎟️ Ticket '{ticket_id}' ajouté avec succès au voyageur '{voyageur_id}'."}
+TICKETS_BY_VOYAGEUR = templates.query("tickets_by_voyageur", """
+    SELECT ?voyageur ?ticket WHERE { ?voyageur ex:avoirTicket ?ticket . }
+""", voyageur=IRI)
+
 @app.get("/tickets/{voyageur_id}")
-def get_tickets_by_voyageur(voyageur_id: str):
+async def get_tickets_by_voyageur(voyageur_id: str):
     """
     Récupère tous les tickets associés à un voyageur donné.
     """
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?ticket WHERE {{
-        ex:{voyageur_id} ex:avoirTicket ?ticket .
-    }}
-    """)
-    results = sparql.query().convert()
-
-    tickets = [
-        r["ticket"]["value"].split("#")[-1]
-        for r in results["results"]["bindings"]
-    ]
+    if READ_MODEL:
+        tickets = [t.split("#")[-1] for t in read_model.objects(EX[voyageur_id], EX.avoirTicket)]
+    else:
+        results = await run_select(TICKETS_BY_VOYAGEUR, voyageur=voyageur_id)
+        tickets = [
+            r["ticket"]["value"].split("#")[-1]
+            for r in results["results"]["bindings"]
+        ]
 
     if not tickets:
         return {"message": f"⚠️ Aucun ticket trouvé pour le voyageur '{voyageur_id}'."}
@@ -835,57 +1202,187 @@ def get_tickets_by_voyageur(voyageur_id: str):
     }
 
 
+TICKETS = listings.register(
+    name="tickets",
+    variables=["ticket", "voyageur"],
+    where="""
+        ?ticket a ex:Ticket .
+        OPTIONAL { ?voyageur ex:avoirTicket ?ticket . }
+    """,
+    key="ticket",
+    row=lambda r: {
+        "ticket": r["ticket"]["value"].split("#")[-1],
+        "voyageur": r["voyageur"]["value"].split("#")[-1] if "voyageur" in r else None
+    },
+)
+
 @app.get("/tickets/")
-def get_all_tickets():
+async def get_all_tickets(response: Response, page: Page = Depends()):
     """
     Récupère tous les tickets enregistrés et leur(s) voyageur(s) associés.
     """
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?ticket ?voyageur WHERE {{
-        ?ticket a ex:Ticket .
-        OPTIONAL {{ ?voyageur ex:avoirTicket ?ticket . }}
-    }}
-    """)
-    results = sparql.query().convert()
-
-    tickets = []
-    for r in results["results"]["bindings"]:
-        tickets.append({
-            "ticket": r["ticket"]["value"].split("#")[-1],
-            "voyageur": r["voyageur"]["value"].split("#")[-1] if "voyageur" in r else None
-        })
+    tickets = await fetch_listing(TICKETS, page, response)
 
     if not tickets:
         return {"message": "⚠️ Aucun ticket enregistré dans la base."}
 
     return {"tickets": tickets}
 
+# ======================
+# 📦 LECTURES ET INSERTIONS GROUPÉES
+# ======================
+# Un écran qui affiche N utilisateurs fait un seul appel (?ids=u1,u2,...) au lieu de N :
+# index locaux si READ_MODEL, sinon une seule requête SPARQL (une ligne VALUES par id).
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", 500))
+
+EVENTS_BY_INFRA = templates.query("events_by_infrastructure", """
+    SELECT ?infra ?event ?type WHERE {
+        ?event a ?type ; ex:seTrouve ?infra .
+        FILTER (?type IN (ex:accident, ex:embouteillage, ex:radar))
+    }
+""", infra=IRI)
+
+EXISTING_VOYAGEURS = templates.query("existing_voyageurs", """
+    SELECT ?voyageur WHERE { ?voyageur a ex:Voyageur . }
+""", voyageur=IRI)
+
+def batch_ids(ids: str) -> list[str]:
+    wanted = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not wanted:
+        raise HTTPException(status_code=400, detail="Paramètre 'ids' vide.")
+    if len(wanted) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Au plus {BATCH_MAX_IDS} identifiants par appel.")
+    return wanted
+
+async def grouped(template, param: str, ids: list[str], value) -> dict[str, list]:
+    """Résultats d'une requête groupée, rangés par identifiant demandé."""
+    results = await run_select_rows(template, [{param: i} for i in ids])
+    out = {i: [] for i in ids}
+    for r in results["results"]["bindings"]:
+        out.setdefault(r[param]["value"].split("#")[-1], []).append(value(r))
+    return out
+
+@app.get("/batch/avis")
+async def get_avis_batch(ids: str):
+    """Avis de plusieurs utilisateurs : {"avis": {utilisateur: [avis...]}}."""
+    wanted = batch_ids(ids)
+    if READ_MODEL:
+        return {"avis": {
+            i: [a.split("#")[-1] for a in read_model.subjects(EX.donnéPar, EX[i]) if EX.Avis in read_model.types(a)]
+            for i in wanted
+        }}
+    return {"avis": await grouped(AVIS_BY_USER, "utilisateur", wanted, lambda r: r["avis"]["value"].split("#")[-1])}
+
+@app.get("/batch/tickets")
+async def get_tickets_batch(ids: str):
+    """Tickets de plusieurs voyageurs : {"tickets": {voyageur: [ticket...]}}."""
+    wanted = batch_ids(ids)
+    if READ_MODEL:
+        return {"tickets": {i: [t.split("#")[-1] for t in read_model.objects(EX[i], EX.avoirTicket)] for i in wanted}}
+    return {"tickets": await grouped(TICKETS_BY_VOYAGEUR, "voyageur", wanted, lambda r: r["ticket"]["value"].split("#")[-1])}
+
+@app.get("/batch/events")
+async def get_events_batch(ids: str):
+    """Événements de plusieurs infrastructures : {"events": {infrastructure: [{event, type}...]}}."""
+    wanted = batch_ids(ids)
+    if READ_MODEL:
+        return {"events": {
+            i: [
+                {"event": e.split("#")[-1], "type": t.split("#")[-1]}
+                for e in read_model.subjects(EX.seTrouve, EX[i])
+                for t in read_model.types(e) & EVENT_TYPES
+            ]
+            for i in wanted
+        }}
+    return {"events": await grouped(EVENTS_BY_INFRA, "infra", wanted, lambda r: {
+        "event": r["event"]["value"].split("#")[-1],
+        "type": r["type"]["value"].split("#")[-1],
+    })}
+
+class TicketVoyageur(BaseModel):
+    voyageur_id: str
+    ticket_id: str
+
+@app.post("/batch/tickets")
+async def add_tickets_batch(items: list[TicketVoyageur]):
+    """
+    Ajoute plusieurs tickets : existence de tous les voyageurs vérifiée en une requête,
+    puis une seule écriture locale et une seule requête INSERT.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="Aucun ticket à ajouter.")
+    if len(items) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Au plus {BATCH_MAX_IDS} tickets par appel.")
+    voyageurs = list(dict.fromkeys(item.voyageur_id for item in items))
+    results = await run_select_rows(EXISTING_VOYAGEURS, [{"voyageur": v} for v in voyageurs])
+    existing = {r["voyageur"]["value"].split("#")[-1] for r in results["results"]["bindings"]}
+
+    accepted = [item for item in items if item.voyageur_id in existing]
+    rejected = sorted({item.voyageur_id for item in items} - existing)
+    if accepted:
+        rows = [{"voyageur": i.voyageur_id, "ticket": i.ticket_id} for i in accepted]
+        triples = []
+        for item in accepted:
+            triples += [
+                (EX[item.ticket_id], RDF.type, EX.Ticket),
+                (EX[item.voyageur_id], EX.avoirTicket, EX[item.ticket_id]),
+            ]
+        await run_update(INSERT_TICKET, rows, triples=triples)
+    return {
+        "message": f"🎟️ {len(accepted)} ticket(s) ajouté(s).",
+        "added": [{"voyageur": i.voyageur_id, "ticket": i.ticket_id} for i in accepted],
+        "errors": [f"⚠️ L'utilisateur '{v}' n'existe pas ou n'est pas un Voyageur." for v in rejected],
+    }
+
 # ======================
 # Delete
 # ======================
+# Triples sortants + références entrantes, et cascades par propriété (voir deletion.py) :
+# "in" supprime les sujets qui pointent vers l'entité, "out" les objets qu'elle référence
+deleter = CascadeDeleter(
+    store,
+    parse_rules(os.getenv("DELETE_CASCADE", "donnéPar:in,avoirTicket:out"), EX),
+    batch_size=int(os.getenv("DELETE_BATCH_SIZE", 500)),
+)
+
+class BulkDelete(BaseModel):
+    ids: list[str] = []
+    classe: str | None = None   # toutes les instances de la classe (sous-classes comprises)
+    cascade: bool = True
+
+async def delete_entities(roots: list[URIRef], cascade: bool) -> dict:
+    """Suppression locale (une écriture) puis dans Fuseki (une requête UPDATE)."""
+    report, versions = await run_in_threadpool(pending_writes.local_write, deleter.delete, roots, cascade)
+    update = report.pop("update")
+    if update:
+        await send_to_fuseki(update, versions)
+    else:
+        on_commit([versions], [])   # rien à envoyer : écriture locale seule, déjà définitive
+    return report
+
 @app.delete("/delete/{instance_id}")
-def delete_instance(instance_id: str):
+async def delete_instance(instance_id: str, cascade: bool = True):
     try:
-        # Supprimer localement
-        g.remove((EX[instance_id], None, None))
-        g.serialize("smartcity_updated.rdf", format="xml")
-
-        # Supprimer dans Fuseki
-        delete_query = f"""
-        PREFIX ex: <{EX}>
-        DELETE WHERE {{
-            ex:{instance_id} ?p ?o .
-        }}
-        """
-        send_to_fuseki(delete_query)
-
-        return {"message": f"🗑️ Instance '{instance_id}' supprimée avec succès."}
+        report = await delete_entities([EX[instance_id]], cascade)
+        return {"message": f"🗑️ Instance '{instance_id}' supprimée avec succès.", **report}
     except Exception as e:
         return {"error": str(e)}
 
+@app.post("/delete/bulk")
+async def delete_bulk(req: BulkDelete):
+    """Suppression en masse, par liste d'identifiants et / ou par classe."""
+    roots = [EX[i] for i in req.ids]
+    if req.classe:
+        roots += sorted(read_model.instances(EX[req.classe]))
+    if not roots:
+        raise HTTPException(status_code=400, detail="Aucune entité à supprimer (ids ou classe).")
+    report = await delete_entities(roots, req.cascade)
+    return {"message": f"🗑️ {len(report['deleted'])} instance(s) supprimée(s).", **report}
+
+@app.get("/delete/stats")
+async def get_delete_stats():
+    return deleter.get_stats()
+
 
 
 
@@ -896,8 +1393,6 @@ def delete_instance(instance_id: str):
 import re
 from typing import Any
 from fastapi import FastAPI
-from SPARQLWrapper import SPARQLWrapper, JSON
-from openai import OpenAI
 
 
 
@@ -907,6 +1402,17 @@ from openai import OpenAI
 
 # Namespace RDF/OWL
 
+# Cache à deux niveaux de /ask_ia/ (voir caches.py) :
+# question normalisée -> SPARQL (LRU persistant) et SPARQL -> résultats (TTL, vidé à chaque écriture)
+ia_sparql_cache = LRUCache(
+    max_entries=int(os.getenv("IA_SPARQL_CACHE_SIZE", 500)),
+    path=os.getenv("IA_SPARQL_CACHE_PATH", "ia_sparql_cache.json"),
+)
+ia_results_cache = TTLCache(
+    ttl=float(os.getenv("IA_RESULTS_CACHE_TTL", 30)),
+    max_entries=int(os.getenv("IA_RESULTS_CACHE_SIZE", 1000)),
+)
+store.subscribe(lambda added, removed, version: ia_results_cache.clear())
 
 # ======================
 # 🧠 SYNONYMES (optionnel)
@@ -925,6 +1431,58 @@ def contains_any(word_list: list[str], text: str) -> bool:
     return any(syn in text for syn in word_list)
 
 
+# ======================
+# ⚡ QUESTIONS SIMPLES SANS LLM
+# ======================
+# Concept de SYNONYMS + forme (liste / comptage) -> requête vérifiée (voir intents.py).
+# Sous-classes énumérées explicitement : requêtes évaluables sur le graphe local.
+IA_INTENTS = {
+    ("accident", "list"): templates.query("ia_accidents", """
+        SELECT ?accident ?infrastructure
+        WHERE { ?accident a ex:accident . OPTIONAL { ?accident ex:seTrouve ?infrastructure . } }
+    """),
+    ("accident", "count"): templates.query("ia_accidents_count", """
+        SELECT (COUNT(DISTINCT ?accident) AS ?nombre) WHERE { ?accident a ex:accident . }
+    """),
+    ("pollution", "list"): templates.query("ia_pollution", """
+        SELECT ?statistique ?tauxPollution
+        WHERE { ?statistique a ex:StatistiquePollution . OPTIONAL { ?statistique ex:tauxPollution ?tauxPollution . } }
+    """),
+    ("pollution", "count"): templates.query("ia_pollution_count", """
+        SELECT (COUNT(DISTINCT ?statistique) AS ?nombre) WHERE { ?statistique a ex:StatistiquePollution . }
+    """),
+    ("utilisateur", "list"): templates.query("ia_utilisateurs", """
+        SELECT ?utilisateur ?type WHERE {
+            VALUES ?type { ex:Utilisateur ex:Conducteur ex:Piéton ex:Voyageur }
+            ?utilisateur a ?type .
+        }
+    """),
+    ("utilisateur", "count"): templates.query("ia_utilisateurs_count", """
+        SELECT (COUNT(DISTINCT ?utilisateur) AS ?nombre) WHERE {
+            VALUES ?type { ex:Utilisateur ex:Conducteur ex:Piéton ex:Voyageur }
+            ?utilisateur a ?type .
+        }
+    """),
+    ("métro", "list"): templates.query("ia_metros", """
+        SELECT ?metro ?nom WHERE { ?metro a ex:Métro . OPTIONAL { ?metro ex:nom ?nom . } }
+    """),
+    ("métro", "count"): templates.query("ia_metros_count", """
+        SELECT (COUNT(DISTINCT ?metro) AS ?nombre) WHERE { ?metro a ex:Métro . }
+    """),
+    ("autoroute", "list"): templates.query("ia_routes", """
+        SELECT ?route ?nom WHERE { ?route a ex:route . OPTIONAL { ?route ex:nom ?nom . } }
+    """),
+    ("autoroute", "count"): templates.query("ia_routes_count", """
+        SELECT (COUNT(DISTINCT ?route) AS ?nombre) WHERE { ?route a ex:route . }
+    """),
+}
+intent_router = IntentRouter(
+    SYNONYMS, IA_INTENTS,
+    min_coverage=float(os.getenv("IA_FAST_PATH_MIN_COVERAGE", 0.75)),
+)
+ia_paths = Counter()   # chemin suivi par /ask_ia/ : template | cache | llm
+
+
 # ======================
 # 🧹 FONCTION DE NETTOYAGE DES REQUÊTES SPARQL
 # ======================
@@ -963,154 +1521,337 @@ def clean_sparql_query(query: str) -> str:
 # 🚀 ROUTE PRINCIPALE IA
 # ======================
 
-@app.post("/ask_ia/")
-def ask_ia(payload: dict[str, Any]):
-    """
-    Interface IA : reçoit une question utilisateur, génère une requête SPARQL avec OpenAI,
-    exécute sur Fuseki et renvoie les résultats RDF.
-    """
-    user_question = payload.get("question", "")
-    if not isinstance(user_question, str) or not user_question.strip():
-        return {"error": "❌ La question est vide ou invalide."}
-
-    user_question = user_question.strip()
-
-    # ======= 1️⃣ Génération SPARQL via OpenAI =======
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",  # Tu peux utiliser "gpt-4o" si tu y as accès
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Tu es un assistant expert en RDF et SPARQL. "
-                        "Tu génères des requêtes SPARQL correctes et valides pour un graphe SmartCity."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": f"""
+async def generate_sparql(user_question: str) -> str:
+    """Génère (via OpenAI) puis nettoie la requête SPARQL correspondant à la question."""
+    completion = await openai_client().chat.completions.create(
+        model="gpt-4o-mini",  # Tu peux utiliser "gpt-4o" si tu y as accès
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "Tu es un assistant expert en RDF et SPARQL. "
+                    "Tu génères des requêtes SPARQL correctes et valides pour un graphe SmartCity."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"""
 Analyse cette question : '{user_question}'
 et génère une requête SPARQL valide selon le schéma suivant :
 Classes : accident, route, stationsMetro, Métro, Utilisateur, Avis, StatistiquePollution, statistiqueAccident, Trajet ,Infrastructure, RéseauTransport, Ticket.
 Propriétés : seTrouve, disposeDe, donnéPar, observe, estDesserviPar, effectue, estConnectéÀ, avoirTicket.
 Utilise le préfixe : PREFIX ex: <{EX}>
 Ne renvoie que la requête SPARQL, sans texte supplémentaire.
-                    """,
-                },
-            ],
-        )
+                """,
+            },
+        ],
+    )
 
-        sparql_query = completion.choices[0].message.content.strip()
-        sparql_query = clean_sparql_query(sparql_query)
+    sparql_query = completion.choices[0].message.content.strip()
+    return clean_sparql_query(sparql_query)
 
-    except Exception as e:
-        return {"error": f"⚠️ Erreur OpenAI : {str(e)}"}
 
-    # ======= 2️⃣ Exécution SPARQL sur Fuseki =======
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(sparql_query)
+@app.post("/ask_ia/")
+async def ask_ia(payload: dict[str, Any]):
+    """
+    Interface IA : reçoit une question utilisateur, génère une requête SPARQL avec OpenAI,
+    exécute sur Fuseki et renvoie les résultats RDF. Les questions simples reconnues
+    (concept + liste / comptage) utilisent directement une requête vérifiée ; le champ
+    `path` indique le chemin suivi (template, cache ou llm).
+    """
+    user_question = payload.get("question", "")
+    if not isinstance(user_question, str) or not user_question.strip():
+        return {"error": "❌ La question est vide ou invalide."}
 
-    try:
-        results = sparql.query().convert()
-    except Exception as e:
-        return {
-            "error": f"⚠️ Erreur SPARQL : {str(e)}",
-            "sparql_query": sparql_query,
-        }
+    user_question = user_question.strip()
+    cache_key = normalize_question(user_question)
+    cache_status = {"sparql": "hit", "results": "hit"}
+
+    # ======= 1️⃣ Requête vérifiée si l'intention est reconnue, sinon génération via OpenAI =======
+    intent = intent_router.match(user_question)
+    if intent is not None:
+        path = "template"
+        sparql_query = intent["query"].text
+        cache_status["sparql"] = "n/a"
+    else:
+        sparql_query = ia_sparql_cache.get(cache_key)
+        path = "cache" if sparql_query is not None else "llm"
+    ia_paths[path] += 1
+    if sparql_query is None:
+        cache_status["sparql"] = "miss"
+        try:
+            sparql_query = await generate_sparql(user_question)
+        except Exception as e:
+            return {"error": f"⚠️ Erreur OpenAI : {str(e)}", "path": path}
+
+    # ======= 2️⃣ Exécution SPARQL sur Fuseki (sauf résultat récent en cache) =======
+    data = ia_results_cache.get(sparql_query)
+    if data is None:
+        cache_status["results"] = "miss"
+        try:
+            if intent is not None:
+                with intent["query"].timed():
+                    results = await planner.select(sparql_query, route=intent["intent"])
+            else:
+                results = await planner.select(sparql_query, route="ask_ia")
+        except Exception as e:
+            # Une requête générée invalide ne doit pas rester en cache
+            ia_sparql_cache.discard(cache_key)
+            return {
+                "error": f"⚠️ Erreur SPARQL : {str(e)}",
+                "sparql_query": sparql_query,
+            }
+
+        # ======= 3️⃣ Formatage du résultat =======
+        data = []
+        for r in results["results"]["bindings"]:
+            entry = {k: v["value"].split("#")[-1] if "#" in v["value"] else v["value"] for k, v in r.items()}
+            data.append(entry)
+        ia_results_cache.put(sparql_query, data)
 
-    # ======= 3️⃣ Formatage du résultat =======
-    data = []
-    for r in results["results"]["bindings"]:
-        entry = {k: v["value"].split("#")[-1] if "#" in v["value"] else v["value"] for k, v in r.items()}
-        data.append(entry)
+    if cache_status["sparql"] == "miss":
+        ia_sparql_cache.put(cache_key, sparql_query)
 
     return {
         "question": user_question,
         "sparql_query": sparql_query,
         "results": data,
+        "cache": cache_status,
+        "path": path,
+        "intent": {k: v for k, v in intent.items() if k != "query"} if intent else None,
     }
 
 
-@app.get("/stats/")
-def get_stats():
-    sparql = SPARQLWrapper(FUSEKI_QUERY_URL)
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
+@app.get("/ask_ia/stats")
+async def get_ask_ia_cache_stats():
+    """Compteurs des caches de /ask_ia/ et taux de questions traitées sans LLM."""
+    total = sum(ia_paths.values())
+    return {
+        "sparql_cache": ia_sparql_cache.stats(),
+        "results_cache": ia_results_cache.stats(),
+        "paths": dict(ia_paths),
+        "fast_path_rate": round(ia_paths["template"] / total, 3) if total else 0.0,
+        "intents": intent_router.get_stats(),
+    }
+
+
+# ======================
+# 📊 AGRÉGATS PRÉ-CALCULÉS (rollups)
+# ======================
+
+STAT_METRICS = {KINDS["pollution"]: "pollution", KINDS["accident"]: "accident"}
+
+def entity_facts(s) -> list[tuple]:
+    """Faits d'agrégation d'une entité (lus sous le verrou du graphe)."""
+    if not isinstance(s, URIRef) or not str(s).startswith(str(EX)):
+        return []
+    types = set(g.objects(s, RDF.type))
+    if not types:
+        return []
+    local_id = s.split("#")[-1]
+    ts = next((to_epoch(o) for o in g.objects(s, EX.horodatage)), None)
+    stat = stat_store.raw(local_id) if stat_store.is_stat(s) else None
+    if stat is not None:
+        ts = stat[2]
+
+    facts = [("class", (c.split("#")[-1],), ts, 1) for c in types if str(c).startswith(str(EX))]
+    for event_type in types & EVENT_TYPES:
+        for infra in g.objects(s, EX.seTrouve):
+            facts.append(("events", (event_type.split("#")[-1], infra.split("#")[-1]), ts, 1))
+    if stat is not None and stat[0] in STAT_METRICS:
+        facts.append((STAT_METRICS[stat[0]], (stat[3],), ts, stat[1]))
+    return facts
+
+rollups = Rollups(
+    metrics={
+        "class": ["class"],
+        "events": ["type", "infrastructure"],
+        "pollution": ["observer"],
+        "accident": ["observer"],
+    },
+    facts=entity_facts,
+    links=[EX.observe],   # une observation modifie la dimension `observer` de la statistique
+    bucket=int(os.getenv("ROLLUP_BUCKET", 3600)),
+)
+# Abonné après stat_store : les valeurs des statistiques sont déjà dans les colonnes
+store.subscribe(rollups.on_change)
+
+@app.get("/rollups")
+async def get_rollups_status():
+    return {"metrics": rollups.metrics, **rollups.get_stats()}
+
+@app.get("/rollups/{metric}")
+async def query_rollup(
+    metric: str,
+    group_by: str | None = None,
+    bucket: int | None = Query(None, gt=0, description="Largeur des fenêtres en secondes"),
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """
+    Agrégats pré-calculés : effectif, somme et moyenne par dimensions et par fenêtre de temps.
+    Exemples :
+    - /rollups/events?group_by=infrastructure           accidents / bouchons / radars par infrastructure
+    - /rollups/events?group_by=type&bucket=86400        événements par type et par jour
+    - /rollups/pollution?bucket=3600&start=2025-01-01   moyenne horaire de la pollution
+    - /rollups/class?group_by=class                     nombre d'entités par classe
+    Le coût ne dépend que du nombre de cellules, pas du nombre de triples.
+    """
+    if metric not in rollups.metrics:
+        raise HTTPException(status_code=404, detail=f"Métrique inconnue. Disponibles : {sorted(rollups.metrics)}")
+    dims = [d.strip() for d in group_by.split(",") if d.strip()] if group_by else []
+    try:
+        rows = rollups.query(
+            metric, dims, bucket,
+            start=start.timestamp() if start else None,
+            end=end.timestamp() if end else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for row in rows:
+        if row.get("start") is not None:
+            row["start"] = datetime.fromtimestamp(row["start"], timezone.utc).isoformat()
+    return {"metric": metric, "group_by": dims, "bucket_s": bucket, "rows": rows}
+
+# ======================
+# 🔢 COMPTEURS PAR CLASSE (/stats/)
+# ======================
+# Les effectifs par classe sont tenus par le store à chaque écriture (store.class_counts,
+# enregistrés avec le snapshot) : /stats/ ne lance plus de GROUP BY sur Fuseki.
+# Une réconciliation périodique compare ces compteurs à Fuseki ; un écart constaté deux
+# fois de suite (donc pas une écriture en cours de propagation) est retenu comme correctif.
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", 600))
+stats_offsets: dict[str, int] = {}   # classe -> correctif appliqué aux compteurs locaux
+stats_reconcile = {"runs": 0, "last_run": None, "drift": {}, "pending": {}, "error": None}
+
+def class_stats(inferred: bool = False) -> list[dict]:
+    if inferred:
+        counts = {str(c): n for c, n in read_model.class_sizes().items()}
+    else:
+        counts = {str(c): n for c, n in store.class_counts.items()}
+    for c, delta in stats_offsets.items():
+        counts[c] = counts.get(c, 0) + delta
+    return sorted(
+        ({"class": c.split("#")[-1], "count": n} for c, n in counts.items() if c.startswith(str(EX)) and n > 0),
+        key=lambda row: row["class"],
+    )
+
+CLASS_COUNTS = templates.query("class_counts", """
     SELECT ?class (COUNT(?s) AS ?count)
-    WHERE {{
+    WHERE {
         ?s a ?class .
         FILTER(STRSTARTS(STR(?class), STR(ex:)))
-    }}
+    }
     GROUP BY ?class
-    """)
-    results = sparql.query().convert()
+""")
 
-    stats = [
-        {"class": r["class"]["value"].split("#")[-1], "count": int(r["count"]["value"])}
-        for r in results["results"]["bindings"]
-    ]
-    return {"stats": stats}
+async def reconcile_class_counts() -> dict:
+    """Compare les compteurs locaux au GROUP BY de Fuseki et met à jour les correctifs."""
+    try:
+        results = await run_select(CLASS_COUNTS)
+    except Exception as e:
+        stats_reconcile["error"] = str(e)
+        return stats_reconcile
+    remote = {r["class"]["value"]: int(r["count"]["value"]) for r in results["results"]["bindings"]}
+    local = {str(c): n for c, n in store.class_counts.items() if str(c).startswith(str(EX))}
+    drift = {}
+    for c in set(remote) | set(local):
+        residual = remote.get(c, 0) - local.get(c, 0) - stats_offsets.get(c, 0)
+        if residual:
+            drift[c] = residual
+    confirmed = {c: n for c, n in drift.items() if stats_reconcile["pending"].get(c) == n}
+    for c, n in confirmed.items():
+        stats_offsets[c] = stats_offsets.get(c, 0) + n
+        if not stats_offsets[c]:
+            del stats_offsets[c]
+    if confirmed:
+        print(f"🔢 Compteurs corrigés d'après Fuseki : {confirmed}")
+    stats_reconcile.update({
+        "runs": stats_reconcile["runs"] + 1,
+        "last_run": datetime.now(timezone.utc).isoformat(),
+        "drift": {c.split("#")[-1]: n for c, n in drift.items()},
+        "pending": {c: n for c, n in drift.items() if c not in confirmed},
+        "error": None,
+    })
+    return stats_reconcile
+
+async def reconcile_loop():
+    while True:
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+        await reconcile_class_counts()
+
+@app.get("/stats/")
+async def get_stats(inferred: bool = False):
+    """
+    Nombre d'instances par classe du namespace ex:, lu dans les compteurs locaux (coût constant).
+    ?inferred=true compte aussi les instances des sous-classes (hiérarchie rdfs:subClassOf).
+    """
+    return {"stats": class_stats(inferred)}
+
+@app.get("/stats/reconcile")
+async def get_stats_reconcile():
+    return {
+        **{k: v for k, v in stats_reconcile.items() if k != "pending"},
+        "interval_s": STATS_RECONCILE_INTERVAL,
+        "offsets": {c.split("#")[-1]: n for c, n in stats_offsets.items()},
+    }
+
+@app.post("/stats/reconcile")
+async def run_stats_reconcile():
+    """Lance une réconciliation immédiate (un écart doit être vu deux fois pour être corrigé)."""
+    await reconcile_class_counts()
+    return await get_stats_reconcile()
 #----------------------------------------
 class SmartCity(BaseModel):
     id: str
     gouvernance: str
     description: str
 
+def smartcity_triples(city: SmartCity) -> list:
+    city_uri = EX[city.id]
+    return [
+        (city_uri, RDF.type, EX.smartCity),
+        (city_uri, EX.gouvernance, Literal(city.gouvernance, datatype=XSD.string)),
+        (city_uri, EX.description, Literal(city.description, datatype=XSD.string)),
+    ]
+
+INSERT_SMARTCITY = templates.update("add_smartcity", """
+    INSERT { ?city a ex:smartCity ; ex:gouvernance ?gouvernance ; ex:description ?description . } WHERE { }
+""", city=IRI, gouvernance=XSD.string, description=XSD.string)
+
 @app.post("/add_smartcity/")
-def add_smartcity(city: SmartCity):
+async def add_smartcity(city: SmartCity):
     """
     Ajoute une SmartCity avec ses attributs gouvernance et description.
     """
-    city_uri = EX[city.id]
-
-    # --- Ajout dans le graphe local RDFLib
-    g.add((city_uri, RDF.type, EX.smartCity))
-    g.add((city_uri, EX.gouvernance, Literal(city.gouvernance, datatype=XSD.string)))
-    g.add((city_uri, EX.description, Literal(city.description, datatype=XSD.string)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    # --- Envoi vers Fuseki
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{city.id} a ex:smartCity ;
-                     ex:gouvernance "{city.gouvernance}"^^xsd:string ;
-                     ex:description "{city.description}"^^xsd:string .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    # Graphe local RDFLib puis Fuseki
+    await run_update(INSERT_SMARTCITY, [
+        {"city": city.id, "gouvernance": city.gouvernance, "description": city.description},
+    ], triples=smartcity_triples(city))
 
     return {"message": f"🏙️ SmartCity '{city.id}' ajoutée avec succès."}
 
 
 
-@app.get("/smartcities/")
-def get_smartcities():
-    sparql_query = f"""
-    PREFIX ex: <{EX}>
-    SELECT ?id ?gouv ?desc
-    WHERE {{
+SMARTCITIES = listings.register(
+    name="smartcities",
+    variables=["id", "gouv", "desc"],
+    where="""
         ?id a ex:smartCity ;
              ex:gouvernance ?gouv ;
              ex:description ?desc .
-    }}
-    """
-    sparql = SPARQLWrapper("http://localhost:3030/smartcity/query")
-    sparql.setQuery(sparql_query)
-    sparql.setReturnFormat(JSON)
-    results = sparql.query().convert()
-    return [
-        {
-            "id": r["id"]["value"].split("#")[-1],
-            "gouvernance": r["gouv"]["value"],
-            "description": r["desc"]["value"]
-        }
-        for r in results["results"]["bindings"]
-    ]    
+    """,
+    key="id",
+    row=lambda r: {
+        "id": r["id"]["value"].split("#")[-1],
+        "gouvernance": r["gouv"]["value"],
+        "description": r["desc"]["value"]
+    },
+)
+
+@app.get("/smartcities/")
+async def get_smartcities(response: Response, page: Page = Depends()):
+    return await fetch_listing(SMARTCITIES, page, response)
 #--------------------------------------
 from pydantic import BaseModel
 from rdflib import Literal, RDF, XSD
@@ -1120,30 +1861,26 @@ class Trajet(BaseModel):
     duree: str     # exemple : "25 min"
     distance: str  # exemple : "10 km"
 
+def trajet_triples(trajet: Trajet) -> list:
+    trajet_uri = EX[trajet.id]
+    return [
+        (trajet_uri, RDF.type, EX.Trajet),
+        (trajet_uri, EX.duree, Literal(trajet.duree, datatype=XSD.string)),
+        (trajet_uri, EX.distance, Literal(trajet.distance, datatype=XSD.string)),
+    ]
+
+INSERT_TRAJET = templates.update("add_trajet", """
+    INSERT { ?trajet a ex:Trajet ; ex:duree ?duree ; ex:distance ?distance . } WHERE { }
+""", trajet=IRI, duree=XSD.string, distance=XSD.string)
+
 @app.post("/add_trajet/")
-def add_trajet(trajet: Trajet):
+async def add_trajet(trajet: Trajet):
     """
     Ajoute un trajet (classe Trajet) avec durée et distance.
     """
-    trajet_uri = EX[trajet.id]
-
-    # --- Ajout local RDFLib
-    g.add((trajet_uri, RDF.type, EX.Trajet))
-    g.add((trajet_uri, EX.duree, Literal(trajet.duree, datatype=XSD.string)))
-    g.add((trajet_uri, EX.distance, Literal(trajet.distance, datatype=XSD.string)))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    # --- Envoi à Fuseki
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    INSERT DATA {{
-        ex:{trajet.id} a ex:Trajet ;
-                       ex:duree "{trajet.duree}"^^xsd:string ;
-                       ex:distance "{trajet.distance}"^^xsd:string .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    # Graphe local RDFLib puis Fuseki
+    await run_update(INSERT_TRAJET, [{"trajet": trajet.id, "duree": trajet.duree, "distance": trajet.distance}],
+                     triples=trajet_triples(trajet))
 
     return {"message": f"🛣️ Trajet '{trajet.id}' ajouté avec succès."}
 
@@ -1151,60 +1888,406 @@ class EffectueLink(BaseModel):
     utilisateur: str
     trajet: str
 
+def effectue_triples(link: EffectueLink) -> list:
+    return [(EX[link.utilisateur], EX.effectue, EX[link.trajet])]
+
+INSERT_EFFECTUE = templates.update("add_effectue_trajet", """
+    INSERT { ?utilisateur ex:effectue ?trajet . } WHERE { }
+""", utilisateur=IRI, trajet=IRI)
+
 @app.post("/utilisateur/effectue_trajet/")
-def add_effectue_link(link: EffectueLink):
+async def add_effectue_link(link: EffectueLink):
     """
     Ajoute la relation : Utilisateur effectue Trajet.
     """
-    utilisateur_uri = EX[link.utilisateur]
-    trajet_uri = EX[link.trajet]
-
-    # --- Ajout local RDFLib
-    g.add((utilisateur_uri, EX.effectue, trajet_uri))
-    g.serialize("smartcity_updated.rdf", format="xml")
-
-    # --- Envoi à Fuseki
-    insert_query = f"""
-    PREFIX ex: <{EX}>
-    INSERT DATA {{
-        ex:{link.utilisateur} ex:effectue ex:{link.trajet} .
-    }}
-    """
-    send_to_fuseki(insert_query)
+    # Graphe local RDFLib puis Fuseki
+    await run_update(INSERT_EFFECTUE, [{"utilisateur": link.utilisateur, "trajet": link.trajet}],
+                     triples=effectue_triples(link))
 
     return {"message": f"👤 Utilisateur '{link.utilisateur}' effectue le trajet '{link.trajet}'."}
+TRAJETS = listings.register(
+    name="trajets",
+    variables=["utilisateur", "trajet", "duree", "distance"],
+    where="""
+        ?utilisateur ex:effectue ?trajet .
+        ?trajet a ex:Trajet .
+        OPTIONAL { ?trajet ex:duree ?duree . }
+        OPTIONAL { ?trajet ex:distance ?distance . }
+    """,
+    key="utilisateur",
+    row=lambda r: {
+        "utilisateur": r["utilisateur"]["value"].split("#")[-1],
+        "trajet": r["trajet"]["value"].split("#")[-1],
+        "duree": r["duree"]["value"] if "duree" in r else "N/A",
+        "distance": r["distance"]["value"] if "distance" in r else "N/A"
+    },
+)
+
+def trajets_bindings():
+    for utilisateur, trajet in read_model.pairs(EX.effectue):
+        if EX.Trajet not in read_model.types(trajet):
+            continue
+        for duree in read_model.objects(trajet, EX.duree) or [None]:
+            for distance in read_model.objects(trajet, EX.distance) or [None]:
+                b = {"utilisateur": term_binding(utilisateur), "trajet": term_binding(trajet)}
+                if duree is not None:
+                    b["duree"] = term_binding(duree)
+                if distance is not None:
+                    b["distance"] = term_binding(distance)
+                yield b
+
 @app.get("/utilisateurs/trajets/")
-def get_trajets_effectues():
+async def get_trajets_effectues(response: Response, page: Page = Depends()):
     """
     Récupère tous les trajets effectués par les utilisateurs,
     avec durée et distance.
     """
-    sparql = SPARQLWrapper("http://localhost:3030/smartcity/query")
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(f"""
-    PREFIX ex: <{EX}>
-    SELECT ?utilisateur ?trajet ?duree ?distance
-    WHERE {{
-        ?utilisateur ex:effectue ?trajet .
-        ?trajet a ex:Trajet .
-        OPTIONAL {{ ?trajet ex:duree ?duree . }}
-        OPTIONAL {{ ?trajet ex:distance ?distance . }}
-    }}
-    """)
     try:
-        results = sparql.query().convert()
-        data = []
-        for r in results["results"]["bindings"]:
-            data.append({
-                "utilisateur": r["utilisateur"]["value"].split("#")[-1],
-                "trajet": r["trajet"]["value"].split("#")[-1],
-                "duree": r["duree"]["value"] if "duree" in r else "N/A",
-                "distance": r["distance"]["value"] if "distance" in r else "N/A"
-            })
+        if READ_MODEL:
+            data = local_listing(TRAJETS, trajets_bindings(), page, response)
+        else:
+            data = await fetch_listing(TRAJETS, page, response)
         return {"count": len(data), "relations": data}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))    
+
+# ======================
+# 🗃️ CACHE DES LECTURES (invalidation par classe / propriété)
+# ======================
+
+result_cache = TaggedCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", 1000)),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+)
+
+# Endpoints de lecture mis en cache -> étiquettes (noms locaux ex:) lues par leur requête
+CACHED_ROUTES = {
+    "/users/": USERS.tags(),
+    "/reseaux_transport/": RESEAUX_TRANSPORT.tags(),
+    "/dispositions/": DISPOSITIONS.tags(),
+    "/avis/": AVIS.tags(),
+    "/statistiques/": STATISTIQUES.tags(),
+    "/observations/": OBSERVATIONS.tags(),
+    "/get_infrastructures/": INFRASTRUCTURES.tags(),
+    "/events/": EVENTS.tags(),
+    "/reseaux/seRecharge": RESEAUX_RECHARGE.tags(),
+    "/stations_recharge/": STATIONS_RECHARGE.tags(),
+    "/tickets/": TICKETS.tags(),
+    "/smartcities/": SMARTCITIES.tags(),
+    "/utilisateurs/trajets/": TRAJETS.tags(),
+    "/batch/avis": AVIS.tags(),
+    "/batch/tickets": TICKETS.tags(),
+    "/batch/events": EVENTS.tags(),
+    # /stats/ n'est pas mis en cache : il lit directement les compteurs par classe
+}
+# Routes paramétrées (/avis/{utilisateur_id}, /tickets/{voyageur_id})
+CACHED_PREFIXES = {
+    "/avis/": AVIS.tags(),
+    "/tickets/": TICKETS.tags(),
+}
+
+def cached_route_tags(path: str) -> set[str] | None:
+    if path in CACHED_ROUTES:
+        return CACHED_ROUTES[path]
+    for prefix, tags in CACHED_PREFIXES.items():
+        if path.startswith(prefix) and "/" not in path[len(prefix):]:
+            return tags
+    return None
+
+def ex_name(term) -> str | None:
+    value = str(term)
+    return value[len(str(EX)):] if value.startswith(str(EX)) else None
+
+def write_tags(triples: list) -> set[str] | None:
+    """
+    Étiquettes touchées par une écriture : prédicats et classes des triples, plus
+    celles de leurs conséquences (super-classes, domain/range). None si l'ontologie change.
+    """
+    tags = set()
+    for t in triples:
+        if is_schema(t):
+            return None
+        derived = reasoner.rules.consequences(t) if reasoner.rules is not None else set()
+        for s, p, o in (t, *derived):
+            name = ex_name(o) if p == RDF.type else ex_name(p)
+            if name:
+                tags.add(name)
+    return tags
+
+def invalidate_reads(added: list, removed: list, version: int):
+    """Invalide les réponses touchées ; une écriture en attente de Fuseki garde ses étiquettes sales."""
+    tags = write_tags([*added, *removed])
+    pending = pending_writes.get(version)
+    if pending is not None:
+        pending["tags"] = tags   # settle à la validation du lot (on_commit)
+    if tags is None:
+        result_cache.clear()
+    else:
+        result_cache.invalidate(tags, dirty=pending is not None)
+
+store.subscribe(invalidate_reads)
+
+async def cache_reads(request: Request, call_next):
+    """
+    Cache des GET listés ci-dessus, avec ETag : un client qui renvoie `If-None-Match`
+    reçoit 304 tant que les données n'ont pas changé.
+    """
+    tags = cached_route_tags(request.url.path) if request.method == "GET" else None
+    if tags is None:
+        return await call_next(request)
+
+    key = request.url.path + "?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    cached = result_cache.get(key)
+    if cached is None:
+        token = result_cache.token()
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {k: response.headers[k] for k in ("content-type", "x-next-cursor") if k in response.headers}
+        headers["etag"] = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        result_cache.put(key, body, headers, tags, token)
+        status = "MISS"
+    else:
+        body, headers = cached
+        status = "HIT"
+
+    if request.headers.get("if-none-match") == headers["etag"]:
+        result_cache.counters["not_modified"] += 1
+        return Response(status_code=304, headers={"ETag": headers["etag"], "X-Cache": status})
+    return Response(content=body, status_code=200, headers={**headers, "X-Cache": status})
+
+# Ajouté en dernier de la pile : CORSMiddleware reste au-dessus et s'applique aussi aux réponses du cache
+app.user_middleware.append(Middleware(BaseHTTPMiddleware, dispatch=cache_reads))
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return result_cache.stats()
+
+# ======================
+# 📡 FLUX DES MODIFICATIONS (SSE)
+# ======================
+
+change_feed = ChangeFeed(
+    store.graph, EX,
+    max_events=int(os.getenv("CHANGES_BUFFER", 1000)),
+    supers=lambda cls: reasoner.rules.supers.get(cls, set()) if reasoner.rules is not None else set(),
+)
+store.subscribe(change_feed.record)
+
+def on_updates_committed():
+    """Écritures validées par Fuseki : diffusion des événements dans l'ordre, journal des transactions."""
+    change_feed.publish(before=pending_writes.floor())
+    graph_sync.publish_pending()   # les autres processus relisent ces sujets
+
+def on_commit(committed: list, failed: list):
+    """Après chaque lot du coalesceur, même si la file ne se vide pas (rafale d'écritures)."""
+    done = pending_writes.complete([v for versions in committed for v in versions])
+    for write in done:
+        graph_sync.announce(write.get("subjects", ()))   # seulement ce que Fuseki a reçu
+    done += pending_writes.complete([v for versions in failed for v in versions], ok=False)
+    for write in done:
+        if "tags" in write:
+            result_cache.settle(write["tags"])   # étiquettes de ces écritures seulement
+    on_updates_committed()
+
+coalescer.on_commit = on_commit
+
+def on_replicated():
+    """Écritures d'un autre worker appliquées depuis le journal partagé (déjà validées par Fuseki)."""
+    change_feed.publish(before=pending_writes.floor())
+
+store.on_replicated = on_replicated
+
+@app.get("/changes")
+async def stream_changes(request: Request, since: str | None = None, types: str | None = None):
+    """
+    Flux SSE des modifications (`EventSource("/changes")`) :
+    - `change` : {version, entities: [{id, op, types, fields}], added, removed}
+    - `ready` / `reset` : état initial ; `reset` = jeton trop ancien, recharger les listes
+    Reprise après coupure via l'en-tête `Last-Event-ID` (automatique côté navigateur) ou `?since=`.
+    `?types=Avis,Utilisateur` ne garde que les entités de ces classes (super-classes comprises).
+    """
+    token = request.headers.get("last-event-id") or since
+    wanted = {t.strip() for t in types.split(",") if t.strip()} if types else None
+    return StreamingResponse(
+        change_feed.stream(token, wanted),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/changes/stats")
+async def get_changes_stats():
+    return change_feed.get_stats()
+
+# ======================
+# 📤 EXPORT EN FLUX (NDJSON / CSV)
+# ======================
+
+@app.get("/export/{collection}")
+async def export_collection(collection: str, format: str = "ndjson"):
+    """
+    Exporte une collection complète en flux (NDJSON ou CSV) : les résultats Fuseki
+    sont lus et renvoyés ligne à ligne, la mémoire reste constante.
+    Collections : users, avis, events, statistiques, observations, tickets, ...
+    """
+    listing = listings.get(collection)
+    if listing is None:
+        raise HTTPException(status_code=404, detail=f"Collection inconnue. Disponibles : {sorted(listings)}")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format attendu : ndjson ou csv.")
+
+    rows = listing.stream_rows(fuseki.select_stream(listing.query(order=listing.unique)))
+    if format == "csv":
+        return StreamingResponse(
+            csv_lines(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{collection}.csv"'},
+        )
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
+# ======================
+# 📦 IMPORT MASSIF
+# ======================
+
+bulk_importer = BulkImporter(
+    store,
+    fuseki_sync,
+    builders={
+        "Utilisateur": (Utilisateur, utilisateur_triples),
+        "RéseauTransport": (RéseauTransport, reseau_triples),
+        "DisposeDe": (DisposeDe, dispose_de_triples),
+        "Avis": (Avis, avis_triples),
+        "StatistiquePollution": (StatistiquePollution, statistique_pollution_triples),
+        "statistiqueAccident": (statistiqueAccident, statistique_accident_triples),
+        "Observation": (Observation, observation_triples),
+        "Infrastructure": (Infrastructure, infrastructure_triples),
+        "Event": (Event, event_triples),
+        "RechargeLink": (RechargeLink, recharge_triples),
+        "StationRecharge": (StationRecharge, station_recharge_triples),
+        "SmartCity": (SmartCity, smartcity_triples),
+        "Trajet": (Trajet, trajet_triples),
+        "EffectueLink": (EffectueLink, effectue_triples),
+    },
+    namespace=EX,
+    authority=os.getenv("SKOLEM_AUTHORITY", str(EX)),
+    batch_size=int(os.getenv("BULK_BATCH_SIZE", 10000)),
+    max_document_bytes=int(os.getenv("BULK_MAX_DOCUMENT_BYTES", 64 * 1024 * 1024)),
+)
+bulk_tasks: set[asyncio.Task] = set()   # imports en cours (référence gardée jusqu'à la fin)
+
+def spool_upload(src) -> tuple[Any, int]:
+    """Copie l'upload dans un fichier temporaire (fermé par FastAPI après la réponse)."""
+    dst = tempfile.TemporaryFile()
+    shutil.copyfileobj(src, dst, length=1024 * 1024)
+    size = dst.tell()
+    dst.seek(0)
+    return dst, size
+
+async def run_bulk_job(job, fileobj, batch_size: int | None):
+    try:
+        await run_in_threadpool(bulk_importer.run, job, fileobj, batch_size)
+    finally:
+        fileobj.close()
+        on_updates_committed()   # lots validés par Fuseki avant l'écriture locale
+
+@app.post("/bulk/import")
+async def bulk_import(file: UploadFile = File(...), format: str | None = None, batch_size: int | None = None):
+    """
+    Importe un fichier Turtle, N-Triples, N-Quads, RDF/XML ou JSON Lines.
+    En JSON Lines, chaque ligne porte le nom du modèle :
+    {"model": "Utilisateur", "id": "u1", "nom": "Ali", "age": 30, "type_utilisateur": "Voyageur"}
+    L'import tourne en arrière-plan : la réponse (202) donne le job_id, dont la
+    progression est consultable via /bulk/jobs/{job_id}.
+    Turtle et RDF/XML sont lus en entier (BULK_MAX_DOCUMENT_BYTES) : pour un gros
+    fichier, préférer N-Triples, N-Quads ou JSON Lines.
+    """
+    try:
+        fmt = guess_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    fileobj, size = await run_in_threadpool(spool_upload, file.file)
+    try:
+        bulk_importer.check_size(fmt, size)
+    except ValueError as e:
+        fileobj.close()
+        raise HTTPException(status_code=413, detail=str(e))
+
+    job = bulk_importer.new_job(file.filename, fmt)
+    task = asyncio.create_task(run_bulk_job(job, fileobj, batch_size))
+    bulk_tasks.add(task)
+    task.add_done_callback(bulk_tasks.discard)
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@app.get("/bulk/jobs")
+async def get_bulk_jobs():
+    return [job.to_dict() for job in bulk_importer.jobs.values()]
+
+@app.get("/bulk/jobs/{job_id}")
+async def get_bulk_job(job_id: str):
+    job = bulk_importer.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import '{job_id}' introuvable.")
+    return job.to_dict()
+
+# ======================
+# 🧠 INFÉRENCE OWL-RL (ADMIN)
+# ======================
+
+@app.post("/admin/inference")
+async def run_inference():
+    """Recalcule la fermeture OWL-RL et remplace le graphe inféré dans Fuseki."""
+    report = await run_in_threadpool(reasoner.refresh)
+    if report["status"] == "failed":
+        raise HTTPException(status_code=500, detail=report)
+    return report
+
+@app.get("/admin/inference")
+async def get_inference_status():
+    return reasoner.stats
+
+@app.get("/admin/templates")
+async def get_templates_stats():
+    """Requêtes paramétrées : nombre d'appels, erreurs et histogramme de latence par identifiant."""
+    return templates.get_stats()
+
+@app.get("/admin/planner")
+async def get_planner_stats():
+    """Routage des lectures : cible choisie, motif et latence par route."""
+    return planner.get_stats()
+
+@app.get("/admin/store")
+async def get_store_status():
+    """Graphe local : version, taille du journal, contention du verrou lecteurs / rédacteur."""
+    return await run_in_threadpool(store.get_stats)
+
+@app.get("/admin/read_model")
+async def get_read_model_status():
+    return {"enabled": READ_MODEL, **read_model.get_stats()}
+
+@app.post("/admin/read_model/check")
+async def check_read_model():
+    """
+    Compare les effectifs des index (types par classe, triples par propriété) à ceux de Fuseki.
+    Des écritures encore en file dans le coalesceur peuvent apparaître comme un écart transitoire.
+    """
+    classes_query, properties_query = read_model.count_queries()
+    classes = await fuseki.select(classes_query)
+    properties = await fuseki.select(properties_query)
+    return read_model.check(
+        {r["c"]["value"]: int(r["n"]["value"]) for r in classes["results"]["bindings"]},
+        {r["p"]["value"]: int(r["n"]["value"]) for r in properties["results"]["bindings"]},
+    )
+
+@app.post("/admin/read_model/rebuild")
+async def rebuild_read_model():
+    """Reconstruit les index à partir du graphe local (écritures suspendues pendant la reconstruction)."""
+    await run_in_threadpool(store.read, read_model.rebuild)
+    return read_model.get_stats()
+
 #------------------------------------
 @app.get("/")
-def home():
+async def home():
     return {"message": "🚀 Bienvenue dans l’API SmartCity RDF + Fuseki"}
@@ -0,0 +1,300 @@
+# bulk_import.py
+"""
+Import massif de données RDF (Turtle, N-Triples, N-Quads, RDF/XML) ou JSON Lines
+de modèles Pydantic.
+
+Les formats ligne à ligne (N-Triples, N-Quads, JSON Lines) sont lus par morceaux :
+les triples sont regroupés en lots de taille fixe, envoyés à Fuseki en un seul POST
+N-Triples par lot, puis ajoutés au graphe local (journal) une fois le lot validé. Un
+échec en cours d'import laisse donc les deux stores avec les mêmes lots. L'envoi du
+lot N se fait pendant l'analyse du lot N+1 ; au plus deux lots sont en mémoire.
+
+Turtle et RDF/XML ne se découpent pas en lignes : le parseur rdflib lit le document
+entier en mémoire (seuls les triples produits sont envoyés par lots). Ces formats sont
+limités à `max_document_bytes` ; pour un gros fichier, convertir en N-Triples,
+N-Quads ou JSON Lines.
+
+Un libellé de nœud anonyme (`_:b`) a pour portée tout le fichier : une seule table
+de correspondance sert à tous les lots du même import, et les nœuds anonymes sont
+skolémisés (IRI `/.well-known/genid/` sous l'autorité `authority` de l'application,
+RDF 1.1). Chaque POST Fuseki ayant sa propre portée de libellés, c'est la seule façon pour qu'un même `_:b` réparti sur deux lots
+désigne la même ressource, dans Fuseki comme dans le graphe local.
+
+Les triples construits depuis les lignes JSON Lines passent par le même contrôle que
+les paramètres des requêtes (`templates.check_term`) : un identifiant invalide rend
+l'import invalide au lieu d'écrire une IRI que Fuseki refuserait.
+"""
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Iterator
+
+from pydantic import BaseModel, ValidationError
+from rdflib import BNode, ConjunctiveGraph, Graph
+from rdflib.store import Store
+
+from persistence import triple_to_nquad
+from templates import check_term
+
+FORMATS = {
+    "turtle": "turtle",
+    "ttl": "turtle",
+    "nt": "nt",
+    "ntriples": "nt",
+    "nq": "nquads",
+    "nquads": "nquads",
+    "xml": "xml",
+    "rdf": "xml",
+    "owl": "xml",
+    "jsonl": "jsonl",
+    "ndjson": "jsonl",
+}
+
+CHUNK_SIZE = 1024 * 1024  # lecture du fichier par blocs de 1 Mo
+
+# Formats lus en entier par le parseur rdflib (taille limitée)
+DOCUMENT_FORMATS = {"turtle", "xml"}
+
+
+class FusekiWriteError(RuntimeError):
+    """Échec d'envoi d'un lot à Fuseki (erreur serveur, pas une erreur des données)."""
+
+
+def guess_format(filename: str | None, requested: str | None) -> str:
+    """Format explicite, sinon déduit de l'extension du fichier."""
+    key = (requested or (filename or "").rsplit(".", 1)[-1]).lower()
+    if key not in FORMATS:
+        raise ValueError(f"Format inconnu '{key}'. Formats acceptés : {sorted(set(FORMATS))}")
+    return FORMATS[key]
+
+
+def iter_line_batches(fileobj: BinaryIO, batch_lines: int) -> Iterator[list[str]]:
+    """Découpe un flux texte ligne à ligne en lots, sans charger tout le fichier."""
+    batch, rest = [], b""
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            if line.strip():
+                batch.append(line.decode("utf-8"))
+                if len(batch) >= batch_lines:
+                    yield batch
+                    batch = []
+    if rest.strip():
+        batch.append(rest.decode("utf-8"))
+    if batch:
+        yield batch
+
+
+class BatchSink(Store):
+    """
+    Store rdflib minimal qui ne conserve rien : les triples produits par le parseur
+    sont transmis par lots à `on_batch`. Le document Turtle / RDF-XML est lu en entier
+    par le parseur, mais le graphe complet n'est pas construit en mémoire.
+    """
+
+    def __init__(self, on_batch: Callable[[list], None], batch_size: int):
+        super().__init__()
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.batch = []
+
+    def add(self, triple, context, quoted=False):
+        self.batch.append(triple)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self.on_batch(batch)
+
+    def bind(self, prefix, namespace, override=True, replace=False):
+        pass
+
+    def namespace(self, prefix):
+        return None
+
+    def prefix(self, namespace):
+        return None
+
+    def namespaces(self):
+        return iter(())
+
+
+class ImportJob:
+    """Suivi de progression d'un import."""
+
+    def __init__(self, filename: str | None, fmt: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.filename = filename
+        self.format = fmt
+        self.status = "running"       # running | done | invalid (données) | failed (Fuseki)
+        self.triples = 0
+        self.records = 0
+        self.batches = 0
+        self.error: str | None = None
+        self.started = time.time()
+        self.finished: float | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        elapsed = (self.finished or time.time()) - self.started
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "format": self.format,
+            "status": self.status,
+            "triples": self.triples,
+            "records": self.records,
+            "batches": self.batches,
+            "elapsed_s": round(elapsed, 3),
+            "triples_per_s": round(self.triples / elapsed, 1) if elapsed > 0 else None,
+            "error": self.error,
+        }
+
+
+class BulkImporter:
+    """
+    `builders` associe un nom de modèle (ex. "Utilisateur") à (classe Pydantic, fonction
+    modèle -> triples) pour l'import JSON Lines ; `namespace` est celui des identifiants
+    de l'application, `authority` la base des IRI skolémisées.
+    """
+
+    def __init__(self, store, client, builders: dict[str, tuple[type[BaseModel], Callable]],
+                 namespace, authority: str, batch_size: int = 10000,
+                 max_document_bytes: int = 64 * 1024 * 1024):
+        self.store = store
+        self.client = client          # FusekiClient synchrone (exécuté hors boucle d'événements)
+        self.builders = builders
+        self.namespace = namespace
+        self.authority = authority
+        self.batch_size = batch_size
+        self.max_document_bytes = max_document_bytes
+        self.jobs: dict[str, ImportJob] = {}
+        self._lock = threading.Lock()
+
+    def check_size(self, fmt: str, size: int):
+        """ValueError si un document Turtle / RDF-XML (lu en entier) dépasse la limite."""
+        if fmt in DOCUMENT_FORMATS and size > self.max_document_bytes:
+            raise ValueError(
+                f"Fichier {fmt} de {size} octets : au-delà de {self.max_document_bytes} octets, "
+                f"importer en N-Triples, N-Quads ou JSON Lines (lecture par morceaux)."
+            )
+
+    def new_job(self, filename: str | None, fmt: str) -> ImportJob:
+        job = ImportJob(filename, fmt)
+        with self._lock:
+            self.jobs[job.id] = job
+        return job
+
+    # ------------------------------------------------------------------
+    # Exécution
+    # ------------------------------------------------------------------
+
+    def run(self, job: ImportJob, fileobj: BinaryIO, batch_size: int | None = None) -> ImportJob:
+        """Importe le flux (bloquant : à lancer dans un thread)."""
+        size = batch_size or self.batch_size
+        sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-import")
+        pending = None
+        bnodes: dict[str, BNode] = {}   # libellé -> nœud anonyme, pour tout le fichier
+
+        def commit(triples: list, quads: list | None = None):
+            nonlocal pending
+            triples = [tuple(skolem(t, self.authority) for t in triple) for triple in triples]
+            quads = [tuple(skolem(t, self.authority) for t in quad) for quad in quads or []]
+            payload = "".join(triple_to_nquad(t) + "\n" for t in triples).encode("utf-8")
+            named = "".join(self._quad_line(q) for q in quads).encode("utf-8")
+            if pending is not None:
+                pending.result()   # un seul lot en vol vers Fuseki
+            pending = sender.submit(self._commit, job, triples, payload, named, len(quads))
+
+        try:
+            if job.format == "jsonl":
+                for lines in iter_line_batches(fileobj, size):
+                    commit(self._jsonl_triples(job, lines))
+            elif job.format == "nt":
+                for lines in iter_line_batches(fileobj, size):
+                    tmp = Graph()
+                    tmp.parse(data="\n".join(lines), format="nt", bnode_context=bnodes)
+                    commit(list(tmp))
+            elif job.format == "nquads":
+                for lines in iter_line_batches(fileobj, size):
+                    tmp = ConjunctiveGraph()
+                    tmp.parse(data="\n".join(lines), format="nquads", bnode_context=bnodes)
+                    default, named = [], []
+                    for s, p, o, ctx in tmp.quads((None, None, None)):
+                        if ctx.identifier == tmp.default_context.identifier:
+                            default.append((s, p, o))
+                        else:
+                            named.append((s, p, o, ctx.identifier))
+                    commit(default, named)
+            else:
+                sink = BatchSink(commit, size)
+                Graph(store=sink).parse(source=fileobj, format=job.format)
+                sink.flush()
+
+            if pending is not None:
+                pending.result()
+            job.status = "done"
+        except FusekiWriteError as e:
+            job.status = "failed"
+            job.error = str(e)
+        except Exception as e:
+            job.status = "invalid"
+            job.error = str(e)
+        finally:
+            sender.shutdown(wait=True)
+            job.finished = time.time()
+
+        report = job.to_dict()
+        print(f"📦 Import {job.id} {job.status} : {report['triples']} triples en "
+              f"{report['elapsed_s']}s ({report['triples_per_s']} triples/s).")
+        return job
+
+    def _commit(self, job: ImportJob, triples: list, payload: bytes, named: bytes, quads: int):
+        """Fuseki d'abord, graphe local ensuite : un lot refusé n'est écrit nulle part."""
+        try:
+            self._send(payload, named)
+        except Exception as e:
+            raise FusekiWriteError(f"Lot {job.batches + 1} refusé par Fuseki : {e}") from e
+        if triples:
+            self.store.add(triples)
+        job.triples += len(triples) + quads
+        job.batches += 1
+
+    def _send(self, payload: bytes, named: bytes):
+        if payload:
+            self.client.post_data(payload, content_type="application/n-triples")
+        if named:
+            self.client.post_data(named, content_type="application/n-quads", graph=None)
+
+    def _jsonl_triples(self, job: ImportJob, lines: list[str]) -> list:
+        triples = []
+        for n, line in enumerate(lines, start=job.records + 1):
+            try:
+                record = json.loads(line)
+                model_name = record.pop("model")
+                model, builder = self.builders[model_name]
+                for triple in builder(model(**record)):
+                    triples.append(tuple(check_term(t, self.namespace) for t in triple))
+            except KeyError as e:
+                raise ValueError(f"Ligne {n} : modèle inconnu ou absent ({e})")
+            except (ValueError, ValidationError) as e:
+                raise ValueError(f"Ligne {n} : {e}")
+        job.records += len(lines)
+        return triples
+
+    @staticmethod
+    def _quad_line(quad) -> str:
+        s, p, o, graph = quad
+        return f"{s.n3()} {p.n3()} {o.n3()} {graph.n3()} .\n"
+
+
+def skolem(term, authority: str):
+    """Nœud anonyme -> IRI stable sous `authority` (même libellé, même IRI) ; les autres termes sont inchangés."""
+    return term.skolemize(authority=authority) if isinstance(term, BNode) else term
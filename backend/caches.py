@@ -0,0 +1,280 @@
+# caches.py
+"""
+Caches en mémoire utilisés par l'API.
+
+- `LRUCache` : taille bornée, éviction du moins récemment utilisé, persistance
+  optionnelle sur disque (JSON, écriture atomique) pour survivre aux redémarrages.
+- `TTLCache` : entrées expirant après `ttl` secondes, vidé explicitement lors des
+  écritures sur le graphe.
+- `TaggedCache` : réponses des endpoints de lecture, invalidées par classe /
+  propriété RDF modifiée, bornées en nombre d'entrées et en mémoire.
+
+Tous exposent leurs compteurs (hits / misses / évictions) via `stats()`.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Any
+
+
+def normalize_question(question: str) -> str:
+    """Clé de cache d'une question : minuscules, sans accents, ponctuation et espaces normalisés."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[’'`]", " ", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class LRUCache:
+
+    def __init__(self, max_entries: int = 500, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self.load()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            snapshot = list(self._data.items()) if self.path else None
+        if snapshot is not None:
+            self._save(snapshot)
+
+    def discard(self, key: str):
+        with self._lock:
+            removed = self._data.pop(key, None) is not None
+            snapshot = list(self._data.items()) if self.path and removed else None
+        if snapshot is not None:
+            self._save(snapshot)
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Cache illisible ({self.path}) : {e}")
+            return
+        with self._lock:
+            for key, value in items[-self.max_entries:]:
+                self._data[key] = value
+
+    def _save(self, items: list):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"   # un fichier par worker
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Sauvegarde du cache impossible ({self.path}) : {e}")
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
+
+
+class TTLCache:
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            if self._data:
+                self._data.clear()
+                self.invalidations += 1
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
+
+
+class TaggedCache:
+    """
+    Cache de réponses HTTP invalidé par étiquettes : chaque entrée porte les classes /
+    propriétés RDF lues par sa requête, une écriture n'invalide que les entrées concernées.
+
+    Une écriture locale précède son envoi à Fuseki : ses étiquettes restent « sales »
+    (non cachables) jusqu'à `settle(tags)`, appelé avec les étiquettes de cette écriture
+    une fois sa mise à jour validée. Les étiquettes sont comptées : celles d'une autre
+    écriture encore en file restent sales. Une lecture commencée avant une invalidation
+    n'est pas mise en cache (`token()`).
+
+    L'étiquette ALL est invalidée par toute écriture (requêtes sur l'ensemble du graphe).
+    """
+
+    ALL = "*"
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, tuple[bytes, dict, frozenset]] = OrderedDict()
+        self._by_tag: dict[str, set[str]] = {}
+        self._tag_seq: dict[str, int] = {}
+        self._cleared_seq = 0             # dernier clear() : vaut pour toutes les étiquettes
+        self._dirty: Counter = Counter()   # étiquette -> écritures non encore validées
+        self._seq = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0,
+                         "invalidations": 0, "skipped": 0}
+
+    def token(self) -> int:
+        return self._seq
+
+    def get(self, key: str) -> tuple[bytes, dict] | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[0], entry[1]
+
+    def put(self, key: str, body: bytes, headers: dict, tags: set[str], token: int):
+        tags = frozenset(tags)
+        with self._lock:
+            if self._cleared_seq > token or any(
+                self._dirty[t] > 0 or self._tag_seq.get(t, 0) > token for t in tags
+            ):
+                self.counters["skipped"] += 1
+                return
+            if len(body) > self.max_bytes:
+                return
+            self._drop(key)
+            self._data[key] = (body, headers, tags)
+            self._bytes += len(body)
+            for t in tags:
+                self._by_tag.setdefault(t, set()).add(key)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.counters["evictions"] += 1
+
+    def invalidate(self, tags: set[str], dirty: bool = True):
+        """Supprime les entrées portant l'une des étiquettes (et l'étiquette ALL)."""
+        tags = set(tags) | {self.ALL}
+        with self._lock:
+            self._seq += 1
+            for t in tags:
+                self._tag_seq[t] = self._seq
+                for key in list(self._by_tag.get(t, ())):
+                    self._drop(key)
+            if dirty:
+                self._dirty.update(tags)
+            self.counters["invalidations"] += 1
+
+    def settle(self, tags: set[str] | None):
+        """
+        L'écriture qui avait invalidé `tags` est validée côté Fuseki : invalidation finale
+        (None : écriture du schéma, vidage complet).
+        """
+        if tags is None:
+            self.clear()
+            return
+        tags = set(tags) | {self.ALL}
+        with self._lock:
+            for t in tags:
+                self._dirty[t] -= 1
+                if self._dirty[t] <= 0:
+                    del self._dirty[t]
+        self.invalidate(tags, dirty=False)
+
+    def clear(self):
+        with self._lock:
+            self._seq += 1
+            self._cleared_seq = self._seq
+            self._data.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+            self.counters["invalidations"] += 1
+
+    def _drop(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[0])
+        for t in entry[2]:
+            keys = self._by_tag.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[t]
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "dirty_tags": sorted(self._dirty),
+            **self.counters,
+            "hit_ratio": round(self.counters["hits"] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,274 @@
+# changes.py
+"""
+Flux des modifications du graphe, diffusé en Server-Sent Events (`GET /changes`).
+
+Chaque écriture effective du graphe local (triples réellement ajoutés / retirés)
+devient un événement compact : les deltas de triples et, par entité touchée,
+un événement typé (`created` / `updated` / `deleted`) avec ses classes et les
+propriétés ajoutées. Les pages peuvent ainsi tenir leur état à jour sans
+recharger les collections entières après chaque POST.
+
+Les événements sont retenus (`record`) puis diffusés (`publish`) une fois les
+mises à jour validées par Fuseki : un client qui relit une liste après un
+événement voit déjà la donnée. `publish(before=...)` s'arrête à la première version
+encore en attente (voir commits.py) : les événements sortent dans l'ordre des versions,
+après chaque lot validé.
+
+Un delta trop gros (import en masse) est résumé : `truncated: true`, sans les
+triples ; le client recharge alors les collections concernées (`types`).
+
+Jeton de reprise : `<époque>-<version>` (champ `id` SSE), tous deux tirés du
+GraphStore partagé (voir persistence.py) : le même jeton vaut pour tous les workers
+et survit à un redémarrage. Un client reconnecté avec `Last-Event-ID` (ou `?since=`)
+reçoit les événements manqués encore présents dans le tampon circulaire ; sinon un
+événement `reset` lui demande de recharger. Un worker qui a suivi plusieurs écritures
+d'un autre en une fois les diffuse en un seul événement : un client venu d'un autre
+worker peut alors recevoir une seconde fois une partie de ce qu'il avait déjà.
+"""
+import asyncio
+import json
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Callable
+
+from rdflib import Literal, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+
+GENERIC_TYPES = {OWL.Thing, RDFS.Resource}
+
+
+class ChangeFeed:
+
+    def __init__(self, graph, ex_namespace: str, max_events: int = 1000, max_triples: int = 500,
+                 supers: Callable[[URIRef], set] | None = None):
+        self.graph = graph                # graphe local (lu sous le verrou du store)
+        self.ex = str(ex_namespace)
+        self.max_triples = max_triples
+        self.supers = supers              # super-classes d'une classe (graphe inféré), optionnel
+        self.epoch = uuid.uuid4().hex[:8]  # provisoire : époque du store après son chargement (resume)
+        self.prefixes = {self.ex: "ex:", str(RDF): "rdf:", str(RDFS): "rdfs:", str(OWL): "owl:", str(XSD): "xsd:"}
+        self._events: deque[dict] = deque(maxlen=max_events)
+        self._pending: list[dict] = []
+        self._version = 0                 # dernière version diffusée
+        self._floor = 0                   # version qui précède le plus ancien événement du tampon
+        self._lock = threading.Lock()
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.stats = {"events": 0, "clients": 0, "resumed": 0, "resets": 0}
+
+    # ------------------------------------------------------------------
+    # Côté écriture (abonné du GraphStore)
+    # ------------------------------------------------------------------
+
+    def resume(self, epoch: str, version: int):
+        """Après le chargement du store : jetons dans son époque, à partir de sa version."""
+        with self._lock:
+            self.epoch = epoch
+            self._version = self._floor = version
+            self._events.clear()
+
+    def record(self, added: list, removed: list, version: int):
+        """Abonné du store : construit l'événement (sous le verrou du graphe) et le met en attente."""
+        event: dict[str, Any] = {"version": version, "time": round(time.time(), 3)}
+        if len(added) + len(removed) > self.max_triples:
+            event.update({
+                "truncated": True,
+                "counts": {"added": len(added), "removed": len(removed)},
+                "types": sorted({self.local(o) for _, p, o in [*added, *removed] if p == RDF.type}),
+                "entities": [], "added": [], "removed": [],
+            })
+        else:
+            event.update({
+                "entities": self._entities(added, removed),
+                "added": [self._triple(t) for t in added],
+                "removed": [self._triple(t) for t in removed],
+            })
+        with self._lock:
+            self._pending.append(event)
+
+    def publish(self, before: float = math.inf):
+        """Diffuse les événements en attente de version inférieure à `before` (validées côté Fuseki)."""
+        with self._lock:
+            ready = 0
+            while ready < len(self._pending) and self._pending[ready]["version"] < before:
+                ready += 1
+            pending, self._pending = self._pending[:ready], self._pending[ready:]
+            if not pending:
+                return
+            for event in pending:
+                if len(self._events) == self._events.maxlen:
+                    self._floor = self._events.popleft()["version"]
+                self._events.append(event)
+            self._version = pending[-1]["version"]
+            self.stats["events"] += len(pending)
+            waiters = list(self._waiters)
+        for loop, ready in waiters:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass   # boucle fermée (arrêt du serveur)
+
+    def _entities(self, added: list, removed: list) -> list[dict]:
+        by_subject: dict[URIRef, dict] = {}
+        for op, triples in (("added", added), ("removed", removed)):
+            for s, p, o in triples:
+                if isinstance(s, URIRef) and str(s).startswith(self.ex):
+                    entry = by_subject.setdefault(s, {"added": [], "removed": []})
+                    entry[op].append((p, o))
+
+        entities = []
+        for s, entry in by_subject.items():
+            types = {o for p, o in entry["added"] + entry["removed"] if p == RDF.type}
+            types |= set(self.graph.objects(s, RDF.type))
+            if any(p == RDF.type for p, _ in entry["added"]) and not any(p == RDF.type for p, _ in entry["removed"]):
+                op = "created"
+            elif (s, None, None) not in self.graph:
+                op = "deleted"
+            else:
+                op = "updated"
+            if self.supers is not None:
+                types |= {c for t in list(types) for c in self.supers(t)}
+            fields: dict[str, Any] = {}
+            for p, o in entry["added"]:
+                if p != RDF.type:
+                    fields[self.local(p)] = self._value(o)
+            entities.append({
+                "id": self.local(s),
+                "op": op,
+                "types": sorted(self.local(t) for t in types - GENERIC_TYPES if isinstance(t, URIRef)),
+                "fields": fields,
+            })
+        return entities
+
+    def local(self, term) -> str:
+        value = str(term)
+        if value.startswith(self.ex):
+            return value[len(self.ex):]
+        return value.split("#")[-1]
+
+    def _compact(self, term) -> str:
+        value = str(term)
+        for ns, prefix in self.prefixes.items():
+            if value.startswith(ns):
+                return prefix + value[len(ns):]
+        return value
+
+    def _value(self, term) -> Any:
+        if isinstance(term, URIRef):
+            return self.local(term)
+        value = term.toPython() if isinstance(term, Literal) else term
+        return value if isinstance(value, (str, int, float, bool)) else str(term)
+
+    def _triple(self, triple: tuple) -> list:
+        s, p, o = triple
+        if isinstance(o, Literal):
+            obj: Any = {"value": str(o)}
+            if o.language:
+                obj["lang"] = o.language
+            elif o.datatype:
+                obj["datatype"] = self._compact(o.datatype)
+        else:
+            obj = self._compact(o)
+        return [self._compact(s), self._compact(p), obj]
+
+    # ------------------------------------------------------------------
+    # Côté lecture (clients SSE)
+    # ------------------------------------------------------------------
+
+    def token(self, version: int | None = None) -> str:
+        return f"{self.epoch}-{self._version if version is None else version}"
+
+    def since(self, token: str | None) -> tuple[list[dict] | None, int]:
+        """
+        Événements postérieurs au jeton : (événements, version atteinte).
+        None si le jeton ne permet pas de reprendre (autre démarrage, tampon dépassé, jeton invalide).
+        """
+        with self._lock:
+            current = self._version
+            if token is None:
+                return [], current
+            epoch, _, version = token.partition("-")
+            if epoch != self.epoch or not version.isdigit():
+                return None, current
+            version = int(version)
+            if version >= current:
+                return [], current
+            # Les versions ne se suivent pas (positions dans le journal) : le tampon doit couvrir le jeton
+            if version < self._floor:
+                return None, current
+            return [e for e in self._events if e["version"] > version], current
+
+    async def stream(self, token: str | None, types: set[str] | None = None,
+                     keepalive: float = 15.0) -> AsyncIterator[str]:
+        """Générateur SSE : rattrapage depuis le jeton, puis événements en direct."""
+        ready = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ready)
+        with self._lock:
+            self._waiters.add(waiter)
+            self.stats["clients"] += 1
+        try:
+            yield "retry: 3000\n\n"
+            events, version = self.since(token)
+            if events is None:
+                self.stats["resets"] += 1
+                yield self._format("reset", {"reason": "Jeton de reprise expiré : recharger les collections."}, version)
+                events = []
+            elif token is not None:
+                self.stats["resumed"] += 1
+            # L'id de `ready` est le point de reprise : les événements rattrapés ne sont pas encore envoyés
+            start = int(token.partition("-")[2]) if events else version
+            yield self._format("ready", {"version": start}, start)
+
+            while True:
+                for event in events:
+                    payload = self._filter(event, types)
+                    if payload is not None:
+                        yield self._format("change", payload, event["version"])
+                    version = event["version"]
+                ready.clear()
+                events, _ = self.since(self.token(version))
+                if events is None:
+                    # Client trop lent : le tampon a tourné pendant qu'il lisait
+                    self.stats["resets"] += 1
+                    events, version = [], self._version
+                    yield self._format("reset", {"reason": "Trop d'événements en retard : recharger les collections."}, version)
+                    continue
+                if not events:
+                    try:
+                        await asyncio.wait_for(ready.wait(), keepalive)
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+                self.stats["clients"] -= 1
+
+    @staticmethod
+    def _filter(event: dict, types: set[str] | None) -> dict | None:
+        """Avec `types`, ne garde que les entités de ces classes (et leurs triples)."""
+        if not types or event.get("truncated"):
+            return event
+        entities = [e for e in event["entities"] if types & set(e["types"])]
+        if not entities:
+            return None
+        subjects = {"ex:" + e["id"] for e in entities}
+        return {
+            **event,
+            "entities": entities,
+            "added": [t for t in event["added"] if t[0] in subjects],
+            "removed": [t for t in event["removed"] if t[0] in subjects],
+        }
+
+    def _format(self, name: str, data: dict, version: int) -> str:
+        return f"id: {self.token(version)}\nevent: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            **self.stats,
+            "token": self.token(),
+            "buffered": len(self._events),
+            "max_events": self._events.maxlen,
+            "pending": len(self._pending),
+        }
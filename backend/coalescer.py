@@ -0,0 +1,161 @@
+# coalescer.py
+"""
+Regroupement des SPARQL UPDATE envoyés à Fuseki.
+
+Les requêtes d'écriture arrivant en même temps sont mises en tampon pendant
+quelques millisecondes (ou jusqu'à N opérations), puis envoyées en une seule
+requête SPARQL Update multi-opérations (`op1 ; op2 ; ...`). Fuseki exécute
+les opérations dans l'ordre, au sein d'une même transaction.
+
+Chaque appelant n'est débloqué qu'une fois le lot validé par Fuseki. Une requête peut
+porter un contexte (par exemple les versions du graphe local écrites avant elle) :
+après chaque lot, `on_commit(validés, échoués)` reçoit les contextes de ses requêtes,
+y compris pendant une rafale d'écritures où la file ne se vide jamais.
+"""
+import asyncio
+import concurrent.futures
+import time
+from typing import Any, Callable
+
+
+class UpdateCoalescer:
+
+    def __init__(self, client, max_delay: float = 0.005, max_batch: int = 100):
+        self.client = client          # AsyncFusekiClient
+        self.max_delay = max_delay    # secondes
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.on_commit: Callable[[list, list], None] | None = None   # après chaque lot : contextes validés / échoués
+        self.stats = {"operations": 0, "batches": 0, "failed_batches": 0, "replayed_batches": 0,
+                      "last_batch_ms": 0.0}
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    async def submit(self, update_query: str, context: Any = None):
+        """Met la requête en file et attend que son lot soit validé (ou lève l'erreur Fuseki)."""
+        future = self.enqueue(update_query, context)
+        await future
+
+    def enqueue(self, update_query: str, context: Any = None) -> asyncio.Future:
+        """Met la requête en file sans attendre ; renvoie le future du lot."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((update_query, future, context))
+        return future
+
+    def enqueue_threadsafe(self, update_query: str) -> asyncio.Future | concurrent.futures.Future:
+        """
+        Variante utilisable hors de la boucle d'événements (threads d'import, compaction...) :
+        la requête est confiée à la boucle du worker.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            return self.enqueue(update_query)
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("Coalesceur non démarré.")
+        return asyncio.run_coroutine_threadsafe(self.submit(update_query), self._loop)
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._loop = asyncio.get_running_loop()
+            self._worker = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Vide la file (flush) puis arrête le worker."""
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                committed, failed = await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if self.on_commit is not None:
+                try:
+                    self.on_commit(
+                        [item[2] for item in committed if item[2] is not None],
+                        [item[2] for item in failed if item[2] is not None],
+                    )
+                except Exception as e:
+                    print(f"⚠️ Erreur on_commit du coalesceur : {e}")
+
+    async def _commit(self, batch: list[tuple[str, asyncio.Future, Any]]) -> tuple[list, list]:
+        """Envoie le lot ; renvoie (requêtes validées, requêtes en échec)."""
+        started = time.perf_counter()
+        try:
+            await self.client.update(" ;\n".join(item[0].strip() for item in batch))
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            if len(batch) == 1 or not self._rejected(e):
+                # Délai dépassé, erreur réseau ou 5xx : le lot a pu être appliqué, un rejeu
+                # dupliquerait les requêtes non idempotentes (NOW(), journal des transactions)
+                self._resolve(batch, e)
+                return [], batch
+            # Lot refusé (4xx : syntaxe, validation), donc non appliqué, atomique côté Fuseki :
+            # on rejoue une par une, dans l'ordre, pour ne faire échouer que les requêtes fautives.
+            self.stats["replayed_batches"] += 1
+            committed, failed = [], []
+            for item in batch:
+                try:
+                    await self.client.update(item[0])
+                    self._resolve([item])
+                    committed.append(item)
+                except Exception as err:
+                    self._resolve([item], err)
+                    failed.append(item)
+            return committed, failed
+
+        self._resolve(batch)
+        self.stats["operations"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return batch, []
+
+    @staticmethod
+    def _rejected(error: Exception) -> bool:
+        """Refus explicite de Fuseki (4xx) : la transaction n'a pas été appliquée."""
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        return status is not None and 400 <= status < 500
+
+    @staticmethod
+    def _resolve(batch, error: Exception | None = None):
+        for _, future, _ in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,73 @@
+# commits.py
+"""
+Écritures locales en attente de validation par Fuseki.
+
+Une écriture d'endpoint modifie d'abord le graphe local (journal, abonnés), puis
+part vers Fuseki par le coalesceur. Entre les deux, ses effets ne doivent pas être
+annoncés comme définitifs : événements du flux /changes, fin de l'invalidation du
+cache, entrée du journal des transactions.
+
+`local_write(fn, ...)` exécute l'écriture locale (dans un thread) en notant les
+versions du store qu'elle produit : `on_change`, premier abonné du store, les
+enregistre au moment même de la notification, sous le verrou du graphe. Chaque
+version suivie porte un dictionnaire où les autres abonnés déposent ce qu'il faudra
+faire à la validation (`get(version)`). Les versions sont rendues à `complete`
+par le crochet `on_commit` du coalesceur, lot par lot.
+
+Les écritures non suivies (autre worker, synchro depuis Fuseki, import en masse
+validé lot par lot) sont déjà dans Fuseki : `get` renvoie None pour elles.
+`floor()` est la plus petite version encore en attente : tout ce qui la précède
+peut être diffusé dans l'ordre.
+"""
+import math
+import threading
+from typing import Any, Callable
+
+
+class PendingWrites:
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending: dict[int, dict[str, Any]] = {}   # version -> données déposées par les abonnés
+        self.stats = {"tracked": 0, "committed": 0, "failed": 0}
+
+    def local_write(self, fn: Callable, *args, **kwargs) -> tuple[Any, list[int]]:
+        """Exécute une écriture du store : (résultat, versions produites, à joindre à la requête Fuseki)."""
+        versions: list[int] = []
+        self._local.versions = versions
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            self._local.versions = None
+        return result, versions
+
+    def on_change(self, added: list, removed: list, version: int):
+        """Abonné du store (à inscrire en premier) : suit les versions écrites par local_write."""
+        versions = getattr(self._local, "versions", None)
+        if versions is None:
+            return
+        with self._lock:
+            self._pending[version] = {}
+            self.stats["tracked"] += 1
+        versions.append(version)
+
+    def get(self, version: int) -> dict[str, Any] | None:
+        """Données de la version si elle attend encore Fuseki, sinon None (déjà validée)."""
+        with self._lock:
+            return self._pending.get(version)
+
+    def complete(self, versions: list[int], ok: bool = True) -> list[dict[str, Any]]:
+        """Versions dont la requête Fuseki a abouti (ou échoué) : leurs données, retirées du suivi."""
+        with self._lock:
+            done = [self._pending.pop(v) for v in versions if v in self._pending]
+        self.stats["committed" if ok else "failed"] += len(done)
+        return done
+
+    def floor(self) -> float:
+        """Plus petite version en attente (inf s'il n'y en a aucune)."""
+        with self._lock:
+            return min(self._pending, default=math.inf)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending)}
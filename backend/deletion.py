@@ -0,0 +1,105 @@
+# deletion.py
+"""
+Suppression d'entités avec leurs références entrantes et les cascades configurées.
+
+Supprimer `ex:id` retire :
+- ses triples sortants `(ex:id, ?p, ?o)` ;
+- ses références entrantes `(?s, ?p, ex:id)` (avis donnéPar, observations, tickets...),
+  qui resteraient sinon orphelines et alourdiraient toutes les jointures ;
+- les entités rattachées par une règle de cascade (`rules`, propriété -> sens) :
+    "in"  : les sujets `?s` de `(?s, p, ex:id)` sont supprimés aussi
+            (donnéPar : supprimer un utilisateur supprime ses avis) ;
+    "out" : les objets `?o` de `(ex:id, p, ?o)` sont supprimés aussi
+            (avoirTicket : supprimer un voyageur supprime ses tickets).
+
+Le plan est calculé sur le graphe local à l'aide de ses index (sujet -> triples,
+objet -> triples du store mémoire rdflib) : le coût dépend du degré des entités
+supprimées, pas de la taille du graphe. Il est appliqué localement en une seule
+écriture du store (`apply`), puis dans Fuseki en une seule requête UPDATE (une
+transaction) qui retire triples sortants et entrants par blocs `VALUES`.
+"""
+from typing import Any, Iterable
+
+from rdflib import Graph, URIRef
+
+
+def parse_rules(spec: str, namespace) -> dict[URIRef, str]:
+    """Règles de cascade au format « donnéPar:in,avoirTicket:out » (propriétés du namespace)."""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, direction = item.partition(":")
+        if direction not in ("in", "out"):
+            raise ValueError(f"Règle de cascade invalide : {item!r} (sens attendu : in ou out)")
+        rules[namespace[name.strip()]] = direction
+    return rules
+
+
+class CascadeDeleter:
+
+    def __init__(self, store, rules: dict[URIRef, str], batch_size: int = 500):
+        self.store = store              # GraphStore (graphe local)
+        self.rules = dict(rules)        # propriété -> "in" | "out"
+        self.batch_size = batch_size    # entités par bloc VALUES dans la requête Fuseki
+        self.stats: dict[str, Any] = {"deletes": 0, "entities": 0, "cascaded": 0, "triples": 0, "inbound": 0}
+
+    def plan(self, graph: Graph, roots: Iterable[URIRef], cascade: bool = True) -> tuple[list[URIRef], set]:
+        """Entités à supprimer (racines puis cascades) et triples à retirer du graphe local."""
+        entities: list[URIRef] = []
+        seen: set = set()
+        triples: set = set()
+        queue = [r for r in roots if isinstance(r, URIRef)]
+        while queue:
+            e = queue.pop()
+            if e in seen:
+                continue
+            seen.add(e)
+            entities.append(e)
+            # Valeurs retirées du graphe servi (colonnes de statistiques) : retirées du journal aussi
+            triples |= self.store.detached(e)
+            for t in graph.triples((e, None, None)):
+                triples.add(t)
+                if cascade and self.rules.get(t[1]) == "out" and isinstance(t[2], URIRef):
+                    queue.append(t[2])
+            for t in graph.triples((None, None, e)):
+                triples.add(t)
+                if cascade and self.rules.get(t[1]) == "in" and isinstance(t[0], URIRef):
+                    queue.append(t[0])
+        return entities, triples
+
+    def delete(self, roots: Iterable[URIRef], cascade: bool = True) -> dict[str, Any]:
+        """Supprime localement (une écriture du store) ; renvoie le rapport et la requête Fuseki à envoyer."""
+        roots = list(roots)
+
+        def run(graph: Graph):
+            entities, triples = self.plan(graph, roots, cascade)
+            self.store.apply([], list(triples))
+            return entities, triples
+
+        entities, triples = self.store.run_locked(run)
+        deleted = set(entities)
+        inbound = sum(1 for s, _, o in triples if o in deleted and s != o)
+        cascaded = len(entities) - len(set(roots) & deleted)
+        self.stats["deletes"] += 1
+        self.stats["entities"] += len(entities)
+        self.stats["cascaded"] += cascaded
+        self.stats["triples"] += len(triples)
+        self.stats["inbound"] += inbound
+        return {
+            "deleted": [str(e) for e in entities],
+            "cascaded": cascaded,
+            "triples": len(triples),
+            "inbound_references": inbound,
+            "update": self.update_query(entities),
+        }
+
+    def update_query(self, entities: list[URIRef]) -> str:
+        """Une requête UPDATE (une transaction Fuseki) : triples sortants puis entrants, par blocs VALUES."""
+        operations = []
+        for i in range(0, len(entities), self.batch_size):
+            values = " ".join(e.n3() for e in entities[i:i + self.batch_size])
+            operations.append(f"DELETE {{ ?e ?p ?o }} WHERE {{ VALUES ?e {{ {values} }} ?e ?p ?o }}")
+            operations.append(f"DELETE {{ ?s ?p ?e }} WHERE {{ VALUES ?e {{ {values} }} ?s ?p ?e }}")
+        return " ;\n".join(operations)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {**self.stats, "rules": {str(p).split("#")[-1]: d for p, d in self.rules.items()}}
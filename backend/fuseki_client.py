@@ -0,0 +1,358 @@
+# fuseki_client.py
+"""
+Client HTTP unique vers Fuseki, partagé par tous les endpoints.
+
+- un pool de connexions borné (keep-alive), synchrone (`requests`) et asynchrone (`httpx`)
+- timeouts par appel
+- retry avec backoff exponentiel sur 5xx / connexion réinitialisée pour les lectures ;
+  les écritures (update, POST /data) ne sont rejouées que si la connexion n'a pas pu
+  être établie : après un envoi, un retry pourrait les appliquer deux fois (nœuds
+  anonymes, NOW() du journal des transactions)
+- nombre de requêtes simultanées plafonné côté asynchrone (sémaphore)
+- configuration centralisée des endpoints query / update / data
+- téléchargement en flux d'un graphe vers un fichier (synchro au démarrage)
+"""
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterator
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ======================
+# 🔧 CONFIGURATION
+# ======================
+
+FUSEKI_BASE = os.getenv("FUSEKI_BASE", "http://localhost:3030")
+FUSEKI_DATASET = os.getenv("FUSEKI_DATASET", "smartcity")
+FUSEKI_QUERY_URL = f"{FUSEKI_BASE}/{FUSEKI_DATASET}/sparql"   # endpoint SPARQL (query)
+FUSEKI_UPDATE_URL = f"{FUSEKI_BASE}/{FUSEKI_DATASET}/update"  # endpoint SPARQL (update)
+FUSEKI_DATA_ENDPOINT = f"{FUSEKI_BASE}/{FUSEKI_DATASET}/data"  # endpoint data (GET/POST)
+
+FUSEKI_POOL_SIZE = int(os.getenv("FUSEKI_POOL_SIZE", 20))
+FUSEKI_CONNECT_TIMEOUT = float(os.getenv("FUSEKI_CONNECT_TIMEOUT", 3))
+FUSEKI_READ_TIMEOUT = float(os.getenv("FUSEKI_READ_TIMEOUT", 30))
+FUSEKI_RETRIES = int(os.getenv("FUSEKI_RETRIES", 3))
+FUSEKI_BACKOFF = float(os.getenv("FUSEKI_BACKOFF", 0.2))
+FUSEKI_MAX_CONCURRENCY = int(os.getenv("FUSEKI_MAX_CONCURRENCY", 32))
+
+SPARQL_JSON = "application/sparql-results+json"
+SPARQL_TSV = "text/tab-separated-values"
+
+XSD_NS = "http://www.w3.org/2001/XMLSchema#"
+_TSV_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)')
+_TSV_CHARS = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f"}
+
+
+def _unescape(match: re.Match) -> str:
+    esc = match.group(1)
+    if esc[0] in "uU" and len(esc) > 1:
+        return chr(int(esc[1:], 16))
+    return _TSV_CHARS.get(esc, esc)
+
+
+def parse_tsv_term(text: str) -> dict | None:
+    """
+    Convertit un terme RDF du format de résultats SPARQL TSV en binding au format
+    SPARQL JSON ({"type": ..., "value": ...}) ; None si la variable n'est pas liée.
+    """
+    if not text:
+        return None
+    if text[0] == "<":
+        return {"type": "uri", "value": text[1:-1]}
+    if text.startswith("_:"):
+        return {"type": "bnode", "value": text[2:]}
+    if text[0] == '"':
+        end = text.rindex('"')
+        term = {"type": "literal", "value": _TSV_ESCAPE.sub(_unescape, text[1:end])}
+        suffix = text[end + 1:]
+        if suffix.startswith("@"):
+            term["xml:lang"] = suffix[1:]
+        elif suffix.startswith("^^"):
+            term["datatype"] = suffix[3:-1]
+        return term
+    # Formes abrégées : nombres et booléens
+    if text in ("true", "false"):
+        datatype = "boolean"
+    elif re.fullmatch(r"[+-]?\d+", text):
+        datatype = "integer"
+    elif "e" in text.lower():
+        datatype = "double"
+    else:
+        datatype = "decimal"
+    return {"type": "literal", "value": text, "datatype": XSD_NS + datatype}
+
+
+class FusekiClient:
+    """Client Fuseki synchrone avec pool de connexions et retry."""
+
+    def __init__(
+        self,
+        query_url: str = FUSEKI_QUERY_URL,
+        update_url: str = FUSEKI_UPDATE_URL,
+        data_url: str = FUSEKI_DATA_ENDPOINT,
+        pool_size: int = FUSEKI_POOL_SIZE,
+        timeout: tuple[float, float] = (FUSEKI_CONNECT_TIMEOUT, FUSEKI_READ_TIMEOUT),
+        retries: int = FUSEKI_RETRIES,
+        backoff: float = FUSEKI_BACKOFF,
+    ):
+        self.query_url = query_url
+        self.update_url = update_url
+        self.data_url = data_url
+        self.timeout = timeout
+
+        def adapter(methods: set[str]) -> HTTPAdapter:
+            retry = Retry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=retries,
+                backoff_factor=backoff,
+                status_forcelist=(500, 502, 503, 504),
+                # Hors de ces méthodes, seul l'échec de connexion (requête non envoyée) est rejoué
+                allowed_methods=frozenset(methods),
+                raise_on_status=False,
+            )
+            return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+
+        self.session = requests.Session()
+        writes = adapter({"GET", "PUT", "DELETE"})   # POST update / data : non idempotent
+        self.session.mount("http://", writes)
+        self.session.mount("https://", writes)
+        self.session.mount(query_url, adapter({"GET", "POST"}))   # SELECT / ASK en POST : lecture
+
+    # ------------------------------------------------------------------
+    # SPARQL
+    # ------------------------------------------------------------------
+
+    def select(self, query: str, timeout: float | None = None) -> dict:
+        """Exécute un SELECT/ASK et renvoie le résultat JSON SPARQL."""
+        r = self.session.post(
+            self.query_url,
+            data={"query": query},
+            headers={"Accept": SPARQL_JSON},
+            timeout=self._timeout(timeout),
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def ask(self, query: str, timeout: float | None = None) -> bool:
+        return bool(self.select(query, timeout).get("boolean"))
+
+    def update(self, update_query: str, timeout: float | None = None):
+        r = self.session.post(
+            self.update_url,
+            data={"update": update_query},
+            timeout=self._timeout(timeout),
+        )
+        r.raise_for_status()
+        return r
+
+    # ------------------------------------------------------------------
+    # Graph Store Protocol (/data)
+    # ------------------------------------------------------------------
+
+    def get_data(self, graph: str = "default", accept: str = "application/rdf+xml",
+                 stream: bool = False, timeout: float | None = None) -> requests.Response:
+        r = self.session.get(
+            self.data_url,
+            params={"graph": graph},
+            headers={"Accept": accept},
+            stream=stream,
+            timeout=self._timeout(timeout),
+        )
+        r.raise_for_status()
+        return r
+
+    def download_data(self, path: str, graph: str = "default", accept: str = "application/n-triples",
+                      deadline: float = 60.0, chunk_size: int = 1 << 20) -> int:
+        """
+        Télécharge un graphe en flux dans `path` (fichier `.part` puis renommage), sans
+        le charger en mémoire ; abandonne au-delà de `deadline` secondes au total.
+        Renvoie le nombre d'octets écrits.
+        """
+        started = time.monotonic()
+        tmp_path = path + ".part"
+        size = 0
+        try:
+            with self.get_data(graph, accept=accept, stream=True) as r, open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size):
+                    if time.monotonic() - started > deadline:
+                        raise TimeoutError(f"téléchargement interrompu après {deadline}s ({size} octets)")
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size
+
+    def post_data(self, data: bytes, content_type: str = "text/turtle",
+                  graph: str | None = "default", timeout: float | None = None) -> requests.Response:
+        """POST vers /data ; `graph=None` pour envoyer des quads au niveau du dataset."""
+        r = self.session.post(
+            self.data_url,
+            params={"graph": graph} if graph else None,
+            data=data,
+            headers={"Content-Type": content_type},
+            timeout=self._timeout(timeout),
+        )
+        r.raise_for_status()
+        return r
+
+    def put_data(self, data: bytes, content_type: str = "text/turtle",
+                  graph: str = "default", timeout: float | None = None) -> requests.Response:
+        """PUT vers /data : remplace entièrement le contenu du graphe."""
+        r = self.session.put(
+            self.data_url,
+            params={"graph": graph},
+            data=data,
+            headers={"Content-Type": content_type},
+            timeout=self._timeout(timeout),
+        )
+        r.raise_for_status()
+        return r
+
+    def _timeout(self, timeout: float | None):
+        return self.timeout if timeout is None else (self.timeout[0], timeout)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncFusekiClient:
+    """
+    Client Fuseki asynchrone (httpx) utilisé par les handlers `async def`.
+    Le sémaphore borne le nombre de requêtes en vol : une requête SPARQL lente
+    ne peut pas monopoliser toutes les connexions.
+    """
+
+    RETRY_STATUS = (500, 502, 503, 504)
+
+    def __init__(
+        self,
+        query_url: str = FUSEKI_QUERY_URL,
+        update_url: str = FUSEKI_UPDATE_URL,
+        data_url: str = FUSEKI_DATA_ENDPOINT,
+        pool_size: int = FUSEKI_POOL_SIZE,
+        max_concurrency: int = FUSEKI_MAX_CONCURRENCY,
+        connect_timeout: float = FUSEKI_CONNECT_TIMEOUT,
+        read_timeout: float = FUSEKI_READ_TIMEOUT,
+        retries: int = FUSEKI_RETRIES,
+        backoff: float = FUSEKI_BACKOFF,
+    ):
+        self.query_url = query_url
+        self.update_url = update_url
+        self.data_url = data_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def _request(self, method: str, url: str, timeout: float | None = None,
+                       idempotent: bool = True, **kwargs) -> httpx.Response:
+        """
+        Requête avec retry + backoff exponentiel sur erreurs transitoires.
+        Non idempotente (écriture) : retry uniquement si la connexion n'a pas abouti.
+        """
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.connect_timeout)
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    r = await self.client.request(method, url, **kwargs)
+                if r.status_code not in self.RETRY_STATUS or attempt >= self.retries or not idempotent:
+                    r.raise_for_status()
+                    return r
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt >= self.retries:
+                    raise
+            except httpx.TransportError:
+                if attempt >= self.retries or not idempotent:
+                    raise
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    # ------------------------------------------------------------------
+    # SPARQL
+    # ------------------------------------------------------------------
+
+    async def select(self, query: str, timeout: float | None = None) -> dict:
+        """Exécute un SELECT/ASK et renvoie le résultat JSON SPARQL."""
+        r = await self._request(
+            "POST", self.query_url, timeout,
+            data={"query": query},
+            headers={"Accept": SPARQL_JSON},
+        )
+        return r.json()
+
+    async def ask(self, query: str, timeout: float | None = None) -> bool:
+        return bool((await self.select(query, timeout)).get("boolean"))
+
+    async def select_stream(self, query: str, timeout: float | None = None) -> AsyncIterator[dict]:
+        """
+        Exécute un SELECT et produit les bindings un par un, en lisant la réponse
+        TSV de Fuseki au fil de l'eau (mémoire constante quel que soit le nombre de lignes).
+        """
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.connect_timeout)
+        async with self.semaphore:
+            async with self.client.stream(
+                "POST", self.query_url,
+                data={"query": query},
+                headers={"Accept": SPARQL_TSV},
+                **kwargs,
+            ) as r:
+                r.raise_for_status()
+                variables = None
+                async for line in r.aiter_lines():
+                    if not line:
+                        continue
+                    fields = line.rstrip("\r").split("\t")
+                    if variables is None:
+                        variables = [v.lstrip("?$") for v in fields]
+                        continue
+                    binding = {}
+                    for var, text in zip(variables, fields):
+                        term = parse_tsv_term(text)
+                        if term is not None:
+                            binding[var] = term
+                    yield binding
+
+    async def update(self, update_query: str, timeout: float | None = None) -> httpx.Response:
+        return await self._request("POST", self.update_url, timeout, idempotent=False,
+                                   data={"update": update_query})
+
+    # ------------------------------------------------------------------
+    # Graph Store Protocol (/data)
+    # ------------------------------------------------------------------
+
+    async def post_data(self, data: bytes, content_type: str = "text/turtle",
+                        graph: str | None = "default", timeout: float | None = None) -> httpx.Response:
+        """POST vers /data ; `graph=None` pour envoyer des quads au niveau du dataset."""
+        return await self._request(
+            "POST", self.data_url, timeout, idempotent=False,
+            params={"graph": graph} if graph else None,
+            content=data,
+            headers={"Content-Type": content_type},
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# Clients partagés par toute l'application :
+# `fuseki` pour les handlers async, `fuseki_sync` pour les tâches hors boucle d'événements
+fuseki = AsyncFusekiClient()
+fuseki_sync = FusekiClient()
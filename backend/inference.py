@@ -0,0 +1,315 @@
+# inference.py
+"""
+Inférences OWL-RL matérialisées dans un graphe nommé Fuseki.
+
+1. Recalcul complet (démarrage, admin, changement d'ontologie) : la fermeture
+   OWL-RL (owlrl.DeductiveClosure) est calculée sur une copie du graphe local ;
+   les triples déduits, absents du graphe d'origine, remplacent le contenu du
+   graphe nommé `INFERRED_GRAPH_URI` (Graph Store Protocol, PUT).
+
+2. Mise à jour incrémentale à chaque écriture : pour le sous-ensemble de règles
+   utilisé par l'application (sous-classes, domain/range, propriétés symétriques,
+   détection des propriétés asymétriques), seules les conséquences des triples
+   ajoutés / retirés sont recalculées. Chaque triple inféré porte un compteur de
+   dérivations (algorithme de comptage) : une suppression ne retire une inférence
+   que lorsque plus aucun triple explicite ne la justifie. Les règles sont
+   appliquées à partir de la hiérarchie déjà fermée (TBox), donc en une seule
+   passe, sans récursion.
+
+Le graphe inféré contient aussi la fermeture complète de la hiérarchie
+(rdfs:subClassOf transitif et réflexif, y compris les axiomes déclarés) : les
+endpoints remplacent ainsi `?type rdfs:subClassOf* ex:X` (chemin évalué à chaque
+requête par Fuseki) par une simple recherche de triple :
+
+    ?id a ?type .
+    GRAPH <inferred> { ?type rdfs:subClassOf ex:X }
+"""
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Iterable
+
+from owlrl import DeductiveClosure, OWLRL_Semantics
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import OWL, RDF, RDFS
+
+from persistence import triple_to_nquad
+
+# Conséquences triviales de OWL-RL, inutiles pour les requêtes de l'API
+TRIVIAL_TYPES = {OWL.Thing, RDFS.Resource}
+
+# Un triple qui modifie l'ontologie impose un recalcul complet
+SCHEMA_PREDICATES = {
+    RDFS.subClassOf, RDFS.subPropertyOf, RDFS.domain, RDFS.range,
+    OWL.equivalentClass, OWL.equivalentProperty, OWL.inverseOf,
+}
+SCHEMA_TYPES = {
+    OWL.Class, RDFS.Class, OWL.SymmetricProperty, OWL.AsymmetricProperty,
+    OWL.TransitiveProperty, OWL.ObjectProperty,
+}
+
+
+def subclass_closure(graph: Graph) -> set[tuple]:
+    """Fermeture transitive et réflexive de rdfs:subClassOf sur les classes de `graph`."""
+    parents: dict = {}
+    classes = set(graph.subjects(RDF.type, OWL.Class)) | set(graph.subjects(RDF.type, RDFS.Class))
+    for sub, sup in graph.subject_objects(RDFS.subClassOf):
+        parents.setdefault(sub, set()).add(sup)
+        classes.update((sub, sup))
+
+    closure = set()
+    for cls in classes:
+        if not isinstance(cls, URIRef):
+            continue
+        seen, todo = {cls}, [cls]
+        while todo:
+            for sup in parents.get(todo.pop(), ()):
+                if sup not in seen:
+                    seen.add(sup)
+                    todo.append(sup)
+        closure.update((cls, RDFS.subClassOf, sup) for sup in seen if isinstance(sup, URIRef))
+    return closure
+
+
+def is_useful(triple: tuple) -> bool:
+    s, p, o = triple
+    # Les nœuds anonymes (restrictions OWL...) n'ont pas d'identité stable côté Fuseki
+    if isinstance(s, (Literal, BNode)) or isinstance(o, BNode):
+        return False
+    if p == OWL.sameAs and s == o:
+        return False
+    if p == RDF.type and o in TRIVIAL_TYPES:
+        return False
+    return True
+
+
+def is_schema(triple: tuple) -> bool:
+    s, p, o = triple
+    return p in SCHEMA_PREDICATES or (p == RDF.type and o in SCHEMA_TYPES)
+
+
+class Rules:
+    """
+    Règles incrémentales, compilées à partir d'une ontologie déjà fermée :
+    sous-classes, domain/range, propriétés symétriques / asymétriques.
+    """
+
+    def __init__(self, closure: Graph):
+        self.supers: dict = {}
+        for sub, _, sup in subclass_closure(closure):
+            self.supers.setdefault(sub, set()).add(sup)
+        self.domains: dict = {}
+        for p, c in closure.subject_objects(RDFS.domain):
+            if isinstance(c, URIRef):
+                self.domains.setdefault(p, set()).add(c)
+        self.ranges: dict = {}
+        for p, c in closure.subject_objects(RDFS.range):
+            if isinstance(c, URIRef):
+                self.ranges.setdefault(p, set()).add(c)
+        self.symmetric = set(closure.subjects(RDF.type, OWL.SymmetricProperty))
+        self.asymmetric = set(closure.subjects(RDF.type, OWL.AsymmetricProperty))
+
+    def _types(self, node, cls) -> set[tuple]:
+        return {(node, RDF.type, c) for c in self.supers.get(cls, {cls}) if c not in TRIVIAL_TYPES}
+
+    def consequences(self, triple: tuple) -> set[tuple]:
+        """Conséquences d'un triple explicite (hors le triple lui-même)."""
+        s, p, o = triple
+        if isinstance(s, Literal) or isinstance(s, BNode):
+            return set()
+        out = set()
+        if p == RDF.type:
+            out |= self._types(s, o)
+            out.discard(triple)
+            return out
+
+        edges = [(s, o)]
+        if p in self.symmetric and isinstance(o, URIRef):
+            out.add((o, p, s))
+            edges.append((o, s))
+        for subj, obj in edges:
+            for cls in self.domains.get(p, ()):
+                out |= self._types(subj, cls)
+            if isinstance(obj, URIRef):
+                for cls in self.ranges.get(p, ()):
+                    out |= self._types(obj, cls)
+        out.discard(triple)
+        return out
+
+
+class InferenceEngine:
+    """Calcule, maintient et publie le graphe inféré."""
+
+    def __init__(self, store, client, graph_uri: str, publish: Callable[[str], Any] | None = None,
+                 leader: Callable[[], bool] | None = None):
+        self.store = store            # GraphStore (graphe local)
+        self.client = client          # FusekiClient synchrone (exécuté hors boucle d'événements)
+        self.graph_uri = graph_uri
+        self.publish = publish        # envoi d'un SPARQL UPDATE (non bloquant) vers Fuseki
+        self.leader = leader          # plusieurs workers : seul le propriétaire du store publie
+        self.inferred = Graph()
+        self.rules: Rules | None = None
+        self.counts: Counter = Counter()   # nombre de dérivations de chaque conséquence
+        self.frozen: set = set()           # inférences OWL-RL hors règles incrémentales
+
+        self._lock = threading.Lock()        # un seul recalcul complet à la fois
+        self._delta_lock = threading.Lock()  # protège counts / inferred
+        self._buffer: list | None = None     # modifications reçues pendant un recalcul complet
+        self._refresh_thread: threading.Thread | None = None
+        self.stats: dict[str, Any] = {
+            "status": "never_run",
+            "inferred_triples": 0,
+            "elapsed_s": None,
+            "last_run": None,
+            "error": None,
+            "deltas": 0,
+            "last_delta_ms": 0.0,
+            "asymmetric_violations": [],
+        }
+
+    # ------------------------------------------------------------------
+    # Recalcul complet
+    # ------------------------------------------------------------------
+
+    def materialize(self, base: Graph) -> tuple[Graph, Graph]:
+        """Fermeture OWL-RL de `base` ; renvoie (fermeture, triples déduits utiles)."""
+        closure = Graph()
+        for t in base:
+            closure.add(t)
+        DeductiveClosure(OWLRL_Semantics, axiomatic_triples=False, datatype_axioms=False).expand(closure)
+
+        inferred = Graph()
+        for t in closure:
+            if t not in base and is_useful(t):
+                inferred.add(t)
+        for t in subclass_closure(closure):
+            inferred.add(t)
+        return closure, inferred
+
+    def refresh(self) -> dict[str, Any]:
+        """Recalcule le graphe inféré et remplace le graphe nommé dans Fuseki (bloquant)."""
+        with self._lock:
+            with self._delta_lock:
+                self._buffer = []
+            started = time.monotonic()
+            self.stats["status"] = "running"
+            state = None
+            try:
+                base, version = self.store.snapshot()
+                closure, inferred = self.materialize(base)
+                rules = Rules(closure)
+                counts = Counter()
+                for t in base:
+                    counts.update(rules.consequences(t))
+                payload = "".join(triple_to_nquad(t) + "\n" for t in inferred).encode("utf-8")
+                if self._leading():
+                    self.client.put_data(payload, content_type="application/n-triples", graph=self.graph_uri)
+                state = (inferred, rules, counts, version)
+                self.stats.update(status="done", inferred_triples=len(inferred), error=None)
+            except Exception as e:
+                self.stats.update(status="failed", error=str(e))
+                print(f"⚠️ Erreur d'inférence : {e}")
+            finally:
+                self.stats["elapsed_s"] = round(time.monotonic() - started, 3)
+                self.stats["last_run"] = time.time()
+                self._install(state)
+
+            if state is not None:
+                print(f"🧠 Graphe inféré publié : {len(self.inferred)} triples en {self.stats['elapsed_s']}s.")
+            return dict(self.stats)
+
+    def _install(self, state):
+        """Bascule sur le nouvel état puis rejoue les modifications arrivées pendant le calcul."""
+        with self._delta_lock:
+            buffered, self._buffer = self._buffer or [], None
+            version = 0
+            if state is not None:
+                inferred, rules, counts, version = state
+                self.inferred, self.rules, self.counts = inferred, rules, counts
+                self.frozen = {t for t in inferred if not counts[t]}
+            for v, added, removed in buffered:
+                if v > version:
+                    self._apply(added, removed)
+            self.stats["inferred_triples"] = len(self.inferred)
+
+    def schedule_refresh(self):
+        """Recalcul complet en tâche de fond (ontologie modifiée)."""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self.refresh, name="inference-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    # ------------------------------------------------------------------
+    # Mise à jour incrémentale (abonné du GraphStore)
+    # ------------------------------------------------------------------
+
+    def on_change(self, added: list, removed: list, version: int):
+        if any(is_schema(t) for t in (*added, *removed)):
+            self.schedule_refresh()
+        with self._delta_lock:
+            if self._buffer is not None:
+                self._buffer.append((version, added, removed))
+                return
+            if self.rules is None:
+                return
+            started = time.perf_counter()
+            self._apply(added, removed)
+            self.stats["inferred_triples"] = len(self.inferred)
+            self.stats["deltas"] += 1
+            self.stats["last_delta_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _apply(self, added: Iterable, removed: Iterable):
+        """Applique un delta aux compteurs et publie les inférences qui changent."""
+        explicit = self.store.graph
+        ins, dels = set(), set()
+
+        for t in removed:
+            for c in self.rules.consequences(t):
+                self.counts[c] -= 1
+                if self.counts[c] <= 0:
+                    del self.counts[c]
+                    if c not in self.frozen and c in self.inferred:
+                        dels.add(c)
+            # Un triple explicite retiré reste vrai s'il est encore déductible
+            if (self.counts[t] or t in self.frozen) and is_useful(t):
+                ins.add(t)
+
+        for t in added:
+            self._check_asymmetric(t)
+            for c in self.rules.consequences(t):
+                self.counts[c] += 1
+                if c not in explicit and c not in self.inferred and is_useful(c):
+                    ins.add(c)
+            # Devenu explicite : il n'a plus sa place dans le graphe inféré
+            if t in self.inferred:
+                dels.add(t)
+
+        ins -= dels
+        for t in dels:
+            self.inferred.remove(t)
+        for t in ins:
+            self.inferred.add(t)
+        if (ins or dels) and self.publish is not None and self._leading():
+            self.publish(self._update_query(ins, dels))
+
+    def _leading(self) -> bool:
+        return self.leader is None or self.leader()
+
+    def _check_asymmetric(self, triple: tuple):
+        s, p, o = triple
+        if p not in self.rules.asymmetric:
+            return
+        if (o, p, s) in self.store.graph or (o, p, s) in self.inferred:
+            violation = f"{s.n3()} {p.n3()} {o.n3()}"
+            self.stats["asymmetric_violations"] = (self.stats["asymmetric_violations"] + [violation])[-20:]
+            print(f"⚠️ Propriété asymétrique violée : {violation}")
+
+    def _update_query(self, ins: set, dels: set) -> str:
+        ops = []
+        if dels:
+            body = "\n".join(triple_to_nquad(t) for t in dels)
+            ops.append(f"DELETE DATA {{ GRAPH <{self.graph_uri}> {{\n{body}\n}} }}")
+        if ins:
+            body = "\n".join(triple_to_nquad(t) for t in ins)
+            ops.append(f"INSERT DATA {{ GRAPH <{self.graph_uri}> {{\n{body}\n}} }}")
+        return " ;\n".join(ops)
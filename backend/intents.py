@@ -0,0 +1,161 @@
+# intents.py
+"""
+Reconnaissance d'intentions simples pour /ask_ia/, sans appel au LLM.
+
+Les questions fréquentes (« liste des accidents », « combien d'utilisateurs ? »,
+« statistiques de pollution ») se résument à un concept du domaine (table SYNONYMS)
+et à une forme (liste ou comptage). Chaque couple (concept, forme) est associé à une
+requête SPARQL vérifiée (registre des requêtes paramétrées) ; le LLM n'est appelé que
+si aucune intention ne correspond avec assez de confiance.
+
+La question est normalisée comme la clé du cache (minuscules, sans accents ni
+ponctuation), découpée en mots, puis les mots ramenés au singulier (s final). Tous
+les synonymes sont compilés une fois dans un automate d'Aho-Corasick sur les mots :
+une seule passe sur la question trouve toutes les expressions, même imbriquées
+(« qualité de l'air » et « air »), sans correspondance au milieu d'un mot
+(« air » ne reconnaît pas « salaire »).
+
+Une intention est retenue si :
+- un seul concept du domaine est reconnu (deux concepts = question composée) ;
+- les expressions reconnues couvrent au moins `min_coverage` des mots porteurs de sens
+  (hors mots vides). « Liste des accidents à Sfax » laisse « sfax » non couvert : le
+  filtre demandé ne serait pas appliqué, la question va au LLM.
+"""
+from collections import Counter, deque
+from typing import Any
+
+from caches import normalize_question
+
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "cette", "d", "dans", "de", "des", "du", "en", "est",
+    "et", "il", "ils", "je", "l", "la", "le", "les", "leur", "leurs", "mes", "moi", "mon", "nous",
+    "ou", "par", "pour", "qu", "que", "qui", "s", "sont", "sur", "svp", "t", "tous", "tout",
+    "toute", "toutes", "un", "une", "y", "ya", "ai", "existe", "existent", "me", "m",
+}
+
+# Formes de question : mots qui décident de la forme de la réponse (liste par défaut)
+SHAPES = {
+    "count": ["combien", "nombre", "nombre total", "total", "compter", "compte"],
+    "list": ["liste", "lister", "affiche", "afficher", "montre", "montrer", "donne", "donner",
+             "quel", "quels", "quelle", "quelles", "voir", "trouve", "trouver", "cherche"],
+}
+
+
+def stem(word: str) -> str:
+    """Singulier approximatif : « accidents » -> « accident » (mots de plus de 3 lettres)."""
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def tokenize(text: str) -> list[str]:
+    return [w if w in STOPWORDS else stem(w) for w in normalize_question(text).split()]
+
+
+class PhraseMatcher:
+    """Automate d'Aho-Corasick sur des suites de mots : expression -> étiquette."""
+
+    def __init__(self, phrases: dict[str, str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[str, int]]] = [[]]   # (étiquette, nombre de mots)
+        for phrase, label in phrases.items():
+            words = tokenize(phrase)
+            if not words:
+                continue
+            state = 0
+            for w in words:
+                if w not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][w] = len(self._goto) - 1
+                state = self._goto[state][w]
+            self._out[state].append((label, len(words)))
+
+        # Liens d'échec en largeur : plus long suffixe propre qui est aussi un préfixe
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for w, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and w not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(w, 0) if state else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, words: list[str]) -> list[tuple[int, int, str]]:
+        """Toutes les occurrences (début, fin exclue, étiquette), y compris imbriquées."""
+        found = []
+        state = 0
+        for i, w in enumerate(words):
+            while state and w not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(w, 0)
+            for label, length in self._out[state]:
+                found.append((i + 1 - length, i + 1, label))
+        return found
+
+
+class IntentRouter:
+
+    def __init__(self, synonyms: dict[str, list[str]], intents: dict[tuple[str, str], Any],
+                 min_coverage: float = 0.75):
+        self.intents = intents                  # (concept, forme) -> requête (QueryTemplate)
+        self.min_coverage = min_coverage
+        phrases = {}
+        for concept, words in synonyms.items():
+            for phrase in [concept, *words]:
+                phrases[phrase] = concept
+        for shape, words in SHAPES.items():
+            for phrase in words:
+                phrases[phrase] = f"#{shape}"
+        self.matcher = PhraseMatcher(phrases)
+        self.stats: Counter = Counter()
+
+    def match(self, question: str) -> dict[str, Any] | None:
+        """Intention reconnue ({intent, concept, shape, confidence, query}) ou None (-> LLM)."""
+        words = tokenize(question)
+        hits = self.matcher.find(words)
+        covered = set()
+        concepts, shapes = set(), set()
+        for start, end, label in hits:
+            covered.update(range(start, end))
+            (shapes if label.startswith("#") else concepts).add(label.lstrip("#"))
+
+        content = [i for i, w in enumerate(words) if w not in STOPWORDS]
+        coverage = len(covered.intersection(content)) / len(content) if content else 0.0
+        shape = "count" if "count" in shapes else "list"
+
+        if not concepts:
+            return self._miss("aucun concept")
+        if len(concepts) > 1:
+            return self._miss("plusieurs concepts")
+        concept = next(iter(concepts))
+        template = self.intents.get((concept, shape))
+        if template is None:
+            return self._miss("forme non prise en charge")
+        if coverage < self.min_coverage:
+            return self._miss("couverture insuffisante")
+
+        self.stats["matched"] += 1
+        return {
+            "intent": template.id,
+            "concept": concept,
+            "shape": shape,
+            "confidence": round(coverage, 3),
+            "query": template,
+        }
+
+    def _miss(self, reason: str) -> None:
+        self.stats[f"miss: {reason}"] += 1
+        return None
+
+    def get_stats(self) -> dict[str, Any]:
+        total = sum(self.stats.values())
+        return {
+            "questions": total,
+            "matched": self.stats["matched"],
+            "hit_rate": round(self.stats["matched"] / total, 3) if total else 0.0,
+            "misses": {k[6:]: n for k, n in self.stats.items() if k.startswith("miss: ")},
+            "intents": sorted(template.id for template in self.intents.values()),
+        }
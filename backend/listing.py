@@ -0,0 +1,193 @@
+# listing.py
+"""
+Description déclarative des collections exposées par l'API (utilisateurs, avis,
+événements...) : motif SPARQL, variables sélectionnées et mise en forme d'une ligne.
+
+Une même description sert à la réponse JSON classique et aux exports en flux
+(NDJSON / CSV), où les résultats Fuseki sont lus ligne à ligne sans jamais
+être chargés entièrement en mémoire.
+"""
+import base64
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
+
+
+def encode_cursor(values: list[str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[str]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Curseur invalide.")
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise ValueError("Curseur invalide.")
+    return values
+
+
+def project(row: dict[str, Any], fields: list[str] | None) -> dict[str, Any]:
+    """Ne garde que les champs demandés (`?fields=id,nom`)."""
+    if not fields:
+        return row
+    return {k: row[k] for k in fields if k in row}
+
+
+@dataclass
+class Listing:
+    name: str
+    variables: list[str]
+    where: str                                  # corps du WHERE (préfixes ex/rdf/rdfs disponibles)
+    row: Callable[[dict], dict[str, Any]]       # binding SPARQL JSON -> objet renvoyé par l'API
+    key: str                                    # variable identifiant l'entité
+    distinct: bool = False
+    unique: bool = False                        # une seule ligne par valeur de `key`
+    prefixes: str = field(default="", repr=False)
+
+    def tags(self) -> set[str]:
+        """Classes / propriétés `ex:` lues par la requête (étiquettes d'invalidation du cache)."""
+        return set(re.findall(r"\bex:(\w+)", self.where))
+
+    @property
+    def sort(self) -> list[str]:
+        """
+        Variables de tri de la pagination par curseur (keyset) : l'entité seule pour une
+        collection `unique`, sinon toutes les variables (une relation = une ligne).
+        """
+        if self.unique:
+            return [self.key]
+        return [self.key] + [v for v in self.variables if v != self.key]
+
+    def query(self, order: bool = False, limit: int | None = None, after: list[str] | None = None) -> str:
+        """
+        `limit` / `after` (valeurs du curseur) : page triée par IRI, calculée par Fuseki.
+        On demande `limit + 1` lignes pour savoir s'il existe une page suivante.
+        """
+        select = "SELECT DISTINCT" if self.distinct else "SELECT"
+        variables = " ".join(f"?{v}" for v in self.variables)
+        if limit is None and after is None:
+            order_by = f"\nORDER BY ?{self.key}" if order else ""
+            return f"{self.prefixes}\n{select} {variables} WHERE {{{self.where}}}{order_by}\n"
+
+        keyset = self._keyset_filter(after) if after else ""
+        limit_clause = f"\nLIMIT {limit + 1}" if limit is not None else ""
+        order_by = "\nORDER BY " + " ".join(self._sort_expr(v) for v in self.sort)
+        if self.unique:
+            # La page porte sur les entités (sous-requête), puis on récupère leurs lignes
+            where = (
+                f"\n  {{ SELECT DISTINCT ?{self.key} WHERE {{{self.where}{keyset}}}"
+                f"{order_by}{limit_clause} }}{self.where}"
+            )
+            return f"{self.prefixes}\n{select} {variables} WHERE {{{where}}}{order_by}\n"
+        return f"{self.prefixes}\n{select} {variables} WHERE {{{self.where}{keyset}}}{order_by}{limit_clause}\n"
+
+    @staticmethod
+    def _sort_expr(var: str) -> str:
+        # STR() : comparaison lexicale des IRI ; COALESCE pour les variables OPTIONAL
+        return f'COALESCE(STR(?{var}), "")'
+
+    def _keyset_filter(self, after: list[str]) -> str:
+        if len(after) != len(self.sort):
+            raise ValueError("Curseur invalide pour cette collection.")
+        literals = [json.dumps(v, ensure_ascii=False) for v in after]
+        branches = []
+        for i, var in enumerate(self.sort):
+            terms = [f"{self._sort_expr(v)} = {literals[j]}" for j, v in enumerate(self.sort[:i])]
+            terms.append(f"{self._sort_expr(var)} > {literals[i]}")
+            branches.append("(" + " && ".join(terms) + ")")
+        return "\n  FILTER(" + " || ".join(branches) + ")\n"
+
+    def sort_key(self, binding: dict) -> tuple[str, ...]:
+        return tuple(binding.get(v, {}).get("value", "") for v in self.sort)
+
+    def select(self, bindings: Iterable[dict], after: list[str] | None = None) -> list[dict]:
+        """
+        Équivalent en mémoire de `query(limit, after)` pour des bindings calculés hors Fuseki
+        (modèle de lecture) : même ordre (comparaison lexicale) et même filtre keyset.
+        """
+        if after is not None and len(after) != len(self.sort):
+            raise ValueError("Curseur invalide pour cette collection.")
+        bindings = sorted(bindings, key=self.sort_key)
+        if after:
+            bindings = [b for b in bindings if self.sort_key(b) > tuple(after)]
+        return bindings
+
+    def cursor(self, binding: dict) -> str:
+        return encode_cursor(list(self.sort_key(binding)))
+
+    def _distinct_bindings(self, bindings: Iterable[dict]) -> Iterator[dict]:
+        seen = set()
+        for r in bindings:
+            if self.unique:
+                k = r[self.key]["value"]
+                if k in seen:
+                    continue
+                seen.add(k)
+            yield r
+
+    def rows(self, bindings: Iterable[dict]) -> Iterator[dict[str, Any]]:
+        """Met en forme les bindings (avec dédoublonnage sur `key` si `unique`)."""
+        for r in self._distinct_bindings(bindings):
+            yield self.row(r)
+
+    def page(self, bindings: Iterable[dict], limit: int | None) -> tuple[list[dict[str, Any]], str | None]:
+        """Lignes d'une page + curseur de la page suivante (None si dernière page)."""
+        rows, last = [], None
+        for r in self._distinct_bindings(bindings):
+            if limit is not None and len(rows) == limit:
+                return rows, self.cursor(last)
+            rows.append(self.row(r))
+            last = r
+        return rows, None
+
+    async def stream_rows(self, bindings: AsyncIterator[dict]) -> AsyncIterator[dict[str, Any]]:
+        """
+        Variante en flux : la requête doit être triée sur `key` (query(order=True)),
+        le dédoublonnage ne garde donc que la dernière clé vue (mémoire constante).
+        """
+        last = None
+        async for r in bindings:
+            if self.unique:
+                k = r[self.key]["value"]
+                if k == last:
+                    continue
+                last = k
+            yield self.row(r)
+
+
+class ListingRegistry(dict):
+
+    def __init__(self, prefixes: str):
+        super().__init__()
+        self.prefixes = prefixes
+
+    def register(self, **kwargs) -> Listing:
+        listing = Listing(prefixes=self.prefixes, **kwargs)
+        self[listing.name] = listing
+        return listing
+
+
+# ======================
+# Encodage des flux
+# ======================
+
+async def ndjson_lines(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def csv_lines(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = None
+    async for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
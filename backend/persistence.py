@@ -0,0 +1,730 @@
+# persistence.py
+"""
+Persistance write-behind du graphe RDF local.
+
+Au lieu de réécrire tout le fichier RDF/XML à chaque requête, chaque modification
+est ajoutée à un journal (une ligne N-Quads préfixée par `A` pour un ajout ou `D`
+pour une suppression). Un thread d'arrière-plan compacte ensuite le journal dans
+le snapshot RDF/XML quand il dépasse une taille ou un âge donné.
+
+Au démarrage, le graphe est reconstruit en rechargeant le snapshot puis en
+rejouant le journal : le coût d'une écriture est O(delta) et non O(graphe).
+
+Le contenu du snapshot est aussi mis en cache sous forme binaire (pickle de la liste
+des triples, `.pickle`) : le recharger est plusieurs fois plus rapide que de parser
+le RDF/XML. Le cache porte la taille / date du fichier source et n'est utilisé que s'il
+correspond encore ; sinon le source est parsé et le cache réécrit.
+
+Le store tient aussi le nombre d'instances explicites par classe (`class_counts`),
+mis à jour à chaque écriture et enregistré à côté du snapshot (`.counts.json`) :
+au démarrage, les compteurs sont rechargés puis corrigés par le rejeu du journal.
+
+Les abonnés (`subscribe`) reçoivent chaque modification effective (triples réellement
+ajoutés / retirés) ; ils sont appelés sous le verrou du graphe, dans l'ordre des écritures.
+
+Le graphe est protégé par un verrou lecteurs / rédacteur (voir rwlock.py) : les écritures
+(`add`, `remove`, `apply`, `run_locked`) sont exclusives, les lectures (`read`,
+`snapshot`) se font en parallèle. Aucune sérialisation n'a lieu sous le verrou : la
+compaction écrit un graphe reconstruit à partir des fichiers.
+
+Plusieurs processus (workers uvicorn) peuvent ouvrir le même store :
+- toutes les écritures vont dans le même journal, sous un verrou de fichier (`flock`
+  sur `<journal>.lock`) ; avant d'écrire, un processus applique les lignes ajoutées
+  par les autres depuis sa dernière lecture, si bien que tous voient les écritures
+  dans le même ordre ;
+- chaque processus suit le journal en tâche de fond (`follow`) : les écritures des
+  autres arrivent à ses abonnés comme les siennes (`following` vaut alors True) ;
+- un seul processus est propriétaire (`owner`, verrou exclusif sur `<snapshot>.owner`,
+  relâché à sa mort puis repris par un autre) : lui seul compacte le journal et écrit
+  snapshot, cache binaire et compteurs, par fichier temporaire puis renommage atomique.
+  Le renommage du journal et le remplacement du snapshot se font sous le verrou de
+  fichier : un processus qui démarre lit toujours un ensemble cohérent.
+
+`version` est une position dans la suite de toutes les écritures du store : octets du
+journal écrits depuis la création de l'époque (`epoch`, identifiant enregistré dans
+`<journal>.epoch` avec la position de début du journal courant, mise à jour à chaque
+compaction). Tous les processus donnent donc la même version au même état ; un jeton
+(`epoch`, `version`) reste valable d'un worker à l'autre et après un redémarrage.
+Sans `fcntl` (Windows), le store fonctionne en processus unique.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:   # Windows : pas de verrou de fichier, un seul processus
+    fcntl = None
+
+import rdflib
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF
+
+from rwlock import RWLock
+
+Triple = tuple  # (s, p, o)
+Listener = Callable[[list, list, int], None]  # (ajoutés, retirés, version)
+
+
+def triple_to_nquad(triple: Triple) -> str:
+    """Sérialise un triple en ligne N-Quads (graphe par défaut)."""
+    s, p, o = triple
+    return f"{s.n3()} {p.n3()} {o.n3()} ."
+
+
+def parse_nquads(lines: list[str]) -> list[Triple]:
+    """Parse un lot de lignes N-Quads/N-Triples en liste de triples."""
+    tmp = Graph()
+    tmp.parse(data="\n".join(lines) + "\n", format="nt")
+    return list(tmp)
+
+
+def count_classes(graph: Graph) -> Counter:
+    """Nombre d'instances explicites par classe (parcours de tous les rdf:type)."""
+    return Counter(o for o in graph.objects(None, RDF.type))
+
+
+class GraphStore:
+    """
+    Graphe rdflib + journal d'écriture (write-ahead) + snapshot compacté en tâche de fond.
+    """
+
+    def __init__(
+        self,
+        graph: Graph,
+        snapshot_path: str,
+        journal_path: str,
+        base_path: str | None = None,
+        max_journal_bytes: int = 4 * 1024 * 1024,
+        max_journal_age: float = 60.0,
+        fsync: bool = False,
+        follow_interval: float = 0.2,
+    ):
+        self.graph = graph
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compacting_path = journal_path + ".compacting"
+        self.counts_path = os.path.splitext(snapshot_path)[0] + ".counts.json"
+        self.cache_path = os.path.splitext(snapshot_path)[0] + ".pickle"
+        self.lock_path = journal_path + ".lock"
+        self.epoch_path = journal_path + ".epoch"
+        self.owner_path = os.path.splitext(snapshot_path)[0] + ".owner"
+        self.base_path = base_path
+        self.max_journal_bytes = max_journal_bytes
+        self.max_journal_age = max_journal_age
+        self.fsync = fsync
+        self.follow_interval = follow_interval
+
+        self._lock = RWLock()                  # protège le graphe + le journal (voir rwlock.py)
+        self._compact_lock = threading.Lock()  # une seule compaction à la fois
+        self._journal = None
+        self._journal_bytes = 0
+        self._journal_since: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._listeners: list[Listener] = []
+        self.version = 0                       # position dans le journal à chaque modification effective
+        self.epoch: str | None = None          # identifiant de la suite d'écritures (fichier .epoch)
+        self._base = 0                         # position du début du journal courant dans cette suite
+        self.class_counts: Counter = Counter()  # classe (IRI) -> nombre d'instances explicites
+        self._detached: dict[Any, set] = {}    # sujet -> triples retirés par detach (toujours journalisés)
+
+        # Partage entre processus
+        self.following = False                 # vrai pendant la notification d'écritures d'un autre processus
+        self.on_replicated: Callable[[], None] | None = None   # après application de ces écritures
+        self.followed_at: float | None = None  # dernier instant où le journal partagé était entièrement appliqué
+        self._tail = None                      # journal ouvert en lecture, position déjà appliquée
+        self._tail_pos = 0
+        self._lock_file = open(self.lock_path, "a")
+        self._lock_depth = 0
+        self._owner_file = None
+        self.owner = self._claim()
+
+    def subscribe(self, listener: Listener):
+        self._listeners.append(listener)
+
+    def _notify(self, added: list[Triple], removed: list[Triple]):
+        if not added and not removed:
+            return
+        self.version = self._base + self._tail_pos
+        for listener in self._listeners:
+            try:
+                listener(added, removed, self.version)
+            except Exception as e:
+                print(f"⚠️ Erreur d'un abonné du graphe : {e}")
+
+    # ------------------------------------------------------------------
+    # Récupération au démarrage
+    # ------------------------------------------------------------------
+
+    def recover(self):
+        """Recharge snapshot (ou fichier de base) puis rejoue le journal."""
+        with self._lock.write(), self._file_lock():
+            self._recover()
+            self._open_journal()
+            # Lignes suivantes du journal : écrites par ce processus ou suivies (follow)
+            self._tail = open(self.journal_path, "rb")
+            self._tail_pos = os.fstat(self._tail.fileno()).st_size
+            self._load_epoch()
+            self.version = self._base + self._tail_pos
+            self.followed_at = time.time()
+
+    def _recover(self):
+        source = self.snapshot_path if os.path.exists(self.snapshot_path) else self.base_path
+        if source and os.path.exists(source):
+            started = time.monotonic()
+            cached = self._load_cache(source)
+            if cached is not None:
+                self.graph.addN((s, p, o, self.graph) for s, p, o in cached)
+                print(f"📦 Snapshot chargé depuis le cache binaire ({len(cached)} triples) en {time.monotonic() - started:.2f}s.")
+            else:
+                try:
+                    self.graph.parse(source)
+                    if self.owner:
+                        self._save_cache(source, list(self.graph))
+                    print(f"📄 Snapshot parsé ({source}, {len(self.graph)} triples) en {time.monotonic() - started:.2f}s.")
+                except Exception as e:
+                    print(f"⚠️ Snapshot illisible ({source}) : {e}")
+
+        counts = self._load_counts() if source == self.snapshot_path else None
+        replayed = 0
+        for path in (self.compacting_path, self.journal_path):
+            replayed += self._replay(path, self.graph, counts)
+        if replayed:
+            print(f"♻️ Journal rejoué : {replayed} opération(s).")
+        # Sans compteurs valides (snapshot remplacé, premier démarrage...) : un parcours des types
+        self.class_counts = counts if counts is not None else count_classes(self.graph)
+
+    def _replay(self, path: str, graph: Graph, counts: Counter | None = None) -> int:
+        """
+        Applique un fichier journal sur `graph`, en respectant l'ordre des opérations ;
+        `counts` reçoit les ajouts / retraits effectifs de types.
+        """
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for op, triples, lines in self._runs(f, path):
+                count += lines
+                for t in triples:
+                    if counts is not None and t[1] == RDF.type and (t in graph) != (op == "A"):
+                        counts[t[2]] += 1 if op == "A" else -1
+                    if op == "A":
+                        graph.add(t)
+                    else:
+                        graph.remove(t)
+        return count
+
+    @staticmethod
+    def _runs(lines: Iterable[str], source: str) -> Iterator[tuple[str, list[Triple], int]]:
+        """Regroupe les lignes du journal en suites de même opération, parsées par lot : (op, triples, nb lignes)."""
+        run_op, run_lines = None, []
+
+        def parsed() -> list[Triple]:
+            try:
+                return parse_nquads(run_lines)
+            except Exception:
+                pass
+            # Lot illisible : ligne par ligne, seules les lignes corrompues sont perdues
+            triples = []
+            for nquad in run_lines:
+                try:
+                    triples.extend(parse_nquads([nquad]))
+                except Exception as e:
+                    print(f"⚠️ Entrée de journal ignorée ({source}) : {e}")
+            return triples
+
+        for line in lines:
+            line = line.rstrip("\n")
+            # Une ligne tronquée (crash pendant l'écriture) est ignorée
+            if len(line) < 3 or not line.endswith(" ."):
+                continue
+            op, nquad = line[0], line[2:]
+            if op != run_op and run_lines:
+                yield run_op, parsed(), len(run_lines)
+                run_lines = []
+            run_op = op
+            run_lines.append(nquad)
+        if run_lines:
+            yield run_op, parsed(), len(run_lines)
+
+    # ------------------------------------------------------------------
+    # Écritures
+    # ------------------------------------------------------------------
+
+    def add(self, triples: Iterable[Triple]) -> list[Triple]:
+        """Ajoute des triples au graphe et au journal (seuls les triples absents sont journalisés)."""
+        triples = list(triples)
+        # Lignes encodées avant le verrou : un triple invalide lève une erreur avant toute modification
+        lines = {t: f"A {triple_to_nquad(t)}\n" for t in triples}
+        with self._lock.write(), self._shared():
+            added = [t for t in lines if t not in self.graph]
+            for t in added:
+                self.graph.add(t)
+                if t[1] == RDF.type:
+                    self.class_counts[t[2]] += 1
+            self._write("".join(lines[t] for t in added))
+            self._notify(added, [])
+        return triples
+
+    def remove(self, pattern: Triple) -> list[Triple]:
+        """Supprime les triples correspondant au motif et journalise les triples effectivement retirés."""
+        with self._lock.write(), self._shared():
+            removed = list(self.graph.triples(pattern))
+            data = self._encode("D", removed)
+            for t in removed:
+                self.graph.remove(t)
+                if t[1] == RDF.type:
+                    self.class_counts[t[2]] -= 1
+                    if not self.class_counts[t[2]]:
+                        del self.class_counts[t[2]]
+            self._write(data)
+            self._notify([], removed)
+        return removed
+
+    def apply(self, added: Iterable[Triple], removed: Iterable[Triple]) -> tuple[list, list]:
+        """
+        Applique un delta complet (retraits puis ajouts) en une seule modification :
+        une entrée de journal, une notification des abonnés.
+        """
+        with self._lock.write(), self._shared():
+            added, removed = dict.fromkeys(added), dict.fromkeys(removed)
+            both = added.keys() & removed.keys()   # retiré puis rajouté : sans effet
+            removed = [t for t in removed if t not in both and (t in self.graph or self._is_detached(t))]
+            added = [t for t in added if t not in both and t not in self.graph]
+            data = self._encode("D", removed) + self._encode("A", added)
+            for t in removed:
+                if self._undetach(t):
+                    continue
+                self.graph.remove(t)
+                if t[1] == RDF.type:
+                    self.class_counts[t[2]] -= 1
+                    if not self.class_counts[t[2]]:
+                        del self.class_counts[t[2]]
+            for t in added:
+                self.graph.add(t)
+                if t[1] == RDF.type:
+                    self.class_counts[t[2]] += 1
+            self._write(data)
+            self._notify(added, removed)
+        return added, removed
+
+    def detach(self, triples: Iterable[Triple]) -> list[Triple]:
+        """
+        Retire des triples du graphe servi sans les journaliser ni notifier les abonnés :
+        ils restent dans le snapshot et le journal, source durable d'un index dérivé qui
+        les restitue (colonnes de statistiques, voir statstore.py). Les workers qui ne sont
+        pas propriétaires reconstruisent cet index depuis le snapshot : une suppression
+        journalisée le viderait. Appelable depuis un abonné (verrou d'écriture réentrant).
+
+        Le store garde ces triples (`detached(sujet)`) : `apply` peut alors les retirer
+        pour de bon (suppression d'une entité), avec une ligne de journal et une notification.
+        """
+        with self._lock.write():
+            removed = [t for t in dict.fromkeys(triples) if t in self.graph]
+            for t in removed:
+                self.graph.remove(t)
+                self._detached.setdefault(t[0], set()).add(t)
+                if t[1] == RDF.type:
+                    self.class_counts[t[2]] -= 1
+                    if not self.class_counts[t[2]]:
+                        del self.class_counts[t[2]]
+        return removed
+
+    def detached(self, subject) -> set[Triple]:
+        """Triples de `subject` retirés du graphe servi par `detach`, encore présents dans le journal."""
+        with self._lock.read():
+            return set(self._detached.get(subject, ()))
+
+    def _is_detached(self, t: Triple) -> bool:
+        return t in self._detached.get(t[0], ())
+
+    def _undetach(self, t: Triple) -> bool:
+        held = self._detached.get(t[0])
+        if held is None or t not in held:
+            return False
+        held.discard(t)
+        if not held:
+            del self._detached[t[0]]
+        return True
+
+    def snapshot(self) -> tuple[Graph, int]:
+        """Copie cohérente du graphe (prise en lecture) et version correspondante."""
+        copy = Graph()
+        with self._lock.read():
+            copy.addN((s, p, o, copy) for s, p, o in self.graph)
+            return copy, self.version
+
+    def read(self, fn: Callable[[Graph], Any]) -> Any:
+        """Exécute `fn(graph)` en lecture : en parallèle des autres lectures, sans écriture concurrente."""
+        with self._lock.read():
+            return fn(self.graph)
+
+    def run_locked(self, fn: Callable[[Graph], Any]) -> Any:
+        """Exécute `fn(graph)` seul, sous le verrou d'écriture (`fn` peut appeler `apply`)."""
+        with self._lock.write():
+            return fn(self.graph)
+
+    def copy(self) -> Graph:
+        """Copie cohérente du graphe, pour les traitements longs."""
+        return self.snapshot()[0]
+
+    def _open_journal(self):
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_bytes = os.path.getsize(self.journal_path)
+        self._journal_since = time.monotonic() if self._journal_bytes else None
+
+    @staticmethod
+    def _encode(op: str, triples: list[Triple]) -> str:
+        return "".join(f"{op} {triple_to_nquad(t)}\n" for t in triples)
+
+    def _write(self, data: str):
+        """Ajoute au journal (sous le verrou d'écriture et le verrou de fichier, après _follow)."""
+        if not data:
+            return
+        if self._journal is None or self._rotated(self._journal):
+            self._open_journal()   # journal renommé par la compaction du propriétaire
+        self._journal.write(data)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        # Nos propres lignes ne seront pas relues par _follow
+        self._journal_bytes = self._tail_pos = os.fstat(self._journal.fileno()).st_size
+        if self._journal_since is None:
+            self._journal_since = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Partage entre processus
+    # ------------------------------------------------------------------
+
+    def _claim(self) -> bool:
+        """Tente de devenir propriétaire (verrou exclusif non bloquant, relâché à la mort du processus)."""
+        if fcntl is None:
+            return True
+        if self._owner_file is None:
+            self._owner_file = open(self.owner_path, "a")
+        try:
+            fcntl.flock(self._owner_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    @contextmanager
+    def _file_lock(self):
+        """Verrou de fichier du journal, à prendre sous le verrou d'écriture (flock n'exclut pas les threads entre eux)."""
+        if fcntl is not None and not self._lock_depth:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if fcntl is not None and not self._lock_depth:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _shared(self):
+        """Verrou de fichier + application préalable des écritures des autres processus."""
+        with self._file_lock():
+            self._follow()
+            yield
+
+    def _rotated(self, f) -> bool:
+        try:
+            return os.stat(self.journal_path).st_ino != os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _behind(self) -> bool:
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return False
+        return st.st_ino != os.fstat(self._tail.fileno()).st_ino or st.st_size > self._tail_pos
+
+    def _follow(self):
+        """Applique les lignes écrites par d'autres processus depuis la dernière lecture du journal."""
+        if self._tail is None:
+            return
+        lines = []
+        while True:
+            self._tail.seek(self._tail_pos)
+            chunk = self._tail.read()
+            end = chunk.rfind(b"\n") + 1
+            if end:
+                lines.extend(chunk[:end].decode("utf-8").splitlines())
+                self._tail_pos += end
+            if not self._rotated(self._tail):
+                break
+            # Journal renommé par une compaction : fin de l'ancien fichier lue, suite dans le nouveau
+            self._tail.close()
+            self._base += self._tail_pos
+            self._tail, self._tail_pos = open(self.journal_path, "rb"), 0
+        self._journal_bytes = self._tail_pos
+        if not lines:
+            return
+        if self._journal_since is None:
+            self._journal_since = time.monotonic()
+
+        before: dict[Triple, bool] = {}
+        for op, triples, _ in self._runs(lines, self.journal_path):
+            for t in triples:
+                before.setdefault(t, t in self.graph)
+                if op == "A":
+                    self.graph.add(t)
+                else:
+                    self.graph.remove(t)
+                    self._undetach(t)   # valeur d'une entité supprimée par un autre worker
+        added = [t for t, was in before.items() if not was and t in self.graph]
+        removed = [t for t, was in before.items() if was and t not in self.graph]
+        for t in removed:
+            if t[1] == RDF.type:
+                self.class_counts[t[2]] -= 1
+                if not self.class_counts[t[2]]:
+                    del self.class_counts[t[2]]
+        for t in added:
+            if t[1] == RDF.type:
+                self.class_counts[t[2]] += 1
+        self.following = True
+        try:
+            self._notify(added, removed)
+        finally:
+            self.following = False
+
+    def follow(self) -> bool:
+        """Applique les écritures des autres processus ; True si le graphe a changé."""
+        if self._tail is None:
+            return False
+        checked = time.time()
+        if not self._behind():
+            self.followed_at = checked
+            return False
+        version = self.version
+        with self._lock.write(), self._shared():
+            pass
+        self.followed_at = checked
+        if self.version == version:
+            return False
+        if self.on_replicated is not None:
+            self.on_replicated()
+        return True
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def needs_compaction(self) -> bool:
+        if os.path.exists(self.compacting_path):
+            return True
+        if not self._journal_bytes:
+            return False
+        if self._journal_bytes >= self.max_journal_bytes:
+            return True
+        return time.monotonic() - (self._journal_since or time.monotonic()) >= self.max_journal_age
+
+    def compact(self):
+        """
+        Intègre le journal dans le snapshot.
+        Le journal courant est renommé puis un nouveau est ouvert : les écritures ne sont
+        bloquées que le temps du renommage. Le snapshot est reconstruit à partir de
+        l'ancien snapshot + segment, sans toucher au graphe servi par l'API.
+        """
+        if not self.owner:
+            return
+        with self._compact_lock:
+            with self._lock.write(), self._shared():
+                # Un segment d'une compaction échouée est traité avant d'en créer un nouveau
+                if not os.path.exists(self.compacting_path):
+                    if not self._journal_bytes:
+                        return
+                    self._journal.close()
+                    os.replace(self.journal_path, self.compacting_path)
+                    self._open_journal()
+                    # _follow vient de lire l'ancien journal jusqu'au bout
+                    self._tail.close()
+                    self._base += self._tail_pos
+                    self._save_epoch()
+                    self._tail, self._tail_pos = open(self.journal_path, "rb"), 0
+
+            started = time.monotonic()
+            snapshot = Graph()
+            source = self.snapshot_path if os.path.exists(self.snapshot_path) else self.base_path
+            if source and os.path.exists(source):
+                snapshot.parse(source)
+            self._replay(self.compacting_path, snapshot)
+
+            for prefix, ns in self.graph.namespaces():
+                snapshot.bind(prefix, ns, override=False)
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                snapshot.serialize(f, format="xml")
+                f.flush()
+                os.fsync(f.fileno())
+            # Un processus qui démarre lit snapshot + segment + journal sous ce verrou : jamais l'un sans l'autre
+            with self._lock.write(), self._file_lock():
+                os.replace(tmp_path, self.snapshot_path)
+                os.remove(self.compacting_path)
+            self._save_counts(count_classes(snapshot))
+            self._save_cache(self.snapshot_path, list(snapshot))
+            print(f"🗜️ Journal compacté ({len(snapshot)} triples) en {time.monotonic() - started:.2f}s.")
+
+    # ------------------------------------------------------------------
+    # Époque : identifiant partagé de la suite d'écritures (sous le verrou de fichier)
+    # ------------------------------------------------------------------
+
+    def _load_epoch(self):
+        try:
+            with open(self.epoch_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.epoch, self._base = str(data["epoch"]), int(data["base"])
+        except FileNotFoundError:
+            self.epoch, self._base = uuid.uuid4().hex[:8], 0
+            self._save_epoch()
+        except Exception as e:
+            # Fichier illisible : nouvelle époque (les jetons des clients sont invalidés)
+            print(f"⚠️ Époque illisible ({self.epoch_path}) : {e}")
+            self.epoch, self._base = uuid.uuid4().hex[:8], 0
+            self._save_epoch()
+
+    def _save_epoch(self):
+        tmp_path = f"{self.epoch_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"epoch": self.epoch, "base": self._base}, f)
+        os.replace(tmp_path, self.epoch_path)
+
+    # ------------------------------------------------------------------
+    # Compteurs par classe enregistrés avec le snapshot
+    # ------------------------------------------------------------------
+
+    def _snapshot_signature(self, path: str | None = None) -> list:
+        st = os.stat(path or self.snapshot_path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def _save_counts(self, counts: Counter):
+        """Compteurs du snapshot qui vient d'être écrit, signés par sa taille / date."""
+        tmp_path = f"{self.counts_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"snapshot": self._snapshot_signature(), "counts": {str(c): n for c, n in counts.items()}}, f)
+            os.replace(tmp_path, self.counts_path)
+        except OSError as e:
+            print(f"⚠️ Sauvegarde des compteurs impossible : {e}")
+
+    def _load_counts(self) -> Counter | None:
+        """Compteurs enregistrés, s'ils correspondent bien au snapshot présent sur disque."""
+        try:
+            with open(self.counts_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["snapshot"] != self._snapshot_signature():
+                return None
+            return Counter({URIRef(c): n for c, n in data["counts"].items()})
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Cache binaire du snapshot
+    # ------------------------------------------------------------------
+
+    def _save_cache(self, source: str, triples: list[Triple]):
+        """En-tête (source, signature, version de rdflib) puis liste des triples, en pickle."""
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        header = {"source": os.path.abspath(source), "snapshot": self._snapshot_signature(source),
+                  "rdflib": rdflib.__version__}
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(triples, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, pickle.PicklingError) as e:
+            print(f"⚠️ Cache binaire du snapshot impossible : {e}")
+
+    def _load_cache(self, source: str) -> list[Triple] | None:
+        """Triples du cache s'il a été écrit pour ce fichier source, dans son état actuel."""
+        try:
+            with open(self.cache_path, "rb") as f:
+                header = pickle.load(f)
+                if header != {"source": os.path.abspath(source), "snapshot": self._snapshot_signature(source),
+                              "rdflib": rdflib.__version__}:
+                    return None
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Thread d'arrière-plan
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="graph-store", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last_check = time.monotonic()
+        while not self._stop.wait(self.follow_interval):
+            try:
+                self.follow()
+            except Exception as e:
+                print(f"⚠️ Erreur de suivi du journal : {e}")
+            if time.monotonic() - last_check < 1.0:
+                continue
+            last_check = time.monotonic()
+            if not self.owner and self._claim():
+                self.owner = True
+                print("👑 Propriétaire du store (compaction du journal) : ce processus prend le relais.")
+            try:
+                if self.owner and self.needs_compaction():
+                    self.compact()
+            except Exception as e:
+                print(f"⚠️ Erreur de compaction : {e}")
+
+    def follow_lag(self) -> float:
+        """Retard (s) sur les écritures des autres processus ; infini si le journal n'a jamais été lu."""
+        if self.followed_at is None:
+            return float("inf")
+        return max(0.0, time.time() - self.followed_at)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Taille du graphe et du journal, contention du verrou (lectures / écritures)."""
+        with self._lock.read():
+            triples = len(self.graph)
+        return {
+            "epoch": self.epoch,
+            "version": self.version,
+            "triples": triples,
+            "journal_bytes": self._journal_bytes,
+            "owner": self.owner,
+            "lock": self._lock.get_stats(),
+        }
+
+    def close(self, compact: bool = True):
+        """Arrête le thread et (optionnellement) compacte une dernière fois."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if compact:
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Erreur de compaction : {e}")
+        with self._lock.write():
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._tail is not None:
+                self._tail.close()
+                self._tail = None
+        if self._owner_file is not None:
+            self._owner_file.close()   # relâche la propriété
+            self._owner_file = None
+            self.owner = False
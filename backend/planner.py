@@ -0,0 +1,290 @@
+# planner.py
+"""
+Routage des requêtes SPARQL de lecture : graphe local (rdflib) ou Fuseki.
+
+Les mêmes données existent en deux endroits. Une requête sélective s'exécute plus
+vite en mémoire (pas d'aller-retour HTTP) ; un parcours large ou un agrégat reste
+à Fuseki. `route()` analyse la requête (algèbre SPARQL de rdflib, mise en cache par
+texte sans le bloc VALUES final des requêtes paramétrées : une analyse par modèle, pas
+par identifiant) puis estime sa taille sur le graphe local, les variables liées par le
+bloc VALUES comptant comme termes connus (une recherche par identifiant est sélective) :
+
+- local : requête sur l'ontologie seule (rdfs:subClassOf, domain, range...), ou motif
+  le plus sélectif de chaque BGP estimé à au plus `max_local_rows` triples
+  (sujet / objet liés, compteurs par classe pour `?s a ex:Classe`) ;
+- Fuseki : requête illisible par rdflib, GRAPH / SERVICE / FROM (graphe inféré et
+  graphes nommés absents du graphe local), prédicat variable ou absent du graphe
+  local (`remote_predicates` : valeurs des statistiques stockées en colonnes),
+  agrégat hors ontologie, estimation trop grande, ou graphe local en retard sur
+  Fuseki de plus de `max_staleness` secondes (`staleness()`).
+
+`select()` décide hors de la boucle d'événements (analyse rdflib, attente du verrou
+du graphe) et renvoie dans les deux cas le format JSON SPARQL de Fuseki. La latence est
+mesurée par route appelante et par cible (`get_stats()`), avec le motif de chaque
+décision : de quoi régler les seuils (`mode` force une cible).
+"""
+import json
+import re
+import time
+from collections import Counter
+from functools import partial
+from itertools import product
+from typing import Any, Awaitable, Callable
+
+from rdflib import URIRef, Variable
+from rdflib.namespace import OWL, RDF, RDFS
+from rdflib.paths import Path
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.util import from_n3
+from starlette.concurrency import run_in_threadpool
+
+from caches import LRUCache
+
+SCHEMA_PREDICATES = {
+    RDFS.subClassOf, RDFS.subPropertyOf, RDFS.domain, RDFS.range, RDFS.label, RDFS.comment,
+    OWL.inverseOf, OWL.equivalentClass, OWL.equivalentProperty, OWL.disjointWith,
+}
+SCHEMA_CLASSES = {OWL.Class, RDFS.Class, RDF.Property, OWL.ObjectProperty, OWL.DatatypeProperty}
+REMOTE_NODES = {"Graph", "ServiceGraphPattern"}
+AGGREGATE_NODES = {"AggregateJoin", "Group"}
+
+# Bloc VALUES ajouté en fin de requête par QueryTemplate.bind_rows
+TRAILING_VALUES = re.compile(r"\nVALUES \(([^)]*)\) \{\n(.*)\n\}\s*$", re.S)
+VALUES_TERM = re.compile(r'<[^>]*>|"(?:[^"\\]|\\.)*"(?:\^\^<[^>]*>|@[\w-]+)?|[^\s()]+')
+
+
+def path_predicates(path) -> set:
+    """Prédicats cités par un chemin de propriétés (rdfs:subClassOf*, p/q, ^p...)."""
+    if isinstance(path, URIRef):
+        return {path}
+    out = set()
+    for attr in ("path", "arg"):
+        if hasattr(path, attr):
+            out |= path_predicates(getattr(path, attr))
+    for arg in getattr(path, "args", ()):
+        out |= path_predicates(arg)
+    return out
+
+
+def split_values(query: str) -> tuple[str, dict[Variable, list] | None]:
+    """Sépare le bloc VALUES final : (texte sans VALUES, variable -> valeurs liées)."""
+    m = TRAILING_VALUES.search(query)
+    if m is None:
+        return query, None
+    names = [Variable(v.lstrip("?")) for v in m.group(1).split()]
+    bindings: dict[Variable, list] = {v: [] for v in names}
+    for line in m.group(2).splitlines():
+        line = line.strip()
+        if not (line.startswith("(") and line.endswith(")")):
+            return query, None   # pas un bloc produit par bind_rows
+        terms = VALUES_TERM.findall(line[1:-1])
+        if len(terms) != len(names):
+            return query, None
+        for var, term in zip(names, terms):
+            if term == "UNDEF":
+                bindings[var] = None
+            elif bindings[var] is not None:
+                bindings[var].append(from_n3(term))
+    return query[:m.start()], {v: vals for v, vals in bindings.items() if vals}
+
+
+class Analysis:
+    """Ce que la requête demande, indépendamment du contenu du graphe (mis en cache par modèle)."""
+
+    def __init__(self, query: str):
+        self.bgps: list[list[tuple]] = []
+        self.nodes: set[str] = set()
+        self.error: str | None = None
+        self.dataset = False
+        try:
+            parsed = prepareQuery(query)
+        except Exception as e:
+            self.error = str(e).splitlines()[0]
+            return
+        self.dataset = bool(parsed.algebra.get("datasetClause"))
+        self._walk(parsed.algebra)
+
+    def _walk(self, node):
+        if isinstance(node, CompValue):
+            self.nodes.add(node.name)
+            if node.name == "BGP":
+                self.bgps.append(list(node.triples))
+            for value in node.values():
+                self._walk(value)
+        elif isinstance(node, (list, tuple)):
+            for value in node:
+                self._walk(value)
+
+    def predicates(self) -> set:
+        out = set()
+        for bgp in self.bgps:
+            for _, p, _ in bgp:
+                out |= path_predicates(p) if isinstance(p, Path) else {p}
+        return out
+
+    def schema_only(self) -> bool:
+        """Uniquement des triples d'ontologie (hiérarchie de classes, domaines, `?c a owl:Class`)."""
+        if not self.bgps:
+            return False
+        for bgp in self.bgps:
+            for _, p, o in bgp:
+                preds = path_predicates(p) if isinstance(p, Path) else {p}
+                if preds <= SCHEMA_PREDICATES:
+                    continue
+                if preds == {RDF.type} and o in SCHEMA_CLASSES:
+                    continue
+                return False
+        return True
+
+
+class QueryPlanner:
+
+    def __init__(self, store, remote: Callable[[str], Awaitable[dict]], *,
+                 remote_predicates: set | None = None,
+                 staleness: Callable[[], float] = lambda: 0.0,
+                 max_local_rows: int = 2000, max_staleness: float = 30.0,
+                 mode: str = "auto", slow_ms: float = 500.0, cache_size: int = 256):
+        self.store = store                          # GraphStore (graphe local)
+        self.remote = remote                        # exécution Fuseki (async, JSON SPARQL)
+        self.remote_predicates = set(remote_predicates or ())
+        self.staleness = staleness                  # retard du graphe local sur Fuseki (s)
+        self.max_local_rows = max_local_rows
+        self.max_staleness = max_staleness
+        self.mode = mode                            # "auto" | "local" | "remote"
+        self.slow_ms = slow_ms
+        self._analyses = LRUCache(max_entries=cache_size)   # texte sans VALUES -> Analysis
+        self.routes: dict[str, dict[str, Any]] = {}
+
+    # ------------------------------------------------------------------
+    # Décision
+    # ------------------------------------------------------------------
+
+    def analyse(self, query: str) -> tuple[Analysis, dict[Variable, list]]:
+        """Analyse (en cache par modèle de requête) et valeurs liées par le bloc VALUES final."""
+        text, bindings = split_values(query)
+        analysis = self._analyses.get(text)
+        if analysis is None:
+            analysis = Analysis(text)
+            self._analyses.put(text, analysis)
+        return analysis, bindings or {}
+
+    def route(self, query: str) -> tuple[str, str]:
+        """("local" | "remote", motif). Bloquant (analyse, verrou du graphe) : hors boucle d'événements."""
+        if self.mode in ("local", "remote"):
+            return self.mode, "forcé"
+        a, bindings = self.analyse(query)
+        if a.error is not None:
+            return "remote", "syntaxe non gérée par rdflib"
+        if a.dataset or a.nodes & REMOTE_NODES:
+            return "remote", "graphe nommé / service"
+        if self.staleness() > self.max_staleness:
+            return "remote", "graphe local en retard"
+        if a.schema_only():
+            return "local", "ontologie"
+        predicates = a.predicates()
+        if any(isinstance(p, Variable) for p in predicates):
+            return "remote", "prédicat variable"
+        if predicates & self.remote_predicates:
+            return "remote", "valeurs hors graphe local"
+        if a.nodes & AGGREGATE_NODES:
+            return "remote", "agrégat"
+        estimate = self.store.read(
+            lambda graph: sum(self._estimate(graph, bgp, bindings) for bgp in a.bgps)
+        )
+        if estimate > self.max_local_rows:
+            return "remote", "parcours large"
+        return "local", "sélective"
+
+    def _estimate(self, graph, bgp: list[tuple], bindings: dict[Variable, list]) -> int:
+        """Taille du motif le plus sélectif du BGP (bornée à max_local_rows + 1)."""
+        best = None
+        for s, p, o in bgp:
+            n = self._bound(graph, s, p, o, bindings)
+            best = n if best is None else min(best, n)
+            if best <= 1:
+                break
+        return best or 0
+
+    def _bound(self, graph, s, p, o, bindings: dict[Variable, list]) -> int:
+        """Motif estimé pour chaque valeur liée de ses variables (somme, bornée)."""
+        cap = self.max_local_rows + 1
+        subjects = bindings.get(s, [s]) if isinstance(s, Variable) else [s]
+        objects = bindings.get(o, [o]) if isinstance(o, Variable) else [o]
+        if len(subjects) * len(objects) > cap:
+            return self._pattern(graph, s, p, o)
+        n = 0
+        for s_value, o_value in product(subjects, objects):
+            n += self._pattern(graph, s_value, p, o_value)
+            if n >= cap:
+                return cap
+        return n
+
+    def _pattern(self, graph, s, p, o) -> int:
+        cap = self.max_local_rows + 1
+        if isinstance(p, Path):
+            return cap   # chemin hors ontologie : parcours potentiellement large
+        s = None if isinstance(s, Variable) else s
+        o = None if isinstance(o, Variable) else o
+        if p == RDF.type and s is None and o is not None:
+            return min(self.store.class_counts.get(o, 0), cap)
+        n = 0
+        for _ in graph.triples((s, p, o)):
+            n += 1
+            if n >= cap:
+                break
+        return n
+
+    # ------------------------------------------------------------------
+    # Exécution
+    # ------------------------------------------------------------------
+
+    async def select(self, query: str, route: str = "autre", template=None, rows: list[dict] | None = None) -> dict:
+        """
+        Exécute un SELECT / ASK là où il coûte le moins ; résultat au format JSON SPARQL.
+        Avec `template` et une seule ligne de paramètres, l'évaluation locale reprend la
+        requête préparée du modèle (`QueryTemplate.local`) au lieu de reparser le texte.
+        """
+        target, reason = await run_in_threadpool(self.route, query)
+        started = time.perf_counter()
+        try:
+            if target == "local":
+                if template is not None and rows is not None and len(rows) == 1:
+                    result = await run_in_threadpool(self.store.read, partial(template.local, **rows[0]))
+                else:
+                    result = await run_in_threadpool(self.store.read, lambda graph: graph.query(query))
+                data = json.loads(result.serialize(format="json"))
+            else:
+                data = await self.remote(query)
+        finally:
+            self._observe(route, target, reason, (time.perf_counter() - started) * 1000)
+        return data
+
+    def _observe(self, route: str, target: str, reason: str, ms: float):
+        entry = self.routes.setdefault(route, {"reasons": Counter()})
+        stats = entry.setdefault(target, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += ms
+        stats["max_ms"] = max(stats["max_ms"], ms)
+        entry["reasons"][reason] += 1
+        if ms >= self.slow_ms:
+            print(f"🐢 Requête lente ({route}, {target} : {reason}) : {ms:.0f} ms")
+
+    def get_stats(self) -> dict[str, Any]:
+        out = {}
+        for route, entry in self.routes.items():
+            out[route] = {"reasons": dict(entry["reasons"])}
+            for target in ("local", "remote"):
+                stats = entry.get(target)
+                if stats:
+                    out[route][target] = {
+                        "count": stats["count"],
+                        "avg_ms": round(stats["total_ms"] / stats["count"], 3),
+                        "max_ms": round(stats["max_ms"], 3),
+                    }
+        return {
+            "mode": self.mode,
+            "max_local_rows": self.max_local_rows,
+            "max_staleness_s": self.max_staleness,
+            "routes": out,
+        }
@@ -0,0 +1,194 @@
+# readmodel.py
+"""
+Modèle de lecture en mémoire, dérivé du graphe local.
+
+Index tenus à jour à chaque écriture (abonné du GraphStore) :
+- instances par classe, hiérarchie rdfs:subClassOf comprise (`instances`) ;
+- types explicites de chaque entité (`types`) ;
+- pour les propriétés indexées, liens sujet -> objets et objet -> sujets
+  (`objects` / `subjects`) : donnéPar (utilisateur -> avis), avoirTicket
+  (voyageur -> ticket), seTrouve (infrastructure -> événements), effectue
+  (utilisateur -> trajet), ainsi que les littéraux affichés par les listes.
+
+Les endpoints concernés répondent à partir de ces index sans aller-retour HTTP ;
+Fuseki reste la source de vérité : `check()` compare les effectifs des index à
+ceux de Fuseki pour détecter une dérive, `rebuild()` reconstruit tout.
+"""
+import threading
+import time
+from typing import Any, Iterable
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF
+
+from inference import TRIVIAL_TYPES, is_schema, subclass_closure
+
+
+class ReadModel:
+
+    def __init__(self, graph: Graph, namespace: str, properties: Iterable[URIRef]):
+        self.graph = graph
+        self.namespace = str(namespace)       # classes comparées à Fuseki par check()
+        self.properties = set(properties)
+        self._lock = threading.Lock()
+        self._supers: dict[URIRef, set] = {}
+        self._types: dict[URIRef, set] = {}       # entité -> types explicites
+        self._instances: dict[URIRef, set] = {}   # classe -> entités (sous-classes comprises)
+        self._out: dict[URIRef, dict] = {p: {} for p in self.properties}   # p -> s -> {o}
+        self._in: dict[URIRef, dict] = {p: {} for p in self.properties}    # p -> o -> {s}
+        self.stats = {"rebuilds": 0, "last_rebuild_ms": 0.0, "deltas": 0, "last_check": None}
+
+    # ------------------------------------------------------------------
+    # Construction / mise à jour
+    # ------------------------------------------------------------------
+
+    def rebuild(self, graph: Graph | None = None):
+        """Reconstruit tous les index à partir du graphe (appelé sous le verrou du store ou au démarrage)."""
+        graph = self.graph if graph is None else graph
+        started = time.perf_counter()
+        supers: dict[URIRef, set] = {}
+        for sub, _, sup in subclass_closure(graph):
+            supers.setdefault(sub, set()).add(sup)
+        types: dict[URIRef, set] = {}
+        for s, o in graph.subject_objects(RDF.type):
+            if isinstance(s, URIRef) and isinstance(o, URIRef):
+                types.setdefault(s, set()).add(o)
+        out = {p: {} for p in self.properties}
+        inv = {p: {} for p in self.properties}
+        for p in self.properties:
+            for s, o in graph.subject_objects(p):
+                out[p].setdefault(s, set()).add(o)
+                inv[p].setdefault(o, set()).add(s)
+
+        with self._lock:
+            self._supers, self._types, self._out, self._in = supers, types, out, inv
+            self._instances = {}
+            for s, classes in types.items():
+                for c in self._closure(classes):
+                    self._instances.setdefault(c, set()).add(s)
+        self.stats["rebuilds"] += 1
+        self.stats["last_rebuild_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def on_change(self, added: list, removed: list, version: int):
+        """Abonné du store : applique le delta (le graphe est déjà à jour)."""
+        if any(is_schema(t) for t in (*added, *removed)):
+            self.rebuild()
+            return
+        with self._lock:
+            retyped = set()
+            for triples, add in ((added, True), (removed, False)):
+                for s, p, o in triples:
+                    if p == RDF.type and isinstance(s, URIRef) and isinstance(o, URIRef):
+                        retyped.add(s)
+                    elif p in self.properties:
+                        self._link(self._out[p], s, o, add)
+                        self._link(self._in[p], o, s, add)
+            for s in retyped:
+                before = self._closure(self._types.get(s, ()))
+                types = {o for o in self.graph.objects(s, RDF.type) if isinstance(o, URIRef)}
+                if types:
+                    self._types[s] = types
+                else:
+                    self._types.pop(s, None)
+                after = self._closure(types)
+                for c in before - after:
+                    self._link(self._instances, c, s, False)
+                for c in after - before:
+                    self._link(self._instances, c, s, True)
+        self.stats["deltas"] += 1
+
+    def _closure(self, classes: Iterable[URIRef]) -> set:
+        out = set()
+        for c in classes:
+            out |= self._supers.get(c, {c})
+        return out - TRIVIAL_TYPES
+
+    @staticmethod
+    def _link(index: dict, key, value, add: bool):
+        if add:
+            index.setdefault(key, set()).add(value)
+            return
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def instances(self, cls: URIRef) -> set:
+        with self._lock:
+            return set(self._instances.get(cls, ()))
+
+    def types(self, s: URIRef) -> set:
+        with self._lock:
+            return set(self._types.get(s, ()))
+
+    def objects(self, s: URIRef, p: URIRef) -> set:
+        with self._lock:
+            return set(self._out[p].get(s, ()))
+
+    def subjects(self, p: URIRef, o=None) -> set:
+        """Sujets liés à `o` par `p` ; avec `o=None`, tous les sujets portant `p`."""
+        with self._lock:
+            if o is None:
+                return set(self._out[p])
+            return set(self._in[p].get(o, ()))
+
+    def pairs(self, p: URIRef) -> list[tuple]:
+        with self._lock:
+            return [(s, o) for s, objs in self._out[p].items() for o in objs]
+
+    def class_sizes(self) -> dict[URIRef, int]:
+        """Nombre d'instances par classe, sous-classes comprises (taille des index, sans parcours)."""
+        with self._lock:
+            return {c: len(members) for c, members in self._instances.items()}
+
+    # ------------------------------------------------------------------
+    # Cohérence avec Fuseki
+    # ------------------------------------------------------------------
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        """Effectifs des index : types explicites par classe (du namespace), triples par propriété."""
+        with self._lock:
+            classes: dict[str, int] = {}
+            for types in self._types.values():
+                for c in types:
+                    if str(c).startswith(self.namespace):
+                        classes[str(c)] = classes.get(str(c), 0) + 1
+            properties = {str(p): sum(len(o) for o in self._out[p].values()) for p in self.properties}
+        return {"classes": classes, "properties": properties}
+
+    def count_queries(self) -> tuple[str, str]:
+        """Requêtes SPARQL donnant les mêmes effectifs côté Fuseki (graphe par défaut)."""
+        values = " ".join(f"<{p}>" for p in sorted(self.properties))
+        return (
+            "SELECT ?c (COUNT(DISTINCT ?s) AS ?n) WHERE { ?s a ?c . "
+            f'FILTER(isIRI(?s) && STRSTARTS(STR(?c), "{self.namespace}")) }} GROUP BY ?c',
+            f"SELECT ?p (COUNT(*) AS ?n) WHERE {{ VALUES ?p {{ {values} }} ?s ?p ?o . }} GROUP BY ?p",
+        )
+
+    def check(self, remote_classes: dict[str, int], remote_properties: dict[str, int]) -> dict[str, Any]:
+        """Compare les effectifs locaux et distants ; renvoie les écarts (vide si cohérent)."""
+        local = self.counts()
+        drift = {}
+        for kind, remote in (("classes", remote_classes), ("properties", remote_properties)):
+            for key in sorted(set(local[kind]) | set(remote)):
+                here, there = local[kind].get(key, 0), remote.get(key, 0)
+                if here != there:
+                    drift[key] = {"local": here, "fuseki": there}
+        report = {
+            "consistent": not drift,
+            "drift": drift,
+            "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.stats["last_check"] = report
+        return report
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            entities = len(self._types)
+            links = {str(p).split("#")[-1]: sum(len(o) for o in self._out[p].values()) for p in self.properties}
+        return {**self.stats, "entities": entities, "links": links}
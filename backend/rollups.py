@@ -0,0 +1,146 @@
+# rollups.py
+"""
+Agrégats pré-calculés (rollups), maintenus à chaque écriture du graphe local.
+
+Chaque entité produit des « faits » `(métrique, dimensions, fenêtre, valeur)` ;
+par exemple un événement donne `("events", (type, infrastructure), fenêtre, 1)`
+et une statistique de pollution `("pollution", (observateur,), fenêtre, taux)`.
+Une cellule `(métrique, dimensions, fenêtre)` cumule effectif et somme.
+
+À chaque modification, les faits des entités touchées sont recalculés et seule
+la différence avec leurs faits précédents est appliquée aux cellules : un ajout,
+une suppression ou une correction coûte O(faits de l'entité). Une requête
+(regroupement + fenêtres plus larges) ne parcourt que les cellules, jamais les triples.
+
+Les fenêtres de base font `bucket` secondes ; une requête peut demander un
+multiple de cette largeur. Les entités sans horodatage tombent dans la fenêtre None.
+"""
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+Fact = tuple  # (métrique, dimensions, fenêtre, valeur)
+
+
+class Rollups:
+
+    def __init__(self, metrics: dict[str, list[str]], facts: Callable[[Any], list[tuple]],
+                 links: Iterable = (), bucket: int = 3600):
+        self.metrics = metrics          # métrique -> noms des dimensions
+        self.facts = facts              # entité -> [(métrique, dimensions, horodatage | None, valeur)]
+        self.links = set(links)         # prédicats dont l'objet est aussi une entité touchée
+        self.bucket = bucket
+        self._lock = threading.Lock()
+        self._facts: dict[Any, list[Fact]] = {}
+        self._cells: dict[tuple, list] = {}   # (métrique, dimensions, fenêtre) -> [effectif, somme]
+        self.stats = {"rebuilds": 0, "last_rebuild_ms": 0.0, "deltas": 0, "last_delta_ms": 0.0}
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def rebuild(self, entities: Iterable):
+        started = time.perf_counter()
+        with self._lock:
+            self._facts, self._cells = {}, {}
+            for entity in entities:
+                self._refresh(entity)
+        self.stats["rebuilds"] += 1
+        self.stats["last_rebuild_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def on_change(self, added: list, removed: list, version: int):
+        """Abonné du store (sous le verrou du graphe, après le magasin de statistiques)."""
+        started = time.perf_counter()
+        touched = set()
+        for s, p, o in (*added, *removed):
+            touched.add(s)
+            if p in self.links:
+                touched.add(o)
+        with self._lock:
+            for entity in touched:
+                self._refresh(entity)
+        self.stats["deltas"] += 1
+        self.stats["last_delta_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _refresh(self, entity):
+        new = [(m, dims, self._bucket(ts), value) for m, dims, ts, value in self.facts(entity)]
+        old = self._facts.get(entity, [])
+        if new == old:
+            return
+        for fact in old:
+            self._apply(fact, -1)
+        for fact in new:
+            self._apply(fact, 1)
+        if new:
+            self._facts[entity] = new
+        else:
+            self._facts.pop(entity, None)
+
+    def _bucket(self, ts: float | None) -> int | None:
+        return None if ts is None else int(ts // self.bucket)
+
+    def _apply(self, fact: Fact, sign: int):
+        metric, dims, bucket, value = fact
+        key = (metric, dims, bucket)
+        cell = self._cells.setdefault(key, [0, 0.0])
+        cell[0] += sign
+        cell[1] += sign * value
+        if cell[0] == 0:
+            del self._cells[key]
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+
+    def query(self, metric: str, group_by: list[str] = (), bucket: int | None = None,
+              start: float | None = None, end: float | None = None) -> list[dict[str, Any]]:
+        """
+        Regroupe les cellules d'une métrique par dimensions (`group_by`) et, avec `bucket`
+        (multiple de la fenêtre de base, en secondes), par fenêtre de temps.
+        """
+        names = self.metrics[metric]
+        unknown = [d for d in group_by if d not in names]
+        if unknown:
+            raise ValueError(f"Dimension(s) inconnue(s) pour '{metric}' : {unknown}. Disponibles : {names}")
+        if bucket is not None and (bucket < self.bucket or bucket % self.bucket):
+            raise ValueError(f"La fenêtre doit être un multiple de {self.bucket} s.")
+        positions = [names.index(d) for d in group_by]
+        factor = bucket // self.bucket if bucket else None
+        windowed = start is not None or end is not None
+
+        with self._lock:
+            cells = [(k, list(v)) for k, v in self._cells.items() if k[0] == metric]
+
+        groups: dict[tuple, list] = {}
+        for (_, dims, base), (count, total) in cells:
+            if windowed:
+                if base is None:
+                    continue
+                if start is not None and (base + 1) * self.bucket <= start:
+                    continue
+                if end is not None and base * self.bucket >= end:
+                    continue
+            window = None if factor is None or base is None else base // factor
+            key = (window, tuple(dims[i] for i in positions))
+            acc = groups.setdefault(key, [0, 0.0])
+            acc[0] += count
+            acc[1] += total
+
+        rows = []
+        for (window, dims), (count, total) in sorted(groups.items(), key=lambda kv: _sort_key(*kv[0])):
+            row: dict[str, Any] = {}
+            if factor is not None:
+                row["start"] = None if window is None else window * bucket
+            row.update(zip(group_by, dims))
+            row.update({"count": count, "sum": round(total, 6), "mean": round(total / count, 6) if count else None})
+            rows.append(row)
+        return rows
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "bucket_s": self.bucket, "entities": len(self._facts), "cells": len(self._cells)}
+
+
+def _sort_key(window: int | None, dims: tuple) -> tuple:
+    # Valeurs absentes (fenêtre ou dimension None) en dernier
+    return (window is None, window or 0, tuple((d is None, d or "") for d in dims))
@@ -0,0 +1,131 @@
+# rwlock.py
+"""
+Verrou lecteurs / rédacteur du graphe local.
+
+Les lectures (copie pour le raisonneur, reconstruction des index, parcours pour les
+agrégats) se font en parallèle ; une écriture attend la fin des lectures en cours
+puis s'exécute seule. Un rédacteur en attente est prioritaire sur les nouveaux
+lecteurs : un flux continu de lectures ne peut pas affamer les écritures.
+
+Réentrance :
+- le rédacteur peut reprendre le verrou en écriture (run_locked -> apply) ou en
+  lecture (abonnés qui relisent le graphe pendant la notification) ;
+- un lecteur peut reprendre le verrou en lecture ;
+- passer de lecture à écriture est refusé (RuntimeError) : deux lecteurs qui
+  voudraient écrire s'attendraient mutuellement.
+
+`get_stats()` expose la contention : acquisitions, attentes, durée d'attente
+moyenne / max par mode, durée max de détention en écriture.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+
+class RWLock:
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: int | None = None      # thread détenteur du verrou en écriture
+        self._write_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()      # profondeur de lecture du thread courant
+        self.counters = {
+            mode: {"acquired": 0, "contended": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for mode in ("read", "write")
+        }
+        self.counters["write"]["hold_ms_max"] = 0.0
+
+    @contextmanager
+    def read(self):
+        """Verrou partagé : plusieurs lecteurs simultanés, aucun rédacteur."""
+        me = threading.get_ident()
+        depth = getattr(self._local, "reads", 0)
+        if self._writer == me or depth:
+            # Déjà détenteur (en écriture ou en lecture) : pas de nouvelle attente
+            self._local.reads = depth + 1
+            try:
+                yield
+            finally:
+                self._local.reads = depth
+            return
+
+        started = time.perf_counter()
+        with self._cond:
+            contended = self._writer is not None or self._writers_waiting > 0
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+            self._record("read", started, contended)
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Verrou exclusif (réentrant pour le thread qui le détient)."""
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+            return
+        if getattr(self._local, "reads", 0):
+            raise RuntimeError("Écriture demandée sous un verrou de lecture du graphe")
+
+        started = time.perf_counter()
+        with self._cond:
+            contended = self._writer is not None or self._readers > 0
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer, self._write_depth = me, 1
+            self._record("write", started, contended)
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._cond:
+                held_ms = (time.perf_counter() - acquired) * 1000
+                stats = self.counters["write"]
+                stats["hold_ms_max"] = max(stats["hold_ms_max"], round(held_ms, 3))
+                self._writer, self._write_depth = None, 0
+                self._cond.notify_all()
+
+    def _record(self, mode: str, started: float, contended: bool):
+        """Compteurs d'acquisition (appelé sous self._cond)."""
+        waited_ms = (time.perf_counter() - started) * 1000
+        stats = self.counters[mode]
+        stats["acquired"] += 1
+        if contended:
+            stats["contended"] += 1
+            stats["wait_ms_total"] += waited_ms
+            stats["wait_ms_max"] = max(stats["wait_ms_max"], round(waited_ms, 3))
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._cond:
+            out = {
+                "readers": self._readers,
+                "writer_active": self._writer is not None,
+                "writers_waiting": self._writers_waiting,
+            }
+            for mode, stats in self.counters.items():
+                out[mode] = {
+                    **stats,
+                    "wait_ms_total": round(stats["wait_ms_total"], 3),
+                    "wait_ms_avg": round(stats["wait_ms_total"] / stats["contended"], 3) if stats["contended"] else 0.0,
+                }
+        return out
@@ -0,0 +1,85 @@
+# startup.py
+"""
+Démarrage non bloquant de l'application.
+
+Rien de coûteux ne se fait à l'import : le serveur accepte les connexions tout de
+suite, et le lifespan FastAPI lance les phases de démarrage en tâche de fond :
+
+- phases bloquantes (chargement du graphe local, construction des index), exécutées
+  dans l'ordre ; tant qu'elles ne sont pas terminées, l'API répond 503 + Retry-After
+  (sauf `/health/*`) ;
+- phases d'arrière-plan (synchro Fuseki, inférences), lancées en parallèle une fois
+  l'application prête ; elles mettent le graphe à jour comme des écritures ordinaires.
+
+`/health/live` répond dès le lancement du processus, `/health/ready` passe à 200 quand
+les phases bloquantes ont abouti ; `status()` détaille la durée et l'erreur de chaque phase.
+"""
+import asyncio
+import time
+from typing import Any, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+Phase = tuple[str, Callable[[], Any]]  # (nom, fonction bloquante)
+
+
+class Startup:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.ready = False
+        self.ready_after_s: float | None = None
+        self.error: str | None = None
+        self.phases: dict[str, dict[str, Any]] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self, blocking: list[Phase], background: list[Phase]):
+        """Lance le démarrage en tâche de fond (à appeler depuis le lifespan)."""
+        self.started = time.monotonic()
+        for name, _ in (*blocking, *background):
+            self.phases[name] = {"status": "pending", "elapsed_s": None, "error": None}
+        self._task = asyncio.create_task(self._run(blocking, background))
+
+    async def _run(self, blocking: list[Phase], background: list[Phase]):
+        try:
+            for name, fn in blocking:
+                await self.phase(name, fn)
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Démarrage interrompu : {e}")
+            return
+        self.ready = True
+        self.ready_after_s = round(time.monotonic() - self.started, 3)
+        print(f"✅ Application prête en {self.ready_after_s}s.")
+        # Une phase d'arrière-plan en échec n'empêche pas les autres (erreur visible dans status())
+        await asyncio.gather(*(self.phase(name, fn) for name, fn in background), return_exceptions=True)
+
+    async def phase(self, name: str, fn: Callable[[], Any]) -> Any:
+        """Exécute une phase bloquante dans le pool de threads et enregistre sa durée."""
+        entry = self.phases.setdefault(name, {"status": "pending", "elapsed_s": None, "error": None})
+        entry["status"] = "running"
+        started = time.monotonic()
+        try:
+            result = await run_in_threadpool(fn)
+        except Exception as e:
+            entry.update(status="failed", error=str(e))
+            print(f"⚠️ Phase de démarrage « {name} » en échec : {e}")
+            raise
+        finally:
+            entry["elapsed_s"] = round(time.monotonic() - started, 3)
+        entry["status"] = "done"
+        return result
+
+    async def wait(self):
+        """Attend la fin de toutes les phases (arrêt : les threads en cours ne sont pas interruptibles)."""
+        if self._task is not None:
+            await self._task
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "ready_after_s": self.ready_after_s,
+            "uptime_s": round(time.monotonic() - self.started, 3),
+            "error": self.error,
+            "phases": self.phases,
+        }
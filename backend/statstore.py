@@ -0,0 +1,410 @@
+# statstore.py
+"""
+Stockage en colonnes des statistiques numériques (pollution, accidents).
+
+Au lieu d'un triple `Literal` rdflib par mesure, chaque statistique occupe une
+ligne de colonnes NumPy projetées en mémoire depuis le disque (`np.memmap`) :
+
+    kind      uint8    1 = StatistiquePollution, 2 = statistiqueAccident
+    valid     uint8    0 = ligne supprimée
+    value     float64  ex:tauxPollution / ex:nbreDaccident
+    ts        float64  ex:horodatage (secondes epoch, NaN si inconnu)
+    observer  int32    dernier utilisateur `ex:observe` (code, -1 si aucun)
+
+Les identifiants (et les observateurs) sont codés par deux dictionnaires
+en ajout seul (`ids.txt`, `observers.txt`, une ligne JSON par code) : la ligne i
+du fichier d'identifiants correspond à la ligne i des colonnes.
+
+Le magasin est abonné au GraphStore : les triples numériques écrits dans le
+graphe local (endpoints, import en masse, rejeu du journal) sont absorbés dans
+les colonnes puis retirés du graphe servi (`GraphStore.detach` : ils restent dans
+le snapshot et le journal, d'où les colonnes sont reconstruites). Seules les valeurs
+d'une entité typée statistique (ou sous-classe : StatistiquePollution...) vont dans
+les colonnes ; celles d'une entité pas (encore) typée restent dans le graphe servi et
+sont absorbées à l'arrivée du type (import en masse par lots, par exemple). Le store
+garde les triples retirés (`GraphStore.detached`) : supprimer une statistique retire
+aussi ses valeurs du journal (voir deletion.py), elles ne reviennent pas au redémarrage.
+`triples()` restitue les valeurs des colonnes sous forme RDF (vue virtuelle) et
+`aggregate()` calcule min / max / moyenne / percentiles par fenêtre de temps
+directement sur les tableaux, sans objet Python par ligne.
+
+Avec `path=None`, les colonnes restent en mémoire (tableaux NumPy ordinaires) : c'est
+le cas des workers qui ne sont pas propriétaires du store, un seul processus écrivant
+dans les fichiers de colonnes.
+"""
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterator
+
+import numpy as np
+from rdflib import Literal, Namespace
+from rdflib.namespace import RDF, XSD
+
+from inference import is_schema, subclass_closure
+
+KINDS = {"pollution": 1, "accident": 2}
+
+COLUMNS = {
+    "kind": np.uint8,
+    "valid": np.uint8,
+    "value": np.float64,
+    "ts": np.float64,
+    "observer": np.int32,
+}
+
+
+class StatStore:
+
+    def __init__(self, path: str | None, store, namespace: Namespace, capacity: int = 1024):
+        self.path = path
+        self.store = store                       # GraphStore dont on retire les triples numériques
+        self.graph = store.graph
+        self.ex = namespace
+        self.value_predicates = {
+            self.ex.tauxPollution: (KINDS["pollution"], self.ex.StatistiquePollution, XSD.float),
+            self.ex.nbreDaccident: (KINDS["accident"], self.ex.statistiqueAccident, XSD.integer),
+        }
+        self.absorbed = set(self.value_predicates) | {self.ex.horodatage}
+        self._classes: set | None = None         # ex:statistique et ses sous-classes (ontologie)
+        self._lock = threading.Lock()
+        self._cols: dict[str, np.ndarray] = {}
+        self._count = 0
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}          # identifiant -> ligne (lignes valides)
+        self._observers: list[str] = []
+        self._observer_codes: dict[str, int] = {}
+        self._ids_file = self._observers_file = None
+        if path is None:
+            self._map(capacity)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._load(capacity)
+
+    # ------------------------------------------------------------------
+    # Fichiers
+    # ------------------------------------------------------------------
+
+    def _load(self, capacity: int):
+        self._ids = self._read_lines("ids.txt")
+        self._observers = self._read_lines("observers.txt")
+        self._observer_codes = {o: i for i, o in enumerate(self._observers)}
+        self._count = len(self._ids)
+        self._map(max(capacity, self._count))
+        valid = self._cols["valid"]
+        self._rows = {stat_id: i for i, stat_id in enumerate(self._ids) if valid[i]}
+        self._ids_file = open(os.path.join(self.path, "ids.txt"), "a", encoding="utf-8")
+        self._observers_file = open(os.path.join(self.path, "observers.txt"), "a", encoding="utf-8")
+
+    def _read_lines(self, name: str) -> list[str]:
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            # Une ligne tronquée (crash pendant l'écriture) est ignorée
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def _map(self, capacity: int):
+        """(Re)projette chaque colonne en mémoire avec au moins `capacity` lignes."""
+        for name, dtype in COLUMNS.items():
+            if self.path is None:
+                old = self._cols.get(name)
+                col = np.full(capacity, -1 if name == "observer" else 0, dtype=dtype)
+                if old is not None:
+                    col[:len(old)] = old
+                self._cols[name] = col
+                continue
+            path = os.path.join(self.path, f"{name}.col")
+            itemsize = np.dtype(dtype).itemsize
+            size = os.path.getsize(path) // itemsize if os.path.exists(path) else 0
+            if name in self._cols:
+                self._cols[name].flush()
+            if size < capacity:
+                with open(path, "ab") as f:
+                    f.truncate(capacity * itemsize)
+            col = np.memmap(path, dtype=dtype, mode="r+", shape=(max(size, capacity),))
+            if name == "observer" and size < capacity:
+                col[size:] = -1
+            self._cols[name] = col
+
+    def flush(self):
+        if self.path is None:
+            return
+        with self._lock:
+            for col in self._cols.values():
+                col.flush()
+
+    def close(self):
+        self.flush()
+        for f in (self._ids_file, self._observers_file):
+            if f is not None:
+                f.close()
+
+    # ------------------------------------------------------------------
+    # Écritures
+    # ------------------------------------------------------------------
+
+    def _row(self, stat_id: str) -> int:
+        row = self._rows.get(stat_id)
+        if row is not None:
+            return row
+        if self._count >= len(self._cols["kind"]):
+            self._map(2 * len(self._cols["kind"]))
+        row = self._count
+        for name in COLUMNS:
+            self._cols[name][row] = -1 if name == "observer" else 0
+        self._cols["ts"][row] = math.nan
+        if self._ids_file is not None:
+            self._ids_file.write(json.dumps(stat_id, ensure_ascii=False) + "\n")
+            self._ids_file.flush()
+        self._ids.append(stat_id)
+        self._rows[stat_id] = row
+        self._count += 1
+        return row
+
+    def _observer_code(self, user_id: str) -> int:
+        code = self._observer_codes.get(user_id)
+        if code is None:
+            code = len(self._observers)
+            if self._observers_file is not None:
+                self._observers_file.write(json.dumps(user_id, ensure_ascii=False) + "\n")
+                self._observers_file.flush()
+            self._observers.append(user_id)
+            self._observer_codes[user_id] = code
+        return code
+
+    def put(self, stat_id: str, kind: int | None = None, value: float | None = None,
+            ts: float | None = None, observer: str | None = None):
+        with self._lock:
+            row = self._row(stat_id)
+            if kind is not None:
+                self._cols["kind"][row] = kind
+            if value is not None:
+                self._cols["value"][row] = value
+            if ts is not None:
+                self._cols["ts"][row] = ts
+            if observer is not None:
+                self._cols["observer"][row] = self._observer_code(observer)
+            self._cols["valid"][row] = 1
+
+    def discard(self, stat_id: str) -> bool:
+        with self._lock:
+            row = self._rows.pop(stat_id, None)
+            if row is None:
+                return False
+            self._cols["valid"][row] = 0
+            return True
+
+    # ------------------------------------------------------------------
+    # Abonné du graphe local
+    # ------------------------------------------------------------------
+
+    def local(self, term) -> str | None:
+        value = str(term)
+        return value[len(str(self.ex)):] if value.startswith(str(self.ex)) else None
+
+    def stat_classes(self) -> set:
+        """ex:statistique et ses sous-classes, d'après l'ontologie du graphe (mise en cache)."""
+        if self._classes is None:
+            self._classes = {self.ex.statistique} | {
+                sub for sub, _, sup in subclass_closure(self.graph) if sup == self.ex.statistique
+            }
+        return self._classes
+
+    def is_stat(self, s) -> bool:
+        classes = self.stat_classes()
+        return any(o in classes for o in self.graph.objects(s, RDF.type))
+
+    def absorb(self, added: list | None = None):
+        """
+        Déplace les triples numériques (valeur, horodatage) des statistiques du graphe vers
+        les colonnes. Sans `added`, parcourt tout le graphe (démarrage, après le rejeu du journal).
+        Les triples d'une entité qui n'est pas (encore) une statistique restent dans le graphe.
+        """
+        graph = self.graph
+        if added is None:
+            triples = [t for p in self.absorbed for t in graph.triples((None, p, None))]
+        else:
+            triples = [t for t in added if t[1] in self.absorbed]
+        moved = []
+        for s, p, o in triples:
+            stat_id = self.local(s)
+            if stat_id is None or not self.is_stat(s):
+                continue   # autre entité (horodatage d'un événement...) ou type pas encore arrivé
+            if p == self.ex.horodatage:
+                self.put(stat_id, ts=to_epoch(o))
+            else:
+                kind = self.value_predicates[p][0]
+                self.put(stat_id, kind=kind, value=float(o.toPython()))
+            moved.append((s, p, o))
+        self.store.detach(moved)
+        if added is None:
+            # Statistiques supprimées pendant l'arrêt (par un autre processus) : lignes invalidées
+            for stat_id in list(self._rows):
+                if not self.is_stat(self.ex[stat_id]):
+                    self.discard(stat_id)
+            for u, s in graph.subject_objects(self.ex.observe):
+                self._observe(u, s)
+
+    def _observe(self, user, stat):
+        stat_id, user_id = self.local(stat), self.local(user)
+        if stat_id in self._rows and user_id is not None:
+            self.put(stat_id, observer=user_id)
+
+    def on_change(self, added: list, removed: list, version: int):
+        """Abonné du store (sous le verrou du graphe) : absorbe les valeurs, suit types, suppressions et observations."""
+        if any(is_schema(t) for t in (*added, *removed)):
+            self._classes = None
+        if added:
+            # Entités devenues statistiques : leurs valeurs arrivées avant le type sont absorbées
+            typed = {s for s, p, o in added if p == RDF.type and o in self.stat_classes()}
+            waiting = [t for s in typed for p in self.absorbed for t in self.graph.triples((s, p, None))]
+            self.absorb(list(dict.fromkeys([*waiting, *added])))
+            for s, p, o in added:
+                if p == self.ex.observe:
+                    self._observe(s, o)
+        for s, p, o in removed:
+            if p == RDF.type and o in self.stat_classes() and not self.is_stat(s):
+                self.discard(self.local(s) or "")
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """Vues des colonnes limitées aux lignes écrites."""
+        with self._lock:
+            return {name: col[:self._count] for name, col in self._cols.items()}
+
+    def get(self, stat_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._rows.get(stat_id)
+            if row is None:
+                return None
+            return self._record(row)
+
+    def raw(self, stat_id: str) -> tuple[int, float, float | None, str | None] | None:
+        """(type, valeur, horodatage epoch, observateur) d'une statistique, sans mise en forme."""
+        with self._lock:
+            row = self._rows.get(stat_id)
+            if row is None:
+                return None
+            ts = float(self._cols["ts"][row])
+            observer = int(self._cols["observer"][row])
+            return (
+                int(self._cols["kind"][row]),
+                float(self._cols["value"][row]),
+                None if math.isnan(ts) else ts,
+                self._observers[observer] if observer >= 0 else None,
+            )
+
+    def _record(self, row: int) -> dict[str, Any]:
+        kind = int(self._cols["kind"][row])
+        value = float(self._cols["value"][row])
+        ts = float(self._cols["ts"][row])
+        observer = int(self._cols["observer"][row])
+        return {
+            "id": self._ids[row],
+            "tauxPollution": value if kind == KINDS["pollution"] else None,
+            "nbreDaccident": int(value) if kind == KINDS["accident"] else None,
+            "horodatage": None if math.isnan(ts) else datetime.fromtimestamp(ts).astimezone().isoformat(),
+            "observateur": self._observers[observer] if observer >= 0 else None,
+        }
+
+    def records(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [self._record(row) for row in self._rows.values()]
+
+    def triples(self, stat_id: str | None = None) -> Iterator[tuple]:
+        """Vue RDF virtuelle : triples de valeur et d'horodatage, générés depuis les colonnes."""
+        with self._lock:
+            rows = list(self._rows.items()) if stat_id is None else \
+                [(stat_id, self._rows[stat_id])] if stat_id in self._rows else []
+            kinds = {k: (p, datatype) for p, (k, _, datatype) in self.value_predicates.items()}
+            for sid, row in rows:
+                s = self.ex[sid]
+                kind = int(self._cols["kind"][row])
+                if kind in kinds:
+                    p, datatype = kinds[kind]
+                    value = float(self._cols["value"][row])
+                    yield s, p, Literal(int(value) if datatype == XSD.integer else value, datatype=datatype)
+                ts = float(self._cols["ts"][row])
+                if not math.isnan(ts):
+                    yield s, self.ex.horodatage, Literal(datetime.fromtimestamp(ts).astimezone(), datatype=XSD.dateTime)
+
+    def aggregate(self, kind: int, start: float | None = None, end: float | None = None,
+                  window: float | None = None, percentiles: list[float] = ()) -> list[dict[str, Any]]:
+        """
+        Agrégats vectorisés (count / min / max / mean / percentiles) des valeurs d'un type,
+        globalement ou par fenêtre de `window` secondes entre `start` et `end`.
+        """
+        cols = self.columns()
+        mask = (cols["valid"] == 1) & (cols["kind"] == kind)
+        ts = cols["ts"]
+        if start is not None:
+            mask &= ts >= start
+        if end is not None:
+            mask &= ts < end
+        if window is not None:
+            mask &= ~np.isnan(ts)
+        values = np.asarray(cols["value"][mask])
+        if not len(values):
+            return []
+
+        if window is None:
+            buckets = np.zeros(len(values), dtype=np.int64)
+            origin = None
+        else:
+            times = np.asarray(ts[mask])
+            origin = start if start is not None else float(np.floor(times.min() / window) * window)
+            buckets = ((times - origin) // window).astype(np.int64)
+
+        # Tri par (fenêtre, valeur) : chaque fenêtre devient un segment trié contigu
+        order = np.lexsort((values, buckets))
+        values, buckets = values[order], buckets[order]
+        keys, starts, counts = np.unique(buckets, return_index=True, return_counts=True)
+
+        result = {
+            "count": counts,
+            "min": values[starts],
+            "max": values[starts + counts - 1],
+            "mean": np.add.reduceat(values, starts) / counts,
+        }
+        for q in percentiles:
+            # Interpolation linéaire (méthode par défaut de np.percentile), calculée par segment
+            pos = starts + (counts - 1) * (q / 100.0)
+            low = np.floor(pos).astype(np.int64)
+            high = np.minimum(low + 1, starts + counts - 1)
+            frac = pos - low
+            result[f"p{q:g}"] = values[low] * (1 - frac) + values[high] * frac
+
+        out = []
+        for i, key in enumerate(keys):
+            row = {name: (int(col[i]) if name == "count" else round(float(col[i]), 6)) for name, col in result.items()}
+            if origin is not None:
+                row = {"start": origin + int(key) * window, "end": origin + (int(key) + 1) * window, **row}
+            out.append(row)
+        return out
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": self._count,
+                "live": len(self._rows),
+                "capacity": len(self._cols["kind"]),
+                "observers": len(self._observers),
+                "bytes_on_disk": sum(col.nbytes for col in self._cols.values()),
+            }
+
+
+def to_epoch(term) -> float:
+    value = term.toPython() if isinstance(term, Literal) else term
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return time.time()
@@ -0,0 +1,397 @@
+# sync.py
+"""
+Synchronisation incrémentale Fuseki → graphe local.
+
+Plusieurs processus (workers, autres instances de l'API) écrivent dans le même
+Fuseki ; chacun tient un graphe local. Plutôt que de retélécharger tout le graphe
+par défaut, chaque processus publie après ses écritures une entrée dans un graphe
+nommé « journal des transactions » (`log_graph`) :
+
+    <urn:smartcity:tx:<origine>:<instance>:<n>> tx:at NOW() ; tx:origin "<origine>" ;
+                                                 tx:subject <s1>, <s2> ...     (ou tx:full true)
+
+L'horodatage est celui de Fuseki (NOW()), commun à tous les processus. Les autres
+processus interrogent périodiquement ce journal au-delà de leur marque haute
+(`hwm`, dernier horodatage vu) et ne relisent que les sujets modifiés
+(`VALUES ?s { ... } ?s ?p ?o`). Une fenêtre de recouvrement (`overlap`) relit les
+entrées récentes, dédoublonnées par IRI, pour ne pas manquer une transaction validée
+après une autre plus récente.
+
+Le delta de chaque sujet est appliqué via `GraphStore.apply` : graphe local, journal
+(donc snapshot) et abonnés suivent comme pour une écriture ordinaire, sans être
+republiés dans le journal des transactions.
+
+Repli sur une synchro complète (téléchargement en flux du graphe par défaut puis
+alignement par différence) : premier démarrage, marque haute plus ancienne que la
+rétention du journal, entrée `tx:full` (import en masse), ou à la demande.
+
+Les workers d'un même nœud partagent le store (journal commun, voir persistence.py) :
+ils ont la même origine, dérivée de l'hôte et du fichier d'état, si bien que leurs
+transactions ne sont pas relues par le nœud ; seul le propriétaire du store interroge
+le journal des transactions, les autres reçoivent les deltas par le journal local.
+L'instant de la dernière synchro réussie est enregistré dans le fichier d'état :
+`synced_at()` le donne à tous les workers, synchronisés ou non eux-mêmes.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+
+from rdflib import BNode, Graph, Literal, Namespace, URIRef
+
+TX = Namespace("http://example.org/txlog#")
+Triple = tuple
+
+
+def has_bnode(triple: Triple) -> bool:
+    return any(isinstance(term, BNode) for term in triple)
+
+
+def binding_term(value: dict):
+    """Terme rdflib d'un binding SPARQL JSON."""
+    if value["type"] == "uri":
+        return URIRef(value["value"])
+    if value["type"] == "bnode":
+        return BNode(value["value"])
+    datatype = value.get("datatype")
+    return Literal(value["value"], lang=value.get("xml:lang"), datatype=URIRef(datatype) if datatype else None)
+
+
+class GraphSync:
+
+    def __init__(self, store, client, log_graph: str, publish: Callable[[str], None], state_path: str,
+                 download_path: str, skip: Callable[[Triple], bool] = lambda t: False,
+                 download_timeout: float = 60.0, overlap: float = 10.0, retention: float = 86400.0,
+                 max_subjects: int = 500, batch_size: int = 200,
+                 deferred: Callable[[int], dict | None] = lambda version: None):
+        self.store = store
+        self.client = client              # FusekiClient (synchrone)
+        self.log_graph = log_graph
+        self.publish = publish            # envoi (sans attendre) d'un UPDATE via le coalesceur
+        self.state_path = state_path
+        self.download_path = download_path
+        self.skip = skip                  # triples gérés localement ailleurs (ontologie, colonnes de stats)
+        self.download_timeout = download_timeout
+        self.overlap = overlap
+        self.retention = retention
+        self.max_subjects = max_subjects  # au-delà, l'entrée demande une synchro complète
+        self.batch_size = batch_size
+        self.deferred = deferred          # version en attente de Fuseki -> ses données (commits.py)
+        # Origine commune aux workers du nœud, instance propre au processus (IRI des transactions)
+        node = f"{socket.gethostname()}:{os.path.abspath(state_path)}"
+        self.origin = hashlib.sha1(node.encode("utf-8")).hexdigest()[:12]
+        self.instance = uuid.uuid4().hex[:8]
+
+        self._run_lock = threading.Lock()        # une synchro à la fois
+        self._pending_lock = threading.Lock()
+        self._pending: set | None = set()        # sujets écrits localement, à publier (None = tout)
+        self._seq = 0
+        self._applying = False                   # delta venant de Fuseki : ne pas le republier
+        self._touched: set | None = None         # triples écrits localement pendant une synchro
+
+        self.hwm: str | None = None              # dernier tx:at vu (xsd:dateTime Fuseki)
+        self._seen: dict[str, str] = {}          # IRI de transaction -> tx:at (fenêtre de recouvrement)
+        self._synced: float | None = None        # dernière synchro réussie (ce worker ou le propriétaire)
+        self._state_mtime: int | None = None
+        self._load_state()
+        self.stats: dict[str, Any] = {
+            "mode": None, "polls": 0, "full_syncs": 0, "transactions": 0, "subjects": 0,
+            "added": 0, "removed": 0, "published": 0, "errors": 0, "last_error": None,
+            "last_success": None, "last_tx_lag_s": None, "last_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Côté écriture : publication du journal des transactions
+    # ------------------------------------------------------------------
+
+    def record(self, added: list, removed: list, version: int):
+        """Abonné du store : retient les sujets écrits localement (ou les triples touchés pendant une synchro)."""
+        if self._touched is not None:
+            self._touched.update(added)
+            self._touched.update(removed)
+        if self._applying or self.store.following:
+            return   # delta venant de Fuseki, ou d'un autre worker qui le publie lui-même
+        subjects = {s for s, _, _ in (*added, *removed) if isinstance(s, URIRef)}
+        write = self.deferred(version)
+        if write is not None:
+            # Pas encore dans Fuseki : annoncé par `announce` une fois le lot validé
+            write.setdefault("subjects", set()).update(subjects)
+            return
+        self.announce(subjects)
+
+    def announce(self, subjects: Iterable[URIRef]):
+        """Sujets écrits et validés par Fuseki, à publier au prochain `publish_pending`."""
+        with self._pending_lock:
+            if self._pending is None:
+                return
+            self._pending.update(subjects)
+            if len(self._pending) > self.max_subjects:
+                self._pending = None
+
+    def publish_pending(self):
+        """Publie les sujets retenus (à appeler une fois les écritures validées par Fuseki)."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        if pending is not None and not pending:
+            return
+        self._seq += 1
+        tx = URIRef(f"urn:smartcity:tx:{self.origin}:{self.instance}:{self._seq}")
+        if pending is None:
+            body = "tx:full true"
+        else:
+            body = "tx:subject " + ", ".join(s.n3() for s in sorted(pending))
+        self.publish(f"""
+        PREFIX tx: <{TX}>
+        INSERT {{ GRAPH <{self.log_graph}> {{ {tx.n3()} tx:at ?now ; tx:origin "{self.origin}" ; {body} . }} }}
+        WHERE {{ BIND(NOW() AS ?now) }}
+        """)
+        self.stats["published"] += 1
+
+    # ------------------------------------------------------------------
+    # Côté lecture : rattrapage
+    # ------------------------------------------------------------------
+
+    def catch_up(self) -> dict[str, Any]:
+        """Démarrage : incrémental depuis la marque haute si possible, sinon synchro complète."""
+        if self.hwm is None or self._age(self.hwm) > self.retention:
+            return self.full()
+        return self.poll()
+
+    def poll(self) -> dict[str, Any]:
+        """Relit les entrées du journal postérieures à la marque haute et applique les sujets modifiés."""
+        if self.hwm is None:
+            return self.full()
+        with self._run_lock:
+            started = time.perf_counter()
+            try:
+                since = self._shift(self.hwm, -self.overlap)
+                results = self.client.select(f"""
+                PREFIX tx: <{TX}>
+                PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+                SELECT ?tx ?at ?origin ?s ?full WHERE {{
+                    GRAPH <{self.log_graph}> {{
+                        ?tx tx:at ?at ; tx:origin ?origin .
+                        OPTIONAL {{ ?tx tx:subject ?s }}
+                        OPTIONAL {{ ?tx tx:full ?full }}
+                    }}
+                    FILTER(?at > "{since}"^^xsd:dateTime)
+                }} ORDER BY ?at
+                """)
+                transactions: dict[str, dict] = {}
+                for b in results["results"]["bindings"]:
+                    entry = transactions.setdefault(b["tx"]["value"], {
+                        "at": b["at"]["value"], "origin": b["origin"]["value"], "subjects": set(), "full": False,
+                    })
+                    if "s" in b:
+                        entry["subjects"].add(URIRef(b["s"]["value"]))
+                    if "full" in b:
+                        entry["full"] = True
+                new = {tx: e for tx, e in transactions.items() if tx not in self._seen}
+                remote = {tx: e for tx, e in new.items() if e["origin"] != self.origin}
+                full = any(e["full"] for e in remote.values())
+                subjects = set().union(*(e["subjects"] for e in remote.values())) if remote else set()
+            except Exception as e:
+                return self._failed(e)
+
+        if full:
+            report = self.full()
+            self._advance(new)
+            return report
+
+        with self._run_lock:
+            try:
+                added, removed = self._pull(subjects) if subjects else ([], [])
+            except Exception as e:
+                return self._failed(e)
+            self._advance(new)
+            if remote:
+                newest = max(e["at"] for e in remote.values())
+                self.stats["last_tx_lag_s"] = round(self._age(newest), 3)
+            self.stats["transactions"] += len(remote)
+            self.stats["subjects"] += len(subjects)
+            self.stats["polls"] += 1
+            return self._succeeded("incremental", added, removed, started)
+
+    def full(self) -> dict[str, Any]:
+        """Synchro complète : téléchargement en flux du graphe par défaut puis alignement par différence."""
+        with self._run_lock:
+            started = time.perf_counter()
+            print("🔄 Synchronisation complète Fuseki → graphe local ...")
+            try:
+                # Marque haute prise avant le téléchargement : les transactions suivantes seront relues
+                hwm = self._log_head()
+                self._touched = set()
+                try:
+                    size = self.client.download_data(self.download_path, deadline=self.download_timeout)
+                    remote = Graph()
+                    remote.parse(self.download_path, format="nt")
+                finally:
+                    if os.path.exists(self.download_path):
+                        os.remove(self.download_path)
+                added, removed = self.store.run_locked(lambda graph: self._align(graph, remote, None))
+            except Exception as e:
+                return self._failed(e)
+            finally:
+                self._touched = None
+            self.hwm = hwm or self.hwm or datetime.now(timezone.utc).isoformat()
+            self._save_state()
+            self.stats["full_syncs"] += 1
+            print(f"✅ Synchronisation complète : {size} octets, +{len(added)} / -{len(removed)} triples.")
+            return self._succeeded("full", added, removed, started)
+
+    def prune(self):
+        """Supprime du journal des transactions les entrées plus anciennes que la rétention."""
+        limit = self._shift(datetime.now(timezone.utc).isoformat(), -self.retention)
+        self.publish(f"""
+        PREFIX tx: <{TX}>
+        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+        DELETE {{ GRAPH <{self.log_graph}> {{ ?tx ?p ?o }} }}
+        WHERE {{ GRAPH <{self.log_graph}> {{ ?tx tx:at ?at ; ?p ?o . FILTER(?at < "{limit}"^^xsd:dateTime) }} }}
+        """)
+
+    # ------------------------------------------------------------------
+    # Alignement
+    # ------------------------------------------------------------------
+
+    def _pull(self, subjects: set) -> tuple[list, list]:
+        """Relit les triples des sujets modifiés (par lots VALUES) et aligne ces sujets."""
+        self._touched = set()
+        try:
+            remote = Graph()
+            ordered = sorted(s for s in subjects if isinstance(s, URIRef))
+            for i in range(0, len(ordered), self.batch_size):
+                values = " ".join(s.n3() for s in ordered[i:i + self.batch_size])
+                results = self.client.select(f"SELECT ?s ?p ?o WHERE {{ VALUES ?s {{ {values} }} ?s ?p ?o }}")
+                for b in results["results"]["bindings"]:
+                    remote.add((binding_term(b["s"]), binding_term(b["p"]), binding_term(b["o"])))
+            return self.store.run_locked(lambda graph: self._align(graph, remote, set(ordered)))
+        finally:
+            self._touched = None
+
+    def _align(self, graph: Graph, remote: Graph, subjects: Iterable | None) -> tuple[list, list]:
+        """Sous le verrou du store : applique la différence Fuseki / local (tous les sujets si `subjects` est None)."""
+        if subjects is None:
+            local = {t for t in graph if not has_bnode(t)}
+        else:
+            local = {t for s in subjects for t in graph.triples((s, None, None)) if not has_bnode(t)}
+        there = {t for t in remote if not has_bnode(t)}
+        touched = self._touched or set()
+        added = [t for t in there - local if t not in touched and not self.skip(t)]
+        removed = [t for t in local - there if t not in touched and not self.skip(t)]
+        self._applying = True
+        try:
+            return self.store.apply(added, removed)
+        finally:
+            self._applying = False
+
+    # ------------------------------------------------------------------
+    # Marque haute
+    # ------------------------------------------------------------------
+
+    def _log_head(self) -> str | None:
+        results = self.client.select(f"""
+        PREFIX tx: <{TX}>
+        SELECT (MAX(?at) AS ?head) WHERE {{ GRAPH <{self.log_graph}> {{ ?tx tx:at ?at }} }}
+        """)
+        bindings = results["results"]["bindings"]
+        return bindings[0]["head"]["value"] if bindings and "head" in bindings[0] else None
+
+    def _advance(self, transactions: dict[str, dict]):
+        if not transactions:
+            return
+        for tx, entry in transactions.items():
+            self._seen[tx] = entry["at"]
+            if self.hwm is None or self._epoch(entry["at"]) > self._epoch(self.hwm):
+                self.hwm = entry["at"]
+        if self.hwm is not None:
+            floor = self._epoch(self.hwm) - self.overlap
+            self._seen = {tx: at for tx, at in self._seen.items() if self._epoch(at) > floor}
+        self._save_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.hwm, self._seen = state["hwm"], dict(state.get("seen", {}))
+            self._synced = state.get("synced")
+        except (OSError, ValueError, KeyError):
+            self.hwm, self._seen = None, {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"hwm": self.hwm, "seen": self._seen, "synced": self._synced}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"⚠️ Sauvegarde de l'état de synchro impossible : {e}")
+
+    @staticmethod
+    def _epoch(value: str) -> float:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+    def _age(self, value: str) -> float:
+        return time.time() - self._epoch(value)
+
+    def _shift(self, value: str, seconds: float) -> str:
+        return datetime.fromtimestamp(self._epoch(value) + seconds, timezone.utc).isoformat()
+
+    # ------------------------------------------------------------------
+    # Métriques
+    # ------------------------------------------------------------------
+
+    def _succeeded(self, mode: str, added: list, removed: list, started: float) -> dict[str, Any]:
+        self._synced = time.time()
+        self._save_state()
+        self.stats.update(mode=mode, last_success=self._synced, last_error=None,
+                          last_ms=round((time.perf_counter() - started) * 1000, 2))
+        self.stats["added"] += len(added)
+        self.stats["removed"] += len(removed)
+        return {"mode": mode, "added": len(added), "removed": len(removed), "hwm": self.hwm}
+
+    def _failed(self, error: Exception) -> dict[str, Any]:
+        self.stats["errors"] += 1
+        self.stats["last_error"] = str(error)
+        print(f"⚠️ Erreur de synchronisation Fuseki → local : {error}")
+        return {"mode": "failed", "error": str(error), "hwm": self.hwm}
+
+    def synced_at(self) -> float | None:
+        """
+        Instant (epoch) de la dernière synchro réussie du nœud, None si aucune n'est connue.
+        Un worker qui ne synchronise pas lui-même relit celle du propriétaire dans le
+        fichier d'état, quand il a changé.
+        """
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+        except OSError:
+            return self._synced
+        if mtime != self._state_mtime:
+            self._state_mtime = mtime
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    synced = json.load(f).get("synced")
+                if synced is not None and (self._synced is None or synced > self._synced):
+                    self._synced = synced
+            except (OSError, ValueError, AttributeError):
+                pass
+        return self._synced
+
+    def get_stats(self) -> dict[str, Any]:
+        last = self.synced_at()
+        return {
+            **self.stats,
+            "origin": self.origin,
+            "instance": self.instance,
+            "hwm": self.hwm,
+            # Ancienneté maximale de la vue locale : temps écoulé depuis la dernière synchro réussie
+            "lag_s": round(time.time() - last, 3) if last else None,
+            "pending_subjects": None if self._pending is None else len(self._pending),
+        }
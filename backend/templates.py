@@ -0,0 +1,224 @@
+# templates.py
+"""
+Registre des requêtes SPARQL paramétrées.
+
+Chaque requête des endpoints est déclarée une fois, au chargement du module, avec un
+identifiant stable et le type de chacun de ses paramètres :
+
+    AVIS_BY_USER = templates.query("avis_by_user", \"""
+        SELECT ?avis WHERE { ?avis a ex:Avis ; ex:donnéPar ?utilisateur . }
+    \""", utilisateur=IRI)
+
+Le texte est validé dès l'enregistrement (parseur SPARQL de rdflib) : une faute de
+syntaxe empêche le démarrage au lieu d'apparaître à la première requête. Les valeurs
+ne sont jamais insérées dans le texte : elles sont sérialisées en termes RDF échappés
+(IRI du namespace `ex:`, littéraux typés) dans un bloc `VALUES`, ajouté à la fin d'une
+requête ou en tête du dernier groupe WHERE d'une mise à jour. Le texte de la requête
+reste identique d'un appel à l'autre ; `bind_rows` lie plusieurs lignes d'un coup
+(insertion en lot en une seule requête).
+
+Pour une évaluation sur le graphe local, `local()` exécute la requête préparée
+(`prepareQuery`, une fois au chargement) avec les mêmes paramètres en `initBindings` :
+le planificateur l'emploie pour les lectures à une seule ligne de paramètres, sans
+reparser le texte à chaque appel.
+
+L'identifiant sert aux mesures (histogramme de latence par requête, `timed()`), aux
+étiquettes de cache (`tags()`) et au préchauffage (`warm_up()`).
+"""
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import XSD
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.parser import parseUpdate
+
+IRI = "iri"
+
+# Bornes (ms) de l'histogramme de latence
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Caractères interdits dans une IRI SPARQL (IRIREF)
+INVALID_IRI = re.compile(r'[<>"{}|^`\\\x00-\x20]')
+
+# Valeurs neutres des paramètres pour la validation et le préchauffage
+PLACEHOLDERS = {
+    IRI: URIRef("urn:smartcity:template"),
+    XSD.integer: 0,
+    XSD.float: 0.0,
+    XSD.dateTime: datetime(1970, 1, 1, tzinfo=timezone.utc),
+}
+
+
+def check_term(term, namespace, where: str = "Terme"):
+    """
+    Terme RDF tel qu'il sera écrit (ValueError sinon) : IRI sans caractère interdit et
+    non réduite au namespace (identifiant vide), littéral conforme à son datatype.
+    Même contrôle pour les paramètres liés et pour les triples importés en masse.
+    """
+    if isinstance(term, URIRef):
+        if INVALID_IRI.search(term) or str(term) == str(namespace):
+            raise ValueError(f"{where} : identifiant invalide {str(term)!r}")
+    elif isinstance(term, Literal) and term.ill_typed:
+        raise ValueError(f"{where} : valeur {str(term)!r} invalide pour {term.datatype}")
+    return term
+
+
+class QueryTemplate:
+
+    def __init__(self, id: str, kind: str, text: str, params: dict[str, Any], namespace, prefixes: str):
+        self.id = id
+        self.kind = kind                    # "query" | "update"
+        self.text = f"{prefixes.strip()}\n{text.strip()}"
+        self.params = params                # nom -> IRI | datatype XSD
+        self.namespace = namespace
+        self.prepared = None                # requête préparée (évaluation locale)
+        self.stats: dict[str, Any] = {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+        placeholder = {name: PLACEHOLDERS.get(kind, "") for name, kind in params.items()}
+        try:
+            if kind == "query":
+                self.prepared = prepareQuery(self.text)
+                prepareQuery(self.bind(**placeholder))
+            else:
+                if self.text.rfind("WHERE") < 0:
+                    raise ValueError("une mise à jour paramétrée se termine par un groupe WHERE { }")
+                parseUpdate(self.bind(**placeholder))
+        except Exception as e:
+            raise ValueError(f"Requête « {id} » invalide : {e}") from e
+
+    # ------------------------------------------------------------------
+    # Liaison des paramètres
+    # ------------------------------------------------------------------
+
+    def term(self, name: str, value: Any):
+        """Valeur Python -> terme RDF du type déclaré (ValueError si la valeur ne convient pas)."""
+        kind = self.params[name]
+        if kind == IRI:
+            if isinstance(value, URIRef):
+                iri = str(value)
+            else:
+                iri = str(self.namespace) + str(value)
+            if not value:
+                raise ValueError(f"Paramètre « {name} » : identifiant invalide {value!r}")
+            return check_term(URIRef(iri), self.namespace, f"Paramètre « {name} »")
+        return Literal(value, datatype=kind)
+
+    def bind(self, **values) -> str:
+        return self.bind_rows([values])
+
+    def bind_rows(self, rows: list[dict[str, Any]]) -> str:
+        """Texte de la requête, paramètres liés par un bloc VALUES (une ligne par élément de `rows`)."""
+        if not self.params:
+            return self.text
+        names = list(self.params)
+        lines = []
+        for row in rows:
+            missing = [n for n in names if n not in row]
+            if missing:
+                raise ValueError(f"Requête « {self.id} » : paramètres manquants {missing}")
+            lines.append("(" + " ".join(self.term(n, row[n]).n3() for n in names) + ")")
+        values = "VALUES (" + " ".join(f"?{n}" for n in names) + ") {\n  " + "\n  ".join(lines) + "\n}"
+        if self.kind == "query":
+            return f"{self.text}\n{values}"
+        # Mise à jour : VALUES en tête du dernier groupe WHERE
+        brace = self.text.index("{", self.text.rfind("WHERE")) + 1
+        return f"{self.text[:brace]}\n{values}\n{self.text[brace:]}"
+
+    def local(self, graph: Graph, **values):
+        """Évalue la requête préparée sur un graphe rdflib (graphe local)."""
+        if self.prepared is None:
+            raise ValueError(f"« {self.id} » n'est pas une requête de lecture")
+        return graph.query(self.prepared, initBindings={n: self.term(n, v) for n, v in values.items()})
+
+    def tags(self) -> set[str]:
+        """Classes / propriétés `ex:` lues ou écrites (étiquettes d'invalidation du cache)."""
+        return set(re.findall(r"\bex:(\w+)", self.text))
+
+    # ------------------------------------------------------------------
+    # Mesures
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def timed(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.observe((time.perf_counter() - started) * 1000)
+
+    def observe(self, ms: float):
+        self.stats["count"] += 1
+        self.stats["total_ms"] += ms
+        self.stats["max_ms"] = max(self.stats["max_ms"], ms)
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.histogram[i] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        count = self.stats["count"]
+        return {
+            "kind": self.kind,
+            "params": {n: "iri" if k == IRI else str(k).split("#")[-1] for n, k in self.params.items()},
+            "count": count,
+            "errors": self.stats["errors"],
+            "avg_ms": round(self.stats["total_ms"] / count, 3) if count else 0.0,
+            "max_ms": round(self.stats["max_ms"], 3),
+            "histogram_ms": {
+                **{f"le_{b:g}": n for b, n in zip(BUCKETS_MS, self.histogram)},
+                "inf": self.histogram[-1],
+            },
+        }
+
+
+class TemplateRegistry:
+
+    def __init__(self, namespace, prefixes: str):
+        self.namespace = namespace
+        self.prefixes = prefixes
+        self._templates: dict[str, QueryTemplate] = {}
+
+    def _register(self, id: str, kind: str, text: str, params: dict[str, Any]) -> QueryTemplate:
+        if id in self._templates:
+            raise ValueError(f"Requête « {id} » déjà enregistrée")
+        template = QueryTemplate(id, kind, text, params, self.namespace, self.prefixes)
+        self._templates[id] = template
+        return template
+
+    def query(self, id: str, text: str, **params) -> QueryTemplate:
+        """SELECT / ASK ; `params` : nom de variable -> IRI ou datatype XSD."""
+        return self._register(id, "query", text, params)
+
+    def update(self, id: str, text: str, **params) -> QueryTemplate:
+        """INSERT / DELETE ... WHERE { } ; les paramètres sont liés dans le dernier groupe WHERE."""
+        return self._register(id, "update", text, params)
+
+    def get(self, id: str) -> QueryTemplate:
+        return self._templates[id]
+
+    def __iter__(self):
+        return iter(self._templates.values())
+
+    def warm_up(self, run: Callable[[str], Any]) -> dict[str, Any]:
+        """Exécute une fois chaque requête de lecture (valeurs neutres) : chargement des plans côté Fuseki."""
+        done, failed = 0, {}
+        for t in self:
+            if t.kind != "query":
+                continue
+            try:
+                run(t.bind(**{n: PLACEHOLDERS.get(k, "") for n, k in t.params.items()}))
+                done += 1
+            except Exception as e:
+                failed[t.id] = str(e)
+        return {"warmed": done, "failed": failed}
+
+    def get_stats(self) -> dict[str, Any]:
+        return {t.id: t.get_stats() for t in self}
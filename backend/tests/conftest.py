@@ -0,0 +1,6 @@
+# tests/conftest.py
+"""Les modules de backend/ s'importent entre eux sans paquet : backend/ est ajouté au chemin."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,80 @@
+# tests/test_caches.py
+"""Cache étiqueté : une réponse lue avant une écriture, ou pendant qu'elle attend Fuseki, n'est jamais servie."""
+from caches import TaggedCache
+
+HEADERS = {"content-type": "application/json"}
+
+
+def test_put_with_old_token_after_invalidate_is_skipped():
+    cache = TaggedCache()
+    token = cache.token()
+    cache.put("/users/", b"[1]", HEADERS, {"Utilisateur"}, token)
+    cache.put("/avis/", b"[2]", HEADERS, {"Avis"}, token)
+    assert cache.get("/users/") == (b"[1]", HEADERS)
+
+    cache.invalidate({"Utilisateur"}, dirty=False)
+    assert cache.get("/users/") is None
+    assert cache.get("/avis/") == (b"[2]", HEADERS)     # autre étiquette : conservée
+
+    cache.put("/users/", b"[old]", HEADERS, {"Utilisateur"}, token)   # lecture commencée avant
+    assert cache.get("/users/") is None
+    assert cache.stats()["skipped"] == 1
+
+    cache.put("/users/", b"[new]", HEADERS, {"Utilisateur"}, cache.token())
+    assert cache.get("/users/") == (b"[new]", HEADERS)
+
+
+def test_put_with_old_token_after_clear_is_skipped():
+    cache = TaggedCache()
+    token = cache.token()
+    cache.put("/users/", b"[1]", HEADERS, {"Utilisateur"}, token)
+    cache.clear()
+    assert cache.get("/users/") is None
+
+    cache.put("/avis/", b"[old]", HEADERS, {"Avis"}, token)   # étiquette jamais invalidée
+    assert cache.get("/avis/") is None
+    cache.put("/avis/", b"[new]", HEADERS, {"Avis"}, cache.token())
+    assert cache.get("/avis/") == (b"[new]", HEADERS)
+
+
+def test_dirty_tags_until_each_write_is_settled():
+    cache = TaggedCache()
+    cache.invalidate({"Utilisateur"})                 # écriture 1, en attente de Fuseki
+    cache.invalidate({"Utilisateur", "Avis"})         # écriture 2
+    assert cache.stats()["dirty_tags"] == ["*", "Avis", "Utilisateur"]
+
+    cache.put("/users/", b"[1]", HEADERS, {"Utilisateur"}, cache.token())
+    assert cache.get("/users/") is None               # sale : pas mis en cache
+
+    cache.settle({"Utilisateur"})                      # écriture 1 validée, la 2 reste en file
+    cache.put("/users/", b"[1]", HEADERS, {"Utilisateur"}, cache.token())
+    assert cache.get("/users/") is None
+    assert cache.stats()["dirty_tags"] == ["*", "Avis", "Utilisateur"]
+
+    token = cache.token()
+    cache.settle({"Utilisateur", "Avis"})              # écriture 2 validée
+    assert cache.stats()["dirty_tags"] == []
+    cache.put("/users/", b"[stale]", HEADERS, {"Utilisateur"}, token)   # lue avant la validation
+    assert cache.get("/users/") is None
+    cache.put("/users/", b"[2]", HEADERS, {"Utilisateur"}, cache.token())
+    assert cache.get("/users/") == (b"[2]", HEADERS)
+
+
+def test_settle_drops_entries_cached_meanwhile_on_other_tags():
+    cache = TaggedCache()
+    cache.invalidate({"Avis"})
+    cache.put("/users/", b"[1]", HEADERS, {"Utilisateur"}, cache.token())
+    assert cache.get("/users/") == (b"[1]", HEADERS)
+    cache.put("/all/", b"[*]", HEADERS, {TaggedCache.ALL}, cache.token())
+    assert cache.get("/all/") is None                 # ALL est sale pendant toute écriture
+
+    cache.settle({"Avis"})
+    assert cache.get("/users/") == (b"[1]", HEADERS)
+
+    # Écriture du schéma : vidage à l'écriture locale puis à la validation
+    cache.clear()
+    cache.put("/users/", b"[1]", HEADERS, {"Utilisateur"}, cache.token())
+    cache.settle(None)
+    assert cache.get("/users/") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["dirty_tags"] == []
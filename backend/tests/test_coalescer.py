@@ -0,0 +1,106 @@
+# tests/test_coalescer.py
+"""Regroupement des UPDATE : lots, rejeu une par une sur refus, futures et crochet on_commit."""
+import asyncio
+
+import httpx
+
+from coalescer import UpdateCoalescer
+
+
+class FakeClient:
+    """Client Fuseki asynchrone simulé : enregistre les requêtes, échoue sur demande."""
+
+    def __init__(self, fail=lambda query: None, delay: float = 0.0):
+        self.fail = fail          # requête -> exception à lever (ou None)
+        self.delay = delay
+        self.updates: list[str] = []
+
+    async def update(self, query: str):
+        await asyncio.sleep(self.delay)
+        self.updates.append(query)
+        error = self.fail(query)
+        if error is not None:
+            raise error
+
+
+def rejected(query: str) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://fuseki/update")
+    return httpx.HTTPStatusError("400", request=request, response=httpx.Response(400, request=request))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_updates_join_one_batch():
+    client = FakeClient()
+
+    async def scenario():
+        coalescer = UpdateCoalescer(client, max_delay=0.05, max_batch=10)
+        await asyncio.gather(*(coalescer.submit(f"INSERT DATA {{ <s{i}> <p> <o> }}") for i in range(5)))
+        await coalescer.stop()
+        return coalescer
+
+    coalescer = run(scenario())
+    assert len(client.updates) == 1
+    assert client.updates[0].count("INSERT DATA") == 5
+    assert coalescer.stats["batches"] == 1 and coalescer.stats["operations"] == 5
+
+
+def test_rejected_batch_is_replayed_one_by_one():
+    client = FakeClient(fail=lambda q: rejected(q) if "bad" in q else None)
+    commits = []
+
+    async def scenario():
+        coalescer = UpdateCoalescer(client, max_delay=0.05)
+        coalescer.on_commit = lambda ok, failed: commits.append((ok, failed))
+        results = await asyncio.gather(
+            coalescer.submit("INSERT DATA { <a> <p> <o> }", "a"),
+            coalescer.submit("INSERT DATA { <bad> <p> <o> }", "bad"),
+            coalescer.submit("INSERT DATA { <c> <p> <o> }", "c"),
+            return_exceptions=True,
+        )
+        await coalescer.stop()
+        return results
+
+    results = run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], httpx.HTTPStatusError)
+    assert len(client.updates) == 4   # le lot, puis les trois requêtes seules
+    assert commits == [(["a", "c"], ["bad"])]
+
+
+def test_timeout_fails_the_batch_without_replay():
+    client = FakeClient(fail=lambda q: httpx.ReadTimeout("lent"))
+    commits = []
+
+    async def scenario():
+        coalescer = UpdateCoalescer(client, max_delay=0.05)
+        coalescer.on_commit = lambda ok, failed: commits.append((ok, failed))
+        results = await asyncio.gather(
+            coalescer.submit("INSERT { <a> <at> ?now } WHERE { BIND(NOW() AS ?now) }", "a"),
+            coalescer.submit("INSERT DATA { <b> <p> <o> }", "b"),
+            return_exceptions=True,
+        )
+        await coalescer.stop()
+        return results
+
+    results = run(scenario())
+    assert all(isinstance(r, httpx.ReadTimeout) for r in results)
+    assert len(client.updates) == 1   # pas de rejeu : le lot a pu être appliqué
+    assert commits == [([], ["a", "b"])]
+
+
+def test_on_commit_runs_per_batch_while_queue_is_busy():
+    client = FakeClient(delay=0.01)
+    commits = []
+
+    async def scenario():
+        coalescer = UpdateCoalescer(client, max_delay=0.05, max_batch=2)
+        coalescer.on_commit = lambda ok, failed: commits.append(ok)
+        futures = [coalescer.enqueue(f"INSERT DATA {{ <s{i}> <p> <o> }}", i) for i in range(6)]
+        await asyncio.gather(*futures)
+        await coalescer.stop()
+
+    run(scenario())
+    assert commits == [[0, 1], [2, 3], [4, 5]]
@@ -0,0 +1,96 @@
+# tests/test_deletion.py
+"""Suppression en cascade : plan calculé sur le graphe local, même effet que la requête Fuseki."""
+import pytest
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF
+
+from deletion import CascadeDeleter, parse_rules
+from persistence import GraphStore
+
+EX = Namespace("http://www.semanticweb.org/smartcity#")
+
+DATA = [
+    (EX.ali, RDF.type, EX.Voyageur),
+    (EX.ali, EX.nom, Literal("Ali")),
+    (EX.ali, EX.avoirTicket, EX.t1),          # cascade "out"
+    (EX.t1, RDF.type, EX.Ticket),
+    (EX.t1, EX.valablePour, EX.metro1),       # sortant du ticket : retiré, métro conservé
+    (EX.avis1, RDF.type, EX.Avis),
+    (EX.avis1, EX.donnéPar, EX.ali),          # cascade "in"
+    (EX.avis1, EX.concerne, EX.metro1),
+    (EX.sara, RDF.type, EX.Voyageur),
+    (EX.sara, EX.connait, EX.ali),            # référence entrante sans cascade
+    (EX.metro1, RDF.type, EX.Métro),
+]
+
+
+def open_store(tmp_path) -> GraphStore:
+    store = GraphStore(
+        Graph(),
+        snapshot_path=str(tmp_path / "graph.rdf"),
+        journal_path=str(tmp_path / "graph.journal"),
+        follow_interval=60,
+    )
+    store.recover()
+    store.add(DATA)
+    return store
+
+
+def deleter(store, batch_size: int = 500) -> CascadeDeleter:
+    return CascadeDeleter(store, parse_rules("donnéPar:in,avoirTicket:out", EX), batch_size=batch_size)
+
+
+def test_plan_follows_cascade_rules_and_inbound_references(tmp_path):
+    store = open_store(tmp_path)
+    entities, triples = deleter(store).plan(store.graph, [EX.ali])
+    assert entities[0] == EX.ali
+    assert set(entities) == {EX.ali, EX.t1, EX.avis1}
+    assert (EX.sara, EX.connait, EX.ali) in triples             # référence entrante retirée...
+    assert EX.sara not in entities                              # ...sans supprimer son sujet
+    assert triples == {t for t in DATA if t[0] in set(entities) or t[2] in set(entities)}
+
+    entities, triples = deleter(store).plan(store.graph, [EX.ali], cascade=False)
+    assert entities == [EX.ali]
+    assert (EX.t1, RDF.type, EX.Ticket) not in triples
+    assert (EX.avis1, EX.donnéPar, EX.ali) in triples
+    store.close(compact=False)
+
+
+def test_update_query_batches_values_and_matches_plan(tmp_path):
+    store = open_store(tmp_path)
+    cascade = deleter(store, batch_size=2)
+    entities, triples = cascade.plan(store.graph, [EX.ali])
+    update = cascade.update_query(entities)
+
+    operations = update.split(" ;\n")
+    assert len(operations) == 4                                  # 3 entités, blocs de 2
+    assert operations[0].startswith("DELETE { ?e ?p ?o } WHERE { VALUES ?e { ")
+    assert operations[1].startswith("DELETE { ?s ?p ?e } WHERE { VALUES ?e { ")
+    assert operations[2] == f"DELETE {{ ?e ?p ?o }} WHERE {{ VALUES ?e {{ {entities[2].n3()} }} ?e ?p ?o }}"
+
+    # La requête appliquée à une copie du graphe retire exactement les triples du plan
+    remote = Graph()
+    for t in DATA:
+        remote.add(t)
+    remote.update(update)
+    assert set(remote) == set(DATA) - triples
+    store.close(compact=False)
+
+
+def test_delete_applies_plan_once(tmp_path):
+    store = open_store(tmp_path)
+    version = store.version
+    report = deleter(store).delete([EX.ali])
+    assert report["cascaded"] == 2
+    assert report["inbound_references"] == 3   # ticket, avis, connait
+    assert set(store.graph) == {
+        (EX.sara, RDF.type, EX.Voyageur),
+        (EX.metro1, RDF.type, EX.Métro),
+    }
+    assert store.version > version
+    store.close(compact=False)
+
+
+def test_parse_rules_rejects_unknown_direction():
+    with pytest.raises(ValueError):
+        parse_rules("donnéPar:up", EX)
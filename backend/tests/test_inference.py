@@ -0,0 +1,98 @@
+# tests/test_inference.py
+"""Mise à jour incrémentale du graphe inféré : même résultat qu'une fermeture OWL-RL recalculée."""
+from rdflib import Graph, Namespace
+from rdflib.namespace import OWL, RDF, RDFS
+
+from inference import InferenceEngine
+from persistence import GraphStore
+
+EX = Namespace("http://www.semanticweb.org/smartcity#")
+
+ONTOLOGY = [
+    (EX.Utilisateur, RDF.type, OWL.Class),
+    (EX.Voyageur, RDF.type, OWL.Class),
+    (EX.Conducteur, RDF.type, OWL.Class),
+    (EX.Avis, RDF.type, OWL.Class),
+    (EX.Voyageur, RDFS.subClassOf, EX.Utilisateur),
+    (EX.donnéPar, RDF.type, OWL.ObjectProperty),
+    (EX.donnéPar, RDFS.domain, EX.Avis),
+    (EX.donnéPar, RDFS.range, EX.Utilisateur),
+    (EX.connecte, RDF.type, OWL.ObjectProperty),
+    (EX.connecte, RDF.type, OWL.SymmetricProperty),
+]
+
+
+def open_engine(tmp_path) -> tuple[GraphStore, InferenceEngine]:
+    store = GraphStore(
+        Graph(),
+        snapshot_path=str(tmp_path / "graph.rdf"),
+        journal_path=str(tmp_path / "graph.journal"),
+        follow_interval=60,
+    )
+    store.recover()
+    store.add(ONTOLOGY)
+    engine = InferenceEngine(store, client=None, graph_uri="urn:inferred", leader=lambda: False)
+    store.subscribe(engine.on_change)
+    engine.refresh()
+    return store, engine
+
+
+def settle(engine: InferenceEngine):
+    """Attend la fin d'un recalcul complet déclenché par une modification de l'ontologie."""
+    if engine._refresh_thread is not None:
+        engine._refresh_thread.join()
+
+
+def fresh(store: GraphStore, engine: InferenceEngine) -> set:
+    base, _ = store.snapshot()
+    return set(engine.materialize(base)[1])
+
+
+def test_instance_types_add_then_remove(tmp_path):
+    store, engine = open_engine(tmp_path)
+    initial = set(engine.inferred)
+    store.add([
+        (EX.ali, RDF.type, EX.Voyageur),
+        (EX.avis1, EX.donnéPar, EX.ali),
+        (EX.gare1, EX.connecte, EX.gare2),
+    ])
+    assert (EX.ali, RDF.type, EX.Utilisateur) in engine.inferred
+    assert (EX.avis1, RDF.type, EX.Avis) in engine.inferred
+    assert (EX.gare2, EX.connecte, EX.gare1) in engine.inferred
+    assert set(engine.inferred) == fresh(store, engine)
+
+    # ali reste Utilisateur par le range de donnéPar une fois son type retiré
+    store.remove((EX.ali, RDF.type, EX.Voyageur))
+    assert (EX.ali, RDF.type, EX.Utilisateur) in engine.inferred
+    assert set(engine.inferred) == fresh(store, engine)
+
+    store.remove((EX.avis1, None, None))
+    store.remove((EX.gare1, None, None))
+    assert set(engine.inferred) == fresh(store, engine) == initial
+    store.close(compact=False)
+
+
+def test_subclass_edge_add_then_remove(tmp_path):
+    store, engine = open_engine(tmp_path)
+    initial = set(engine.inferred)
+    store.add([(EX.sara, RDF.type, EX.Conducteur)])
+    assert (EX.sara, RDF.type, EX.Utilisateur) not in engine.inferred
+
+    store.add([(EX.Conducteur, RDFS.subClassOf, EX.Utilisateur)])
+    settle(engine)
+    assert (EX.sara, RDF.type, EX.Utilisateur) in engine.inferred
+    assert set(engine.inferred) == fresh(store, engine)
+
+    # Nouvelle instance après le recalcul : règles compilées avec la nouvelle hiérarchie
+    store.add([(EX.omar, RDF.type, EX.Conducteur)])
+    assert (EX.omar, RDF.type, EX.Utilisateur) in engine.inferred
+
+    store.remove((EX.Conducteur, RDFS.subClassOf, EX.Utilisateur))
+    settle(engine)
+    assert (EX.sara, RDF.type, EX.Utilisateur) not in engine.inferred
+    assert set(engine.inferred) == fresh(store, engine)
+
+    store.remove((EX.sara, None, None))
+    store.remove((EX.omar, None, None))
+    assert set(engine.inferred) == fresh(store, engine) == initial
+    store.close(compact=False)
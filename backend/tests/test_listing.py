@@ -0,0 +1,93 @@
+# tests/test_listing.py
+"""Pagination par curseur (keyset) : toutes les lignes, une seule fois, page après page."""
+import json
+
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF
+
+from listing import Listing, decode_cursor
+
+EX = Namespace("http://www.semanticweb.org/smartcity#")
+PREFIXES = f"PREFIX ex: <{EX}>\nPREFIX rdf: <{RDF}>"
+
+
+def sample_graph() -> Graph:
+    g = Graph()
+    for i in range(7):
+        g.add((EX[f"u{i}"], RDF.type, EX.Utilisateur))
+    g.add((EX.u0, EX.nom, Literal("Ali")))
+    g.add((EX.u0, EX.nom, Literal("Amine")))     # deux lignes pour la même entité
+    g.add((EX.u1, EX.nom, Literal("Ali")))       # même nom qu'une autre entité
+    g.add((EX.u3, EX.nom, Literal("Sara")))
+    g.add((EX.u3, EX.age, Literal(30)))
+    g.add((EX.u5, EX.age, Literal(30)))          # u2, u4, u6 : ni nom ni âge
+    return g
+
+
+def listing(unique: bool) -> Listing:
+    return Listing(
+        name="users",
+        variables=["id", "nom", "age"],
+        where="""
+        ?id a ex:Utilisateur .
+        OPTIONAL { ?id ex:nom ?nom . }
+        OPTIONAL { ?id ex:age ?age . }
+        """,
+        row=lambda r: {k: v["value"] for k, v in r.items()},
+        key="id",
+        unique=unique,
+        prefixes=PREFIXES,
+    )
+
+
+def bindings(graph: Graph, query: str) -> list[dict]:
+    return json.loads(graph.query(query).serialize(format="json"))["results"]["bindings"]
+
+
+def pages(graph: Graph, items: Listing, limit: int) -> list[list[dict]]:
+    out, after = [], None
+    while True:
+        rows, cursor = items.page(bindings(graph, items.query(limit=limit, after=after)), limit)
+        out.append(rows)
+        if cursor is None:
+            return out
+        after = decode_cursor(cursor)
+
+
+def canonical(rows: list[dict]) -> list[str]:
+    return sorted(json.dumps(r, sort_keys=True) for r in rows)
+
+
+def test_keyset_pages_cover_every_row_once():
+    graph = sample_graph()
+    items = listing(unique=False)
+    expected = canonical(list(items.rows(bindings(graph, items.query()))))
+    assert len(expected) == 8
+    for limit in (1, 2, 3, 5, 100):
+        result = pages(graph, items, limit)
+        assert all(len(rows) <= limit for rows in result)
+        assert canonical([r for rows in result for r in rows]) == expected
+
+
+def test_keyset_pages_unique_entities():
+    graph = sample_graph()
+    items = listing(unique=True)
+    for limit in (1, 2, 4):
+        ids = [r["id"] for rows in pages(graph, items, limit) for r in rows]
+        assert ids == sorted(ids)
+        assert ids == sorted(str(EX[f"u{i}"]) for i in range(7))
+
+
+def test_local_select_matches_fuseki_order():
+    graph = sample_graph()
+    items = listing(unique=False)
+    everything = bindings(graph, items.query())
+    for limit in (2, 3):
+        after, local = None, []
+        while True:
+            rows, cursor = items.page(items.select(everything, after), limit)
+            local.append(rows)
+            if cursor is None:
+                break
+            after = decode_cursor(cursor)
+        assert local == pages(graph, items, limit)
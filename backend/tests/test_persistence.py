@@ -0,0 +1,89 @@
+# tests/test_persistence.py
+"""Journal + snapshot : ce qui est écrit doit revenir après redémarrage, compaction ou crash."""
+import os
+
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF
+
+from persistence import GraphStore, triple_to_nquad
+
+EX = Namespace("http://www.semanticweb.org/smartcity#")
+
+
+def open_store(tmp_path) -> GraphStore:
+    store = GraphStore(
+        Graph(),
+        snapshot_path=str(tmp_path / "graph.rdf"),
+        journal_path=str(tmp_path / "graph.journal"),
+        follow_interval=60,
+    )
+    store.recover()
+    return store
+
+
+def test_recovery_round_trip(tmp_path):
+    store = open_store(tmp_path)
+    store.add([(EX[f"u{i}"], RDF.type, EX.Utilisateur) for i in range(3)])
+    store.add([(EX.u0, EX.nom, Literal("Ali"))])
+    store.remove((EX.u2, None, None))
+    expected = set(store.graph)
+    store.close(compact=False)
+
+    # Redémarrage sans compaction : rejeu du journal
+    store = open_store(tmp_path)
+    assert set(store.graph) == expected
+    assert store.class_counts[EX.Utilisateur] == 2
+    store.close(compact=True)
+
+    # Redémarrage après compaction : snapshot seul
+    assert os.path.getsize(tmp_path / "graph.journal") == 0
+    store = open_store(tmp_path)
+    assert set(store.graph) == expected
+    assert store.class_counts[EX.Utilisateur] == 2
+    store.close(compact=False)
+
+
+def test_corrupt_line_only_skips_itself(tmp_path):
+    good = [(EX[f"u{i}"], RDF.type, EX.Utilisateur) for i in range(5)]
+    lines = [f"A {triple_to_nquad(t)}\n" for t in good]
+    lines.insert(2, "A <http://exemple/sans fin> <p> .\n")     # ligne illisible au milieu d'une suite
+    lines.append("A <http://www.semanticweb.org/smartcity#u9> <http://www.w3")  # écriture interrompue
+    (tmp_path / "graph.journal").write_text("".join(lines), encoding="utf-8")
+
+    store = open_store(tmp_path)
+    assert set(store.graph) == set(good)
+    assert store.class_counts[EX.Utilisateur] == 5
+    store.close(compact=False)
+
+
+def test_add_journals_only_new_triples(tmp_path):
+    store = open_store(tmp_path)
+    store.add([(EX.u1, RDF.type, EX.Utilisateur), (EX.u1, RDF.type, EX.Utilisateur)])
+    version = store.version
+    store.add([(EX.u1, RDF.type, EX.Utilisateur)])      # déjà présent : ni journal ni version
+    assert store.version == version
+    store.add([(EX.u1, RDF.type, EX.Utilisateur), (EX.u2, RDF.type, EX.Utilisateur)])
+    journal = (tmp_path / "graph.journal").read_text(encoding="utf-8").splitlines()
+    assert len(journal) == 2
+    assert store.class_counts[EX.Utilisateur] == 2
+    store.close(compact=False)
+
+
+def test_version_shared_between_stores(tmp_path):
+    owner, other = open_store(tmp_path), open_store(tmp_path)
+    assert owner.epoch == other.epoch
+    owner.add([(EX.u1, RDF.type, EX.Utilisateur)])
+    other.follow()
+    assert owner.version == other.version > 0
+    owner.compact()
+    owner.add([(EX.u2, RDF.type, EX.Utilisateur)])
+    other.follow()
+    assert owner.version == other.version
+    version, epoch = owner.version, owner.epoch
+    other.close(compact=False)
+    owner.close(compact=True)
+
+    # Jeton (époque, version) toujours valable après redémarrage
+    store = open_store(tmp_path)
+    assert (store.epoch, store.version) == (epoch, version)
+    store.close(compact=False)
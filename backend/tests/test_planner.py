@@ -0,0 +1,112 @@
+# tests/test_planner.py
+"""Routage des lectures : graphe local pour l'ontologie et les recherches sélectives, Fuseki sinon."""
+import asyncio
+
+from rdflib import Graph, Literal, Namespace, Variable
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+
+from persistence import GraphStore
+from planner import QueryPlanner, split_values
+from templates import IRI, TemplateRegistry
+
+EX = Namespace("http://www.semanticweb.org/smartcity#")
+PREFIXES = f"PREFIX ex: <{EX}>\nPREFIX rdf: <{RDF}>\nPREFIX rdfs: <{RDFS}>\nPREFIX owl: <{OWL}>"
+
+templates = TemplateRegistry(EX, PREFIXES)
+AVIS_BY_USER = templates.query("avis_by_user", """
+    SELECT ?utilisateur ?avis WHERE { ?avis a ex:Avis ; ex:donnéPar ?utilisateur . }
+""", utilisateur=IRI)
+RECENT = templates.query("recent", """
+    SELECT ?s WHERE { ?s ex:age ?age . }
+""", age=XSD.integer)
+
+
+def open_planner(tmp_path, staleness: float = 0.0) -> tuple[GraphStore, QueryPlanner, list]:
+    store = GraphStore(
+        Graph(),
+        snapshot_path=str(tmp_path / "graph.rdf"),
+        journal_path=str(tmp_path / "graph.journal"),
+        follow_interval=60,
+    )
+    store.recover()
+    triples = [(EX.Voyageur, RDFS.subClassOf, EX.Utilisateur), (EX.Utilisateur, RDF.type, OWL.Class)]
+    for i in range(50):
+        triples += [
+            (EX[f"u{i}"], RDF.type, EX.Voyageur),
+            (EX[f"avis{i}"], RDF.type, EX.Avis),
+            (EX[f"avis{i}"], EX.donnéPar, EX[f"u{i}"]),
+        ]
+    store.add(triples)
+    sent = []
+
+    async def remote(query: str) -> dict:
+        sent.append(query)
+        return {"head": {"vars": []}, "results": {"bindings": []}}
+
+    planner = QueryPlanner(store, remote, remote_predicates={EX.tauxPollution},
+                           staleness=lambda: staleness, max_local_rows=10)
+    return store, planner, sent
+
+
+def test_schema_only_query_is_local(tmp_path):
+    store, planner, _ = open_planner(tmp_path)
+    query = f"{PREFIXES}\nSELECT ?c WHERE {{ ?c rdfs:subClassOf* ex:Utilisateur }}"
+    assert planner.route(query) == ("local", "ontologie")
+    store.close(compact=False)
+
+
+def test_named_graph_and_column_values_are_remote(tmp_path):
+    store, planner, _ = open_planner(tmp_path)
+    query = f"{PREFIXES}\nSELECT ?s WHERE {{ ?s a ?t . GRAPH <urn:inferred> {{ ?t rdfs:subClassOf ex:Utilisateur }} }}"
+    assert planner.route(query) == ("remote", "graphe nommé / service")
+    query = f"{PREFIXES}\nSELECT ?v WHERE {{ ex:p1 ex:tauxPollution ?v }}"
+    assert planner.route(query) == ("remote", "valeurs hors graphe local")
+    store.close(compact=False)
+
+
+def test_selective_values_lookup_is_local(tmp_path):
+    store, planner, _ = open_planner(tmp_path)
+    assert planner.route(AVIS_BY_USER.bind(utilisateur="u1")) == ("local", "sélective")
+    assert planner.route(AVIS_BY_USER.text) == ("remote", "parcours large")
+    rows = [{"utilisateur": f"u{i}"} for i in range(20)]
+    assert planner.route(AVIS_BY_USER.bind_rows(rows)) == ("remote", "parcours large")
+    store.close(compact=False)
+
+
+def test_stale_local_graph_is_remote(tmp_path):
+    store, planner, _ = open_planner(tmp_path, staleness=float("inf"))
+    assert planner.route(AVIS_BY_USER.bind(utilisateur="u1")) == ("remote", "graphe local en retard")
+    store.close(compact=False)
+
+
+def test_select_runs_local_template_or_remote(tmp_path):
+    store, planner, sent = open_planner(tmp_path)
+    rows = [{"utilisateur": "u3"}]
+    data = asyncio.run(planner.select(AVIS_BY_USER.bind_rows(rows), route="avis", template=AVIS_BY_USER, rows=rows))
+    assert [b["avis"]["value"] for b in data["results"]["bindings"]] == [str(EX.avis3)]
+    rows = [{"utilisateur": "u3"}, {"utilisateur": "u4"}]
+    data = asyncio.run(planner.select(AVIS_BY_USER.bind_rows(rows), route="avis"))
+    assert sorted(b["avis"]["value"] for b in data["results"]["bindings"]) == [str(EX.avis3), str(EX.avis4)]
+    assert not sent
+
+    asyncio.run(planner.select(AVIS_BY_USER.text, route="avis"))
+    assert sent == [AVIS_BY_USER.text]
+    stats = planner.get_stats()["routes"]["avis"]
+    assert (stats["local"]["count"], stats["remote"]["count"]) == (2, 1)
+    store.close(compact=False)
+
+
+def test_split_values():
+    text, bindings = split_values(AVIS_BY_USER.bind_rows([{"utilisateur": "u1"}, {"utilisateur": "u2"}]))
+    assert text == AVIS_BY_USER.text
+    assert bindings == {Variable("utilisateur"): [EX.u1, EX.u2]}
+
+    text, bindings = split_values(RECENT.bind(age=42))
+    assert text == RECENT.text
+    assert bindings == {Variable("age"): [Literal(42, datatype=XSD.integer)]}
+
+    query = f'{AVIS_BY_USER.text}\nVALUES (?utilisateur) {{\n  (UNDEF)\n}}'
+    assert split_values(query) == (AVIS_BY_USER.text, {})
+    assert split_values(AVIS_BY_USER.text) == (AVIS_BY_USER.text, None)
+    query = f'{AVIS_BY_USER.text}\nVALUES (?utilisateur) {{\n  <urn:a> <urn:b>\n}}'
+    assert split_values(query) == (query, None)            # pas un bloc produit par bind_rows
@@ -0,0 +1,110 @@
+# tests/test_statstore.py
+"""Colonnes des statistiques : absorption depuis le graphe local, agrégats, suppression durable."""
+from datetime import datetime, timezone
+
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import OWL, RDF, RDFS, XSD
+
+from persistence import GraphStore
+from statstore import KINDS, StatStore
+
+EX = Namespace("http://www.semanticweb.org/smartcity#")
+
+ONTOLOGY = [
+    (EX.statistique, RDF.type, OWL.Class),
+    (EX.StatistiquePollution, RDFS.subClassOf, EX.statistique),
+    (EX.statistiqueAccident, RDFS.subClassOf, EX.statistique),
+]
+
+
+def open_stores(tmp_path) -> tuple[GraphStore, StatStore]:
+    store = GraphStore(
+        Graph(),
+        snapshot_path=str(tmp_path / "graph.rdf"),
+        journal_path=str(tmp_path / "graph.journal"),
+        follow_interval=60,
+    )
+    store.recover()
+    stats = StatStore(str(tmp_path / "stats"), store, EX)
+    store.subscribe(stats.on_change)
+    store.run_locked(lambda graph: stats.absorb())
+    return store, stats
+
+
+def at(hour: int) -> Literal:
+    return Literal(datetime(2025, 1, 1, hour, tzinfo=timezone.utc), datatype=XSD.dateTime)
+
+
+def pollution(name: str, value: float, hour: int) -> list:
+    s = EX[name]
+    return [
+        (s, RDF.type, EX.StatistiquePollution),
+        (s, EX.tauxPollution, Literal(value, datatype=XSD.float)),
+        (s, EX.horodatage, at(hour)),
+    ]
+
+
+def test_absorb_then_aggregate(tmp_path):
+    store, stats = open_stores(tmp_path)
+    store.add(ONTOLOGY)
+    store.add(pollution("p1", 10.0, 0) + pollution("p2", 30.0, 0) + pollution("p3", 20.0, 1))
+    store.add([(EX.a1, RDF.type, EX.statistiqueAccident), (EX.a1, EX.nbreDaccident, Literal(4))])
+
+    # Valeurs dans les colonnes, plus dans le graphe servi ; le type y reste
+    assert not list(store.graph.triples((None, EX.tauxPollution, None)))
+    assert (EX.p1, RDF.type, EX.StatistiquePollution) in store.graph
+    assert stats.get("p2")["tauxPollution"] == 30.0
+    assert stats.get("a1")["nbreDaccident"] == 4
+    assert (EX.p1, EX.tauxPollution, Literal(10.0, datatype=XSD.float)) in set(stats.triples("p1"))
+
+    [total] = stats.aggregate(KINDS["pollution"], percentiles=[50])
+    assert total == {"count": 3, "min": 10.0, "max": 30.0, "mean": 20.0, "p50": 20.0}
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+    hours = stats.aggregate(KINDS["pollution"], start=start, window=3600)
+    assert [(h["start"] - start, h["count"], h["mean"]) for h in hours] == [(0, 2, 20.0), (3600, 1, 20.0)]
+    assert stats.aggregate(KINDS["accident"])[0]["count"] == 1
+    stats.close()
+    store.close(compact=False)
+
+
+def test_values_before_type_are_absorbed_when_typed(tmp_path):
+    store, stats = open_stores(tmp_path)
+    store.add(ONTOLOGY)
+    values = pollution("p1", 12.5, 3)[1:]
+    store.add(values)                                      # type pas encore arrivé
+    store.add([(EX.ev1, EX.horodatage, at(5))])            # horodatage d'une autre entité
+    assert stats.get("p1") is None
+    assert all(t in store.graph for t in values)
+
+    store.add([(EX.p1, RDF.type, EX.StatistiquePollution)])
+    assert stats.get("p1")["tauxPollution"] == 12.5
+    assert stats.raw("p1")[2] == at(3).toPython().timestamp()
+    assert not any(t in store.graph for t in values)
+    assert (EX.ev1, EX.horodatage, at(5)) in store.graph   # jamais absorbé
+    stats.close()
+    store.close(compact=False)
+
+
+def test_deleted_stat_stays_deleted_after_restart(tmp_path):
+    store, stats = open_stores(tmp_path)
+    store.add(ONTOLOGY)
+    store.add(pollution("p1", 10.0, 0) + pollution("p2", 20.0, 0))
+
+    # Suppression d'une entité : triples du graphe + valeurs retirées par detach (voir deletion.py)
+    removed = set(store.graph.triples((EX.p1, None, None))) | store.detached(EX.p1)
+    assert len(removed) == 3
+    store.apply([], removed)
+    assert stats.get("p1") is None
+    assert stats.aggregate(KINDS["pollution"])[0]["count"] == 1
+    stats.close()
+    store.close(compact=False)
+
+    # Redémarrage sur le journal, puis sur le snapshot compacté : rien ne revient
+    for compact in (True, False):
+        store, stats = open_stores(tmp_path)
+        assert stats.get("p1") is None
+        assert stats.get("p2")["tauxPollution"] == 20.0
+        assert not list(store.graph.triples((EX.p1, None, None)))
+        assert not store.detached(EX.p1)
+        stats.close()
+        store.close(compact=compact)
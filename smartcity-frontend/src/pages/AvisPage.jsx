@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import axios from "axios";
 
 export default function AvisPage() {
@@ -6,6 +6,7 @@ export default function AvisPage() {
   const [form, setForm] = useState({ id: "", description: "", utilisateur_id: "" });
   const [message, setMessage] = useState(null);
   const [filterUser, setFilterUser] = useState("");
+  const activeFilter = useRef("");
 
   const BASE_URL = "http://127.0.0.1:8000";
 
@@ -14,10 +15,44 @@ export default function AvisPage() {
     fetchAvis();
   }, []);
 
+  // Flux des modifications : la liste est tenue à jour sans la recharger entièrement
+  useEffect(() => {
+    const source = new EventSource(`${BASE_URL}/changes?types=Avis`);
+
+    source.addEventListener("change", (e) => {
+      const change = JSON.parse(e.data);
+      if (change.truncated) {
+        fetchAvis();
+        return;
+      }
+      setAvisList(prev => {
+        let list = prev;
+        for (const entity of change.entities) {
+          const rest = list.filter(a => a.avis !== entity.id);
+          if (entity.op === "deleted") {
+            list = rest;
+          } else if (entity.op === "created" && !activeFilter.current) {
+            list = [...rest, {
+              avis: entity.id,
+              description: entity.fields.description ?? null,
+              utilisateur: entity.fields["donnéPar"],
+            }];
+          }
+        }
+        return list;
+      });
+    });
+    // Jeton de reprise expiré (redémarrage du serveur...) : rechargement complet
+    source.addEventListener("reset", () => fetchAvis());
+
+    return () => source.close();
+  }, []);
+
   // Récupère tous les avis
   const fetchAvis = async () => {
     try {
       const res = await axios.get(`${BASE_URL}/avis/`);
+      activeFilter.current = "";
       setAvisList(res.data);
     } catch (err) {
       console.error(err);
@@ -34,7 +69,7 @@ export default function AvisPage() {
       const res = await axios.post(`${BASE_URL}/add_avis/`, form);
       setMessage(res.data.message || "✅ Avis ajouté avec succès !");
       setForm({ id: "", description: "", utilisateur_id: "" });
-      fetchAvis();
+      if (activeFilter.current) fetchAvis();
     } catch (err) {
       console.error(err);
       setMessage("❌ Erreur lors de l'ajout de l'avis.");
@@ -51,6 +86,7 @@ export default function AvisPage() {
 
     try {
       const res = await axios.get(`${BASE_URL}/avis/${filterUser}`);
+      activeFilter.current = filterUser;
       setAvisList(res.data);
       setMessage(`📋 Avis de l'utilisateur '${filterUser}'`);
     } catch (err) {